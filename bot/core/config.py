@@ -1,10 +1,14 @@
 # bot/core/config.py
+import threading
+from enum import Enum
 import yaml
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Annotated, Callable, List, Dict, Any, Literal, Optional, Set
 
-from pydantic import BaseModel, Field
-from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic import BaseModel, Field, ValidationError, field_validator
+from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
+
+from bot.core.logging import logger
 
 # Define the project root directory
 PROJECT_ROOT = Path(__file__).parent.parent.parent
@@ -16,21 +20,238 @@ class TelegramBotConfig(BaseModel):
     group_reply_probability: float = 0.2
     log_level: str = "INFO"
     group_chat_header: str = ""  # A default value
+    # Group messages the bot doesn't answer are buffered and written in batches
+    group_log_flush_seconds: int = 30
+    group_log_max_pending: int = 50
+    prompt_page_size: int = 8
+    inline_results_limit: int = 20
+    inline_cache_seconds: int = 300
+
+
+class GenerationConfig(BaseModel):
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+    top_k: Optional[int] = None
+    max_output_tokens: Optional[int] = None
+
+
+class KeyPoolConfig(BaseModel):
+    strategy: Literal["least_loaded", "round_robin"] = "least_loaded"
+    # Per-key quota; a key at its limit is skipped while others have room (0 = no limit)
+    requests_per_minute: int = 0
+    # A key answering 429 is rested this long, doubling on consecutive 429s
+    cooldown_seconds: float = 30.0
+    max_cooldown_seconds: float = 600.0
+
+
+class HedgingConfig(BaseModel):
+    enabled: bool = False
+    # Hedge once a request runs longer than this percentile of the last `window` latencies
+    percentile: float = 95.0
+    window: int = 200
+    min_samples: int = 20
+    min_delay_seconds: float = 0.5
+    # Budget: at most this fraction of requests may send a hedge
+    max_extra_fraction: float = 0.05
+    # Model used for the hedge; None keeps the routed model (the hedge still goes out on another key)
+    model_name: Optional[str] = None
+
+
+class RequestClass(str, Enum):
+    """The kinds of requests the bot makes, each of which may be routed to its own model."""
+    PRIVATE = "private"
+    GROUP_MENTION = "group_mention"
+    # Probabilistic replies in groups nobody asked for: the bulk of group traffic
+    GROUP_INTERJECTION = "group_interjection"
+
+
+class ModelRoute(BaseModel):
+    """Overrides applied on top of the default model for some requests."""
+    model_name: Optional[str] = None  # None keeps the model chosen so far
+    # Only the parameters set here replace the ones chosen so far
+    generation_config: GenerationConfig = Field(default_factory=GenerationConfig)
 
 
 class GeminiConfig(BaseModel):
     model_name: str = "gemini-2.5-flash"
+    generation_config: GenerationConfig = Field(default_factory=GenerationConfig)
+    key_pool: KeyPoolConfig = Field(default_factory=KeyPoolConfig)
+    hedging: HedgingConfig = Field(default_factory=HedgingConfig)
+    # Per request class overrides; an unknown class name fails validation
+    routes: Dict[RequestClass, ModelRoute] = Field(default_factory=dict)
+    # Requests with at least this many history messages also get the long_context overrides
+    long_context_messages: Optional[int] = None
+    long_context: ModelRoute = Field(default_factory=ModelRoute)
 
 
 class DatabaseConfig(BaseModel):
     url: str = "sqlite:///data/bot_database.db"
     echo: bool = False
+    # Updates running more queries than this are logged as a warning
+    warn_queries_per_update: int = 20
+
+
+class ResponseCacheConfig(BaseModel):
+    enabled: bool = True
+    max_entries: int = 1024
+    ttl_seconds: int = 86400
+    disk_path: Optional[str] = None  # e.g. "data/response_cache.db"; None keeps the cache in memory only
+
+
+class OutboundConfig(BaseModel):
+    # Telegram allows ~30 messages/s overall, ~1/s per private chat and ~20/min per group
+    global_rate: float = Field(default=30.0, gt=0)
+    private_chat_rate: float = Field(default=1.0, gt=0)
+    group_chat_rate: float = Field(default=0.33, gt=0)
+    burst: int = Field(default=3, ge=1)
+    max_retries: int = 3
+
+
+class ConfigReloadConfig(BaseModel):
+    enabled: bool = True
+    # Stat polling interval; with inotify available, changes are picked up immediately
+    poll_interval_seconds: float = 5.0
+
+
+class UsageConfig(BaseModel):
+    # Token counters are kept in memory and written to the database this often
+    flush_seconds: int = 60
+
+
+class RateLimitConfig(BaseModel):
+    enabled: bool = True
+    # 0 disables a limit; admins (admin_user_ids) are never limited
+    user_messages_per_minute: int = 10
+    chat_messages_per_minute: int = 20
+    user_tokens_per_day: int = 200_000
+    chat_tokens_per_day: int = 500_000
+
+
+class DedupConfig(BaseModel):
+    # How many recent update_ids are remembered, and how often the high-water mark is saved
+    capacity: int = 10_000
+    flush_seconds: int = 5
+
+
+class AdmissionConfig(BaseModel):
+    # Load = running + queued generations; 0 disables a step
+    shed_interjections_at: int = 16
+    busy_reply_at: int = 32
+    # Generations of any class admitted past busy_reply_at wait for a slot beyond this many
+    max_in_flight: int = 48
+
+
+class CancellationConfig(BaseModel):
+    # Which events cancel a chat's in-flight reply generation
+    on_new_message: Literal["never", "private", "always"] = "private"
+    on_clear: bool = True
+    on_prompt_switch: bool = True
+
+
+class ShutdownConfig(BaseModel):
+    # How long in-flight reply generations may finish after a stop signal before they're cancelled
+    drain_seconds: float = 20
+
+
+class RecordingConfig(BaseModel):
+    enabled: bool = False
+    # One scrubbed, gzip-compressed JSONL file per run is written here
+    directory: str = "data/recordings"
+    # Stop recording after this many updates (0 = no limit)
+    max_updates: int = 0
+
+
+class PersistenceConfig(BaseModel):
+    enabled: bool = True
+    # How often changed user_data, chat_data and conversation states are written
+    flush_seconds: float = 60
+
+
+# MIME types Gemini accepts as inline parts
+GEMINI_MIME_TYPES = [
+    "image/png", "image/jpeg", "image/webp", "image/heic", "image/heif",
+    "audio/wav", "audio/x-wav", "audio/mp3", "audio/mpeg", "audio/aiff", "audio/aac", "audio/ogg", "audio/flac",
+    "video/mp4", "video/mpeg", "video/mpg", "video/quicktime", "video/x-msvideo", "video/x-flv", "video/webm",
+    "video/x-ms-wmv", "video/3gpp",
+    "application/pdf", "application/json", "text/plain", "text/html", "text/css", "text/csv", "text/xml",
+    "text/markdown", "text/rtf", "text/javascript", "text/x-python",
+]
+
+
+class MediaConfig(BaseModel):
+    enabled: bool = True
+    # Larger files are refused before downloading (the Bot API can't download more than 20 MB anyway)
+    max_file_bytes: int = 20_000_000
+    # Files of other types (zip, exe, ...) are refused before downloading
+    mime_types: List[str] = Field(default_factory=lambda: list(GEMINI_MIME_TYPES))
+    cache_dir: str = "data/media_cache"
+    cache_max_bytes: int = 500_000_000
+
+
+class TelegramHttpConfig(BaseModel):
+    pool_size: int = 64
+    connect_timeout: float = 5.0
+    read_timeout: float = 10.0
+    write_timeout: float = 10.0
+    pool_timeout: float = 3.0
+    media_write_timeout: float = 30.0
+
+
+class GeminiHttpConfig(BaseModel):
+    # Per API key
+    max_connections: int = 32
+    # For the whole request; generating a long reply can take a while
+    timeout_seconds: float = 120.0
+
+
+class HttpConfig(BaseModel):
+    # Used for both APIs; falls back to HTTPS_PROXY / HTTP_PROXY from .env
+    proxy: Optional[str] = None
+    # Only used when the 'h2' package is installed
+    http2: bool = True
+    keepalive_expiry_seconds: float = 30.0
+    telegram: TelegramHttpConfig = Field(default_factory=TelegramHttpConfig)
+    gemini: GeminiHttpConfig = Field(default_factory=GeminiHttpConfig)
+
+
+class WarmStartConfig(BaseModel):
+    enabled: bool = True
+    # Most recently active sessions to load into the context cache at boot...
+    preload_sessions: int = 500
+    # ...as long as their histories add up to less than this (stored size, uncompressed)
+    preload_max_bytes: int = 16_000_000
+    connect_timeout_seconds: float = 5.0
 
 
 class AppConfig(BaseModel):
     database: DatabaseConfig
     gemini: GeminiConfig
     telegram_bot: TelegramBotConfig
+    response_cache: ResponseCacheConfig = Field(default_factory=ResponseCacheConfig)
+    outbound: OutboundConfig = Field(default_factory=OutboundConfig)
+    config_reload: ConfigReloadConfig = Field(default_factory=ConfigReloadConfig)
+    usage: UsageConfig = Field(default_factory=UsageConfig)
+    rate_limits: RateLimitConfig = Field(default_factory=RateLimitConfig)
+    cancellation: CancellationConfig = Field(default_factory=CancellationConfig)
+    dedup: DedupConfig = Field(default_factory=DedupConfig)
+    admission: AdmissionConfig = Field(default_factory=AdmissionConfig)
+    warm_start: WarmStartConfig = Field(default_factory=WarmStartConfig)
+    http: HttpConfig = Field(default_factory=HttpConfig)
+    media: MediaConfig = Field(default_factory=MediaConfig)
+    persistence: PersistenceConfig = Field(default_factory=PersistenceConfig)
+    shutdown: ShutdownConfig = Field(default_factory=ShutdownConfig)
+    recording: RecordingConfig = Field(default_factory=RecordingConfig)
+
+
+class PromptConfig(BaseModel):
+    """A single persona defined in prompts.yml."""
+    title: str = ""
+    prompt: str
+    # Stateless personas (e.g. translators) answer identical inputs identically,
+    # so their replies can be served from the response cache.
+    cacheable: bool = False
+    # Model overrides for this persona; they take precedence over every routing rule
+    model: Optional[ModelRoute] = None
 
 
 # --- Main Settings Class ---
@@ -41,11 +262,26 @@ class Settings(BaseSettings):
     # These fields are loaded directly from the .env file
     telegram_bot_token: str
     gemini_api_key: str
+    # Extra keys for the key pool, comma-separated: GEMINI_API_KEYS=key1,key2
+    gemini_api_keys: Annotated[List[str], NoDecode] = Field(default_factory=list)
     admin_user_ids: List[int] = Field(default_factory=list)
+    http_proxy: Optional[str] = None
+    https_proxy: Optional[str] = None
 
     # These fields will be populated from our YAML data
     app: AppConfig
-    prompts: Dict[str, Any]
+    prompts: Dict[str, PromptConfig]
+
+    @field_validator("gemini_api_keys", mode="before")
+    @classmethod
+    def _split_api_keys(cls, value: Any) -> Any:
+        if isinstance(value, str):
+            return [key.strip() for key in value.split(",") if key.strip()]
+        return value
+
+    def all_gemini_api_keys(self) -> List[str]:
+        """GEMINI_API_KEY followed by GEMINI_API_KEYS, without empties or duplicates."""
+        return list(dict.fromkeys(key for key in [self.gemini_api_key, *self.gemini_api_keys] if key))
 
     # Configure Pydantic to load from the .env file
     model_config = SettingsConfigDict(
@@ -55,14 +291,17 @@ class Settings(BaseSettings):
     )
 
 
+CONFIG_DIR = PROJECT_ROOT / "config"
+APP_CONFIG_PATH = CONFIG_DIR / "app_config.yml"
+PROMPTS_CONFIG_PATH = CONFIG_DIR / "prompts.yml"
+
+
 def load_yaml_configs() -> Dict[str, Any]:
     """A simple helper function to load our YAML configs."""
-    config_dir = PROJECT_ROOT / "config"
-
-    with open(config_dir / "app_config.yml", 'r', encoding='utf-8') as f:
+    with open(APP_CONFIG_PATH, 'r', encoding='utf-8') as f:
         app_data = yaml.safe_load(f)
 
-    with open(config_dir / "prompts.yml", 'r', encoding='utf-8') as f:
+    with open(PROMPTS_CONFIG_PATH, 'r', encoding='utf-8') as f:
         prompts_data = yaml.safe_load(f)
 
     return {"app": app_data, "prompts": prompts_data}
@@ -70,16 +309,110 @@ def load_yaml_configs() -> Dict[str, Any]:
 
 # --- Initialization Logic ---
 
-# 1. Load the data from our YAML files first
-yaml_data = load_yaml_configs()
+_settings: Optional[Settings] = None
+_settings_lock = threading.Lock()
+_reload_listeners: List[Callable[[Settings, Settings], None]] = []
+
+
+def get_settings() -> Settings:
+    """
+    Returns the application settings, loading them on first use.
+
+    This is the single accessor for configuration: .env and the YAML files are read
+    once per process (and again only by reload_settings), and nothing is parsed at import time.
+    Callers should not keep the returned object around, so that reloads take effect.
+    """
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                # Pydantic-settings loads the .env file; the YAML data is passed explicitly.
+                _settings = Settings(**load_yaml_configs())
+    return _settings
+
+
+def reload_settings() -> bool:
+    """
+    Re-reads and re-validates the configuration, then swaps it in atomically.
+
+    If the files can't be read or don't validate, the current settings are kept.
+    On success every registered reload listener is called with the old and new settings.
+
+    Returns:
+        True if the new configuration was applied.
+    """
+    global _settings
+    try:
+        loaded = Settings(**load_yaml_configs())
+    except (OSError, yaml.YAMLError, ValidationError) as e:
+        logger.error(f"Configuration reload failed, keeping the current configuration: {e}")
+        return False
+
+    with _settings_lock:
+        old, _settings = _settings, loaded
+
+    logger.info("Configuration reloaded.")
+    if old is not None:
+        for listener in list(_reload_listeners):
+            try:
+                listener(old, loaded)
+            except Exception as e:
+                logger.error(f"Configuration reload listener {listener!r} failed: {e}", exc_info=True)
+    return True
+
+
+def use_settings(settings: Optional[Settings]) -> Optional[Settings]:
+    """
+    Replaces the current settings without reading the files, e.g. to replay recorded traffic
+    against a scratch database. None makes the next get_settings() load them again.
+
+    Returns:
+        The settings that were in use before.
+    """
+    global _settings
+    with _settings_lock:
+        previous, _settings = _settings, settings
+    return previous
+
+
+def add_reload_listener(listener: Callable[[Settings, Settings], None]) -> None:
+    """Registers a callback that is called with (old, new) settings after each successful reload."""
+    _reload_listeners.append(listener)
+
+
+def changed_prompt_keys(old: Settings, new: Settings) -> Set[str]:
+    """Returns the YAML prompt names that were added, removed or modified between two configs."""
+    names = set(old.prompts) | set(new.prompts)
+    return {name for name in names if old.prompts.get(name) != new.prompts.get(name)}
+
+
+# Settings only read while the bot starts (to open connections, files or schedule jobs)
+_RESTART_ONLY_SETTINGS = [
+    "app.database", "app.http", "app.persistence", "app.recording", "app.config_reload",
+    "app.dedup", "app.usage", "app.warm_start", "app.telegram_bot.group_log_flush_seconds",
+    "app.response_cache.enabled", "app.response_cache.disk_path",
+    "app.media.enabled", "app.media.cache_dir", "app.media.cache_max_bytes",
+]
+
+
+def restart_required_changes(old: Settings, new: Settings) -> List[str]:
+    """Returns the settings that differ between two configs but only take effect after a restart."""
+    changed = []
+    for path in _RESTART_ONLY_SETTINGS:
+        old_value, new_value = old, new
+        for name in path.split("."):
+            old_value, new_value = getattr(old_value, name), getattr(new_value, name)
+        if old_value != new_value:
+            changed.append(path)
+    if old.telegram_bot_token != new.telegram_bot_token:
+        changed.append("TELEGRAM_BOT_TOKEN")
+    if old.all_gemini_api_keys() != new.all_gemini_api_keys():
+        changed.append("Gemini API keys")
+    return changed
 
-# 2. Initialize the Settings object.
-# Pydantic-settings will automatically load from the .env file,
-# and then we explicitly pass the loaded YAML data.
-# The `**` operator unpacks our dictionary into keyword arguments.
-settings = Settings(**yaml_data)
 
-# --- Post-config setup ---
-# Ensure the data directory for SQLite exists
-db_path = Path(settings.app.database.url.split(":///")[1])
-db_path.parent.mkdir(parents=True, exist_ok=True)
+def __getattr__(name: str) -> Any:
+    # Keeps `from bot.core.config import settings` working without loading at import time
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
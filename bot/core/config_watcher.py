@@ -0,0 +1,121 @@
+# bot/core/config_watcher.py
+import asyncio
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from bot.core.config import APP_CONFIG_PATH, PROMPTS_CONFIG_PATH, reload_settings
+from bot.core.logging import logger
+
+try:  # Optional: inotify gives us immediate notifications on Linux
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # pragma: no cover - depends on the environment
+    INotify = None
+    inotify_flags = None
+
+# Editors often write a temp file and rename it over the original, so watch for that too
+_INOTIFY_MASK = (
+    (inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO | inotify_flags.CREATE | inotify_flags.DELETE)
+    if inotify_flags else 0
+)
+
+# Wait this long after a change event before reading, so partially written files are skipped
+_DEBOUNCE_SECONDS = 0.2
+
+
+class ConfigWatcher:
+    """
+    Watches the YAML config files and reloads the settings when they change.
+
+    Changes are detected by polling the files' stat info; if `inotify_simple` is installed,
+    inotify events on the config directory trigger an immediate check as well.
+    """
+
+    def __init__(self, paths: Iterable[Path] = (APP_CONFIG_PATH, PROMPTS_CONFIG_PATH),
+                 poll_interval: float = 5.0):
+        self.paths = [Path(p) for p in paths]
+        self.poll_interval = poll_interval
+        self._signatures = self._read_signatures()
+        self._task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+        self._inotify = None
+
+    def start(self) -> None:
+        """Starts watching in the background on the running event loop."""
+        if self._task is not None:
+            return
+        self._start_inotify()
+        self._task = asyncio.create_task(self._run(), name="config_watcher")
+        mode = "inotify + polling" if self._inotify else "polling"
+        logger.info(f"Watching configuration files for changes ({mode}).")
+
+    async def stop(self) -> None:
+        """Stops watching."""
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fileno())
+            self._inotify.close()
+            self._inotify = None
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def check(self) -> bool:
+        """
+        Reloads the settings if any watched file changed since the last check.
+
+        Returns:
+            True if a changed configuration was applied.
+        """
+        signatures = self._read_signatures()
+        if signatures == self._signatures:
+            return False
+        # Remember the new state even if it fails validation, so a broken file is reported
+        # once rather than on every poll; fixing the file changes the signature again.
+        self._signatures = signatures
+        logger.info("Configuration files changed, reloading...")
+        return reload_settings()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.poll_interval)
+                await asyncio.sleep(_DEBOUNCE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error while checking configuration files: {e}", exc_info=True)
+
+    def _read_signatures(self) -> Dict[Path, Optional[Tuple[int, int]]]:
+        signatures = {}
+        for path in self.paths:
+            try:
+                stat = path.stat()
+                signatures[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                signatures[path] = None
+        return signatures
+
+    def _start_inotify(self) -> None:
+        if INotify is None:
+            return
+        try:
+            self._inotify = INotify()
+            for directory in {path.parent for path in self.paths}:
+                self._inotify.add_watch(str(directory), _INOTIFY_MASK)
+            asyncio.get_running_loop().add_reader(self._inotify.fileno(), self._on_inotify_event)
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"inotify is unavailable, falling back to polling only: {e}")
+            if self._inotify is not None:
+                self._inotify.close()
+            self._inotify = None
+
+    def _on_inotify_event(self) -> None:
+        names = {path.name for path in self.paths}
+        if any(event.name in names for event in self._inotify.read(timeout=0)):
+            self._changed.set()
@@ -0,0 +1,123 @@
+# bot/core/http_transport.py
+import importlib.util
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+import httpx
+
+from bot.core.config import HttpConfig, Settings
+from bot.core.logging import logger
+
+if TYPE_CHECKING:
+    from google.genai import types as genai_types
+    from telegram.request import HTTPXRequest
+
+
+class TransportStats:
+    """
+    Counts requests and newly opened connections of one API's HTTP clients, to show how
+    well keep-alive connections are reused.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+
+    async def on_request(self, request: httpx.Request) -> None:
+        # httpx request hook: httpcore reports each connection step to the "trace" extension
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name.endswith("connect_tcp.complete"):
+            self.connections += 1
+
+    def stats(self) -> Dict[str, Any]:
+        reused = max(self.requests - self.connections, 0)
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "reuse_rate": reused / self.requests if self.requests else 0.0,
+        }
+
+
+transport_stats = {"telegram": TransportStats(), "gemini": TransportStats()}
+
+
+def resolve_proxy(settings: Settings) -> Optional[str]:
+    """The proxy for both APIs: http.proxy in app_config.yml, else HTTPS_PROXY / HTTP_PROXY from .env."""
+    return settings.app.http.proxy or settings.https_proxy or settings.http_proxy or None
+
+
+def http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+def _use_http2(config: HttpConfig) -> bool:
+    if config.http2 and not http2_available():
+        logger.info("HTTP/2 is enabled but the 'h2' package is not installed; using HTTP/1.1.")
+        return False
+    return config.http2
+
+
+def telegram_request(settings: Settings, pool_size: Optional[int] = None) -> "HTTPXRequest":
+    """
+    A Bot API request object with the configured pool, timeouts, keep-alive and proxy.
+    getUpdates needs a request object of its own; pass pool_size=1 for it.
+    """
+    from telegram.request import HTTPXRequest
+
+    config = settings.app.http
+    telegram = config.telegram
+    size = pool_size or telegram.pool_size
+    return HTTPXRequest(
+        connection_pool_size=size,
+        proxy=resolve_proxy(settings),
+        read_timeout=telegram.read_timeout,
+        write_timeout=telegram.write_timeout,
+        connect_timeout=telegram.connect_timeout,
+        pool_timeout=telegram.pool_timeout,
+        media_write_timeout=telegram.media_write_timeout,
+        http_version="2" if _use_http2(config) else "1.1",
+        httpx_kwargs={
+            "limits": httpx.Limits(
+                max_connections=size,
+                max_keepalive_connections=size,
+                keepalive_expiry=config.keepalive_expiry_seconds,
+            ),
+            # The proxy comes from the settings, not from the process environment
+            "trust_env": False,
+            "event_hooks": {"request": [transport_stats["telegram"].on_request]},
+        },
+    )
+
+
+def gemini_client_args(settings: Settings) -> Dict[str, Any]:
+    """Arguments for the httpx.AsyncClient of each Gemini client."""
+    config = settings.app.http
+    return {
+        "limits": httpx.Limits(
+            max_connections=config.gemini.max_connections,
+            max_keepalive_connections=config.gemini.max_connections,
+            keepalive_expiry=config.keepalive_expiry_seconds,
+        ),
+        "http2": _use_http2(config),
+        "proxy": resolve_proxy(settings),
+        "trust_env": False,
+        "event_hooks": {"request": [transport_stats["gemini"].on_request]},
+    }
+
+
+def gemini_http_options(settings: Settings) -> "genai_types.HttpOptions":
+    """
+    HttpOptions for genai.Client. The timeout applies to each request as a whole (google-genai
+    passes it per request, which overrides any client-level httpx timeout).
+    """
+    from google.genai import types as genai_types
+
+    options: Dict[str, Any] = {"timeout": int(settings.app.http.gemini.timeout_seconds * 1000)}
+    # With aiohttp installed, google-genai hands async_client_args to aiohttp instead of httpx
+    if importlib.util.find_spec("aiohttp") is None:
+        options["async_client_args"] = gemini_client_args(settings)
+    else:
+        logger.info("google-genai uses aiohttp for async requests; only the Gemini timeout is applied.")
+    return genai_types.HttpOptions(**options)
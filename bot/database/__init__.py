@@ -1,26 +1,66 @@
 # bot/database/__init__.py
+from pathlib import Path
+from typing import Optional
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from .models import Base
-from bot.core.config import settings
+from . import search  # noqa: F401  (registers the prompt full-text index with Base.metadata)
+from . import migrations  # noqa: F401  (upgrades existing tables after create_all)
+from . import query_stats  # noqa: F401  (registers the per-update query counters with every engine)
+from bot.core.config import get_settings
 from bot.core.logging import logger # Import our logger
 
-# Create the SQLAlchemy engine using the database URL from settings
-engine = create_engine(
-    settings.app.database.url,
-    connect_args={"check_same_thread": False}, # Specific to SQLite
-    echo=settings.app.database.echo
-)
+_engine: Optional[Engine] = None
+
+# Create a configured "Session" class. It is bound to the engine on first use of get_engine(),
+# so importing this package doesn't read the configuration or touch the database.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+
+def get_engine() -> Engine:
+    """Returns the SQLAlchemy engine, creating it from the settings on first use."""
+    global _engine
+    if _engine is None:
+        settings = get_settings()
+        url = settings.app.database.url
+        if url.startswith("sqlite:///"):
+            # Ensure the data directory for SQLite exists
+            Path(url.split(":///", 1)[1]).parent.mkdir(parents=True, exist_ok=True)
+        _engine = create_engine(
+            url,
+            connect_args={"check_same_thread": False}, # Specific to SQLite
+            echo=settings.app.database.echo
+        )
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def dispose_engine() -> None:
+    """
+    Closes the engine's pooled connections, e.g. on shutdown. A later get_engine() creates
+    a new engine from the settings then in use.
+    """
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+def __getattr__(name: str):
+    # Keeps `from bot.database import engine` working without creating it at import time
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# Create a configured "Session" class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
     """Initializes the database and creates tables if they don't exist."""
     try:
         logger.info("Initializing database and creating tables...")
         # This is where SQLAlchemy creates the tables defined in models.py
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=get_engine())
         logger.info("Database initialized successfully.")
     except Exception as e:
         logger.error(f"Error during database initialization: {e}")
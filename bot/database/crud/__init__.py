@@ -7,19 +7,43 @@ from .user_crud import get_or_create_user
 from .session_crud import (
     get_or_create_session,
     get_session,
+    get_active_prompt_key, # 只读：菜单显示当前人设，不创建会话也不提交
     update_session,
+    append_to_session_histories,
     reset_session,
-    set_active_prompt_key_for_session  # <--- 关键：添加这一行
+    set_active_prompt_key_for_session,  # <--- 关键：添加这一行
+    get_group_mode, # 群组会话模式：shared / individual
+    set_group_mode,
 )
 
 # --- 从 prompt_crud.py 导入 ---
 from .prompt_crud import (
     create_user_prompt,
     get_all_db_prompts, # 我们现在主要用这个
+    get_db_prompts_page, # 分页显示 prompt 菜单
+    search_prompts, # 全文搜索 (FTS5)
     get_db_prompt_by_id, # 这个也需要被 service 使用
     delete_prompt,
-    # 下面这两个可以删掉了，因为它们的功能已经被取代或修复
-    # get_user_prompts,
+    get_user_prompts, # DEPRECATED，仍被旧代码和测试使用
+    # 下面这些可以删掉了，因为它们的功能已经被取代或修复
     # set_active_prompt_for_user,
     # higet_all_db_prompts, # 这是个拼写错误，也删掉
-)
\ No newline at end of file
+)
+
+# --- 从 usage_crud.py 导入 ---
+from .usage_crud import (
+    add_usage_counts,
+    get_usage_totals,
+    get_top_usage,
+    get_daily_token_totals,
+)
+
+# --- 从 state_crud.py 导入 ---
+from .state_crud import get_bot_state, set_bot_state
+
+# --- 从 context_crud.py 导入 ---
+from .context_crud import load_message_context, save_message_context # 一次查询加载消息上下文，一次提交保存
+from .context_crud import get_recent_message_contexts # 启动预热：最近活跃的会话
+
+# --- 从 persistence_crud.py 导入 ---
+from .persistence_crud import load_persistence_entries, save_persistence_entries # PTB 持久化（批量写入）
@@ -0,0 +1,110 @@
+# bot/database/crud/context_crud.py
+import datetime
+from datetime import timezone
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import Integer, and_, case, cast, func, literal, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, aliased
+import telegram
+
+from .. import models
+from ..history import Turn
+
+
+class MessageContextRow(NamedTuple):
+    session: Optional[models.ChatSessionState]  # None if the session doesn't exist yet
+    shared_prompt_key: Optional[str]  # active_prompt_key of the chat's shared session
+    user: Optional[models.User]
+    db_prompt_text: Optional[str]  # Text of the active prompt if it is a database prompt
+
+
+def _db_prompt_id(prompt_key):
+    # The prompt id of a 'db:<id>' key, NULL for other keys
+    return case((prompt_key.like("db:%"), cast(func.substr(prompt_key, 4), Integer)))
+
+
+def load_message_context(db: Session, chat_id: int, user_id: int, session_user_id: int = 0) -> MessageContextRow:
+    """
+    Loads everything a reply needs in one query: the session, the chat's shared session
+    (whose persona applies to individual sessions too), the sender and the active database prompt.
+    Rows that don't exist come back as None.
+    """
+    session = aliased(models.ChatSessionState)
+    shared = aliased(models.ChatSessionState)
+
+    # A one-row anchor, so every lookup is an outer join and missing rows become NULLs
+    anchor = select(literal(1).label("anchor")).subquery()
+    statement = (
+        select(session, shared.active_prompt_key, models.User, models.Prompt.prompt_text)
+        .select_from(anchor)
+        .outerjoin(session, and_(session.chat_id == chat_id, session.user_id == session_user_id))
+        .outerjoin(shared, and_(shared.chat_id == chat_id, shared.user_id == 0))
+        .outerjoin(models.User, models.User.id == user_id)
+        .outerjoin(models.Prompt, models.Prompt.id == _db_prompt_id(shared.active_prompt_key))
+    )
+    return MessageContextRow(*db.execute(statement).one())
+
+
+def get_recent_message_contexts(db: Session, limit: int) -> List[MessageContextRow]:
+    """
+    Loads the contexts of the `limit` most recently active sessions in one query, most recent
+    first. The rows carry no user (None), which only matters for skipping unchanged user upserts.
+    """
+    session = aliased(models.ChatSessionState)
+    shared = aliased(models.ChatSessionState)
+    statement = (
+        select(session, shared.active_prompt_key, models.Prompt.prompt_text)
+        .outerjoin(shared, and_(shared.chat_id == session.chat_id, shared.user_id == 0))
+        .outerjoin(models.Prompt, models.Prompt.id == _db_prompt_id(shared.active_prompt_key))
+        .order_by(session.last_interaction_at.desc())
+        .limit(limit)
+    )
+    return [
+        MessageContextRow(session=row[0], shared_prompt_key=row[1], user=None, db_prompt_text=row[2])
+        for row in db.execute(statement)
+    ]
+
+
+def save_message_context(db: Session, chat_id: int, session_user_id: int, session_id: Optional[int],
+                         history: List[Turn], messages_since_reply: Optional[int] = None,
+                         active_prompt_key: Optional[str] = None,
+                         user_data: Optional[telegram.User] = None) -> int:
+    """
+    Writes the outcome of a reply with a single commit: the session (created if `session_id`
+    is None), optionally a reset persona, and optionally the sender's user row.
+
+    Returns:
+        The session's id.
+    """
+    now = datetime.datetime.now(timezone.utc)
+    if user_data is not None:
+        statement = insert(models.User).values(
+            id=user_data.id, username=user_data.username, first_name=user_data.first_name,
+            created_at=now, updated_at=now,
+        )
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"username": statement.excluded.username, "first_name": statement.excluded.first_name, "updated_at": now},
+        ))
+
+    values: Dict[str, Any] = {"history": history, "last_interaction_at": now}
+    if messages_since_reply is not None:
+        values["messages_since_last_reply"] = messages_since_reply
+    if active_prompt_key is not None:
+        values["active_prompt_key"] = active_prompt_key
+
+    if session_id is None:
+        db_session = models.ChatSessionState(
+            chat_id=chat_id,
+            user_id=session_user_id,
+            **{"active_prompt_key": models.DEFAULT_PROMPT_KEY, "messages_since_last_reply": 0, **values},
+        )
+        db.add(db_session)
+        db.flush()
+        session_id = db_session.id
+    else:
+        db.execute(update(models.ChatSessionState).where(models.ChatSessionState.id == session_id).values(**values))
+
+    db.commit()
+    return session_id
@@ -0,0 +1,52 @@
+# bot/database/crud/persistence_crud.py
+import datetime
+from datetime import timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# (kind, key) of a PersistenceEntry
+EntryKey = Tuple[str, str]
+
+
+def load_persistence_entries(db: Session, kind: str) -> Dict[str, bytes]:
+    """Returns all stored entries of one kind as {key: data}."""
+    rows = db.execute(
+        select(models.PersistenceEntry.key, models.PersistenceEntry.data).where(models.PersistenceEntry.kind == kind)
+    )
+    return {key: data for key, data in rows}
+
+
+def save_persistence_entries(db: Session, changes: Dict[EntryKey, Optional[bytes]]) -> None:
+    """
+    Writes a batch of entries with one commit: an upsert for each entry with data,
+    and one delete for the entries whose data is None.
+    """
+    if not changes:
+        return
+    now = datetime.datetime.now(timezone.utc)
+    upserts = [
+        {"kind": kind, "key": key, "data": data, "updated_at": now}
+        for (kind, key), data in changes.items() if data is not None
+    ]
+    deletes: Iterable[EntryKey] = [entry for entry, data in changes.items() if data is None]
+
+    if upserts:
+        statement = insert(models.PersistenceEntry)
+        db.execute(
+            statement.on_conflict_do_update(
+                index_elements=["kind", "key"],
+                set_={"data": statement.excluded.data, "updated_at": statement.excluded.updated_at},
+            ),
+            upserts,
+        )
+    if deletes:
+        db.execute(delete(models.PersistenceEntry).where(or_(*(
+            and_(models.PersistenceEntry.kind == kind, models.PersistenceEntry.key == key)
+            for kind, key in deletes
+        ))))
+    db.commit()
@@ -1,5 +1,7 @@
 # bot/database/crud/prompt_crud.py
-from sqlalchemy.orm import Session
+import re
+from sqlalchemy import text
+from sqlalchemy.orm import Session, load_only
 from typing import List, Optional
 
 from .. import models
@@ -18,6 +20,43 @@ def get_all_db_prompts(db: Session) -> List[models.Prompt]:
     """Retrieves all prompts from the database, as they are all shared."""
     return db.query(models.Prompt).order_by(models.Prompt.id).all() # Added order_by for consistency
 
+def get_db_prompts_page(db: Session, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                        limit: int = 10) -> List[models.Prompt]:
+    """
+    Retrieves one page of prompts ordered by ID, using keyset pagination.
+
+    Pass `after_id` for the page following a prompt, or `before_id` for the page preceding it.
+    The result is always in ascending ID order. Only `id` and `title` are loaded, and the
+    cost doesn't depend on how deep into the catalogue the page is.
+    """
+    query = db.query(models.Prompt).options(load_only(models.Prompt.id, models.Prompt.title))
+    if before_id is not None:
+        rows = query.filter(models.Prompt.id < before_id).order_by(models.Prompt.id.desc()).limit(limit).all()
+        return list(reversed(rows))
+    if after_id is not None:
+        query = query.filter(models.Prompt.id > after_id)
+    return query.order_by(models.Prompt.id).limit(limit).all()
+
+def _to_fts_query(query: str) -> str:
+    """Turns free text into an FTS5 query that prefix-matches every word, e.g. 'tra en' -> '"tra"* "en"*'."""
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_prompts(db: Session, query: str, limit: int = 20) -> List[models.Prompt]:
+    """
+    Full-text searches prompt titles and texts (SQLite FTS5), best matches first.
+    Title matches weigh more than matches in the prompt text.
+    """
+    fts_query = _to_fts_query(query)
+    if not fts_query:
+        return []
+    statement = text(
+        "SELECT prompts.* FROM prompts_fts JOIN prompts ON prompts.id = prompts_fts.rowid "
+        "WHERE prompts_fts MATCH :query ORDER BY bm25(prompts_fts, 10.0, 1.0) LIMIT :limit"
+    )
+    return db.query(models.Prompt).from_statement(statement).params(query=fts_query, limit=limit).all()
+
 def get_db_prompt_by_id(db: Session, prompt_id: int) -> Optional[models.Prompt]:
     """Retrieves a single prompt by its primary key ID."""
     return db.query(models.Prompt).filter(models.Prompt.id == prompt_id).first()
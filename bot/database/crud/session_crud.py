@@ -1,25 +1,33 @@
 # bot/database/crud/session_crud.py
 from sqlalchemy.orm import Session
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict
 import datetime
 from datetime import timezone
 
 from .. import models
+from ..history import Turn
 from ...core.logging import logger
 
 
-def get_session(db: Session, chat_id: int) -> Optional[models.ChatSessionState]:
-    """Retrieves a chat session by its chat_id."""
-    return db.query(models.ChatSessionState).filter(models.ChatSessionState.chat_id == chat_id).first()
+def get_session(db: Session, chat_id: int, user_id: int = 0) -> Optional[models.ChatSessionState]:
+    """
+    Retrieves a chat session by its (chat_id, user_id) key.
+    user_id is 0 for a chat's shared session and a member's id for their own session in a group.
+    """
+    return db.query(models.ChatSessionState).filter(
+        models.ChatSessionState.chat_id == chat_id,
+        models.ChatSessionState.user_id == user_id,
+    ).first()
 
 
-def create_session(db: Session, chat_id: int) -> models.ChatSessionState:
+def create_session(db: Session, chat_id: int, user_id: int = 0) -> models.ChatSessionState:
     """Creates a new, empty chat session."""
-    logger.info(f"Creating new chat session for chat_id: {chat_id}")
+    logger.info(f"Creating new chat session for chat_id: {chat_id}, user_id: {user_id}")
     db_session = models.ChatSessionState(
         chat_id=chat_id,
+        user_id=user_id,
         history=[],  # Start with an empty history
-        active_prompt_key='default',
+        active_prompt_key=models.DEFAULT_PROMPT_KEY,
         messages_since_last_reply=0
     )
     db.add(db_session)
@@ -28,11 +36,11 @@ def create_session(db: Session, chat_id: int) -> models.ChatSessionState:
     return db_session
 
 
-def get_or_create_session(db: Session, chat_id: int) -> models.ChatSessionState:
+def get_or_create_session(db: Session, chat_id: int, user_id: int = 0) -> models.ChatSessionState:
     """
-    Retrieves a chat session by its chat_id, or creates a new one if it doesn't exist.
+    Retrieves a chat session by its (chat_id, user_id) key, or creates a new one if it doesn't exist.
     """
-    db_session = get_session(db, chat_id)
+    db_session = get_session(db, chat_id, user_id)
     if db_session:
         # Also update the last interaction time whenever a session is fetched
         db_session.last_interaction_at = datetime.datetime.now(timezone.utc)
@@ -40,15 +48,27 @@ def get_or_create_session(db: Session, chat_id: int) -> models.ChatSessionState:
         db.refresh(db_session)
         return db_session
 
-    return create_session(db, chat_id)
+    return create_session(db, chat_id, user_id)
 
 
-def update_session(db: Session, chat_id: int, new_history: List[Dict[str, Any]],
-                   messages_since_reply: Optional[int] = None) -> Optional[models.ChatSessionState]:
+def get_active_prompt_key(db: Session, chat_id: int) -> str:
+    """
+    Returns the persona of a chat (kept on its shared session) with a single read,
+    without creating the session or touching it.
+    """
+    prompt_key = db.query(models.ChatSessionState.active_prompt_key).filter(
+        models.ChatSessionState.chat_id == chat_id,
+        models.ChatSessionState.user_id == 0,
+    ).scalar()
+    return prompt_key or models.DEFAULT_PROMPT_KEY
+
+
+def update_session(db: Session, chat_id: int, new_history: List[Turn],
+                   messages_since_reply: Optional[int] = None, user_id: int = 0) -> Optional[models.ChatSessionState]:
     """
     Updates a session's history and other state variables.
     """
-    db_session = get_session(db, chat_id)
+    db_session = get_session(db, chat_id, user_id)
     if db_session:
         db_session.history = new_history
         db_session.last_interaction_at = datetime.datetime.now(timezone.utc)
@@ -59,17 +79,53 @@ def update_session(db: Session, chat_id: int, new_history: List[Dict[str, Any]],
         db.refresh(db_session)
         return db_session
     else:
-        logger.warning(f"Attempted to update a non-existent session for chat_id: {chat_id}")
+        logger.warning(f"Attempted to update a non-existent session for chat_id: {chat_id}, user_id: {user_id}")
         return None
 
 
-def reset_session(db: Session, chat_id: int) -> Optional[models.ChatSessionState]:
+def append_to_session_histories(db: Session, pending: Dict[int, List[Turn]]) -> None:
+    """
+    Appends buffered messages to the shared sessions of several chats with a single commit.
+    Each appended message also counts towards the session's messages_since_last_reply.
+    Sessions that don't exist yet are created.
+    """
+    if not pending:
+        return
+
+    existing = {
+        s.chat_id: s
+        for s in db.query(models.ChatSessionState).filter(
+            models.ChatSessionState.chat_id.in_(list(pending)),
+            models.ChatSessionState.user_id == 0,
+        )
+    }
+    now = datetime.datetime.now(timezone.utc)
+    for chat_id, entries in pending.items():
+        db_session = existing.get(chat_id)
+        if db_session is None:
+            logger.info(f"Creating new chat session for chat_id: {chat_id}")
+            db_session = models.ChatSessionState(
+                chat_id=chat_id,
+                history=[],
+                active_prompt_key=models.DEFAULT_PROMPT_KEY,
+                messages_since_last_reply=0
+            )
+            db.add(db_session)
+        # Assign a new list so SQLAlchemy detects the change on the history column
+        db_session.history = list(db_session.history or []) + list(entries)
+        db_session.messages_since_last_reply = (db_session.messages_since_last_reply or 0) + len(entries)
+        db_session.last_interaction_at = now
+
+    db.commit()
+
+
+def reset_session(db: Session, chat_id: int, user_id: int = 0) -> Optional[models.ChatSessionState]:
     """
     Resets a session's history and counters, effectively starting it fresh.
     """
-    db_session = get_session(db, chat_id)
+    db_session = get_session(db, chat_id, user_id)
     if db_session:
-        logger.info(f"Resetting session for chat_id: {chat_id}")
+        logger.info(f"Resetting session for chat_id: {chat_id}, user_id: {user_id}")
         db_session.history = []
         db_session.messages_since_last_reply = 0
         db_session.last_interaction_at = datetime.datetime.now(timezone.utc)
@@ -81,7 +137,8 @@ def reset_session(db: Session, chat_id: int) -> Optional[models.ChatSessionState
 
 def set_active_prompt_key_for_session(db: Session, chat_id: int, prompt_key: str) -> Optional[models.ChatSessionState]:
     """
-    Updates only the active_prompt_key for a specific chat session.
+    Updates only the active_prompt_key of a chat's shared session.
+    Individual sessions in a group always use the persona of the group's shared session.
     """
     db_session = get_session(db, chat_id)
     if db_session:
@@ -94,4 +151,22 @@ def set_active_prompt_key_for_session(db: Session, chat_id: int, prompt_key: str
         logger.warning(f"Attempted to set prompt key for a non-existent session for chat_id: {chat_id}")
         # If the session doesn't exist, we might want to create it first.
         # For now, we'll just return None as the handlers should ensure session exists.
-        return None
\ No newline at end of file
+        return None
+
+
+def get_group_mode(db: Session, chat_id: int) -> str:
+    """Returns a group's session mode: 'shared' (the default) or 'individual'."""
+    setting = db.get(models.GroupSetting, chat_id)
+    return setting.mode if setting else "shared"
+
+
+def set_group_mode(db: Session, chat_id: int, mode: str) -> models.GroupSetting:
+    """Sets a group's session mode."""
+    setting = db.get(models.GroupSetting, chat_id)
+    if setting is None:
+        setting = models.GroupSetting(chat_id=chat_id)
+        db.add(setting)
+    logger.info(f"Setting session mode of chat {chat_id} to '{mode}'")
+    setting.mode = mode
+    db.commit()
+    return setting
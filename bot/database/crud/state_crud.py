@@ -0,0 +1,25 @@
+# bot/database/crud/state_crud.py
+import datetime
+from datetime import timezone
+from typing import Optional
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+def get_bot_state(db: Session, key: str) -> Optional[models.BotState]:
+    """Returns a stored bot state row (value and updated_at), or None if it was never set."""
+    return db.get(models.BotState, key)
+
+
+def set_bot_state(db: Session, key: str, value: int) -> None:
+    """Stores a bot state value (insert or update) and commits."""
+    now = datetime.datetime.now(timezone.utc)
+    statement = insert(models.BotState).values(key=key, value=value, updated_at=now)
+    statement = statement.on_conflict_do_update(
+        index_elements=["key"], set_={"value": statement.excluded.value, "updated_at": now}
+    )
+    db.execute(statement)
+    db.commit()
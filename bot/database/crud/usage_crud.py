@@ -0,0 +1,64 @@
+# bot/database/crud/usage_crud.py
+import datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from .. import models
+
+# (day, scope, subject_id) -> [requests, input_tokens, output_tokens, cached_tokens]
+UsageKey = Tuple[datetime.date, str, int]
+USAGE_FIELDS = ("requests", "input_tokens", "output_tokens", "cached_tokens")
+
+
+def add_usage_counts(db: Session, counts: Dict[UsageKey, List[int]]) -> None:
+    """
+    Adds aggregated usage deltas to the counters table with one batched upsert and one commit.
+    """
+    if not counts:
+        return
+    rows = [
+        {"day": day, "scope": scope, "subject_id": subject_id, **dict(zip(USAGE_FIELDS, values))}
+        for (day, scope, subject_id), values in counts.items()
+    ]
+    statement = insert(models.UsageCounter).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=["day", "scope", "subject_id"],
+        set_={
+            field: getattr(models.UsageCounter, field) + getattr(statement.excluded, field)
+            for field in USAGE_FIELDS
+        },
+    )
+    db.execute(statement)
+    db.commit()
+
+
+def get_usage_totals(db: Session, day: datetime.date) -> Dict[str, int]:
+    """Returns the total usage for a day (summed over the per-chat rows)."""
+    row = db.query(
+        *(func.coalesce(func.sum(getattr(models.UsageCounter, field)), 0) for field in USAGE_FIELDS)
+    ).filter(models.UsageCounter.day == day, models.UsageCounter.scope == "chat").one()
+    return dict(zip(USAGE_FIELDS, row))
+
+
+def get_top_usage(db: Session, day: datetime.date, scope: str, limit: int = 5) -> List[models.UsageCounter]:
+    """Returns the chats or users (depending on `scope`) with the highest token usage on a day."""
+    return (
+        db.query(models.UsageCounter)
+        .filter(models.UsageCounter.day == day, models.UsageCounter.scope == scope)
+        .order_by((models.UsageCounter.input_tokens + models.UsageCounter.output_tokens).desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def get_daily_token_totals(db: Session, day: datetime.date) -> Dict[Tuple[str, int], int]:
+    """Returns the tokens (input + output) used on a day, keyed by (scope, subject_id)."""
+    rows = db.query(
+        models.UsageCounter.scope,
+        models.UsageCounter.subject_id,
+        models.UsageCounter.input_tokens + models.UsageCounter.output_tokens,
+    ).filter(models.UsageCounter.day == day).all()
+    return {(scope, subject_id): tokens for scope, subject_id, tokens in rows}
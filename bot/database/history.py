@@ -0,0 +1,161 @@
+# bot/database/history.py
+import json
+import struct
+import sys
+import zlib
+from array import array
+from typing import Any, Iterable, List, Mapping, Optional, Union
+
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+
+class Turn:
+    """
+    One message of a session history. Slotted, so a long history costs a fraction of the
+    memory of the {"role": ..., "parts": ...} dicts it replaces; item access and equality
+    with such dicts still work, for code and data written against the old format.
+    """
+    __slots__ = ("role", "parts")
+
+    def __init__(self, role: str, parts: str):
+        self.role = role
+        self.parts = parts
+
+    @classmethod
+    def coerce(cls, value: Union["Turn", Mapping[str, Any]]) -> "Turn":
+        if isinstance(value, Turn):
+            return value
+        return cls(value.get("role") or "", value.get("parts") or "")
+
+    def __getitem__(self, key: str) -> str:
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def to_dict(self) -> dict:
+        return {"role": self.role, "parts": self.parts}
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Turn):
+            return self.role == other.role and self.parts == other.parts
+        if isinstance(other, Mapping):
+            return other == self.to_dict()
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash((self.role, self.parts))
+
+    def __repr__(self) -> str:
+        return f"Turn(role={self.role!r}, parts={self.parts!r})"
+
+
+# Blob layout (little endian):
+#   b"HT", version, flags (bit 0: the payload is zlib-compressed), payload
+# Payload:
+#   u32 turn count, u8 number of extra roles, each as u8 length + UTF-8 name,
+#   one role code per turn (u8), one UTF-8 byte length per turn (u32), the concatenated UTF-8 texts
+_MAGIC = b"HT"
+_VERSION = 1
+_COMPRESSED = 0x01
+# Payloads smaller than this aren't worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+_BIG_ENDIAN = sys.byteorder == "big"
+
+ROLES = ("user", "assistant", "model", "system")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+
+def encode_history(turns: Iterable[Union[Turn, Mapping[str, Any]]], compress: bool = True) -> bytes:
+    turns = [Turn.coerce(turn) for turn in turns]
+    role_codes = dict(_ROLE_CODES)
+    extra_roles: List[str] = []
+    codes = bytearray()
+    for turn in turns:
+        code = role_codes.get(turn.role)
+        if code is None:
+            code = role_codes[turn.role] = len(ROLES) + len(extra_roles)
+            extra_roles.append(turn.role)
+        codes.append(code)
+    if len(role_codes) > 255:
+        raise ValueError("A history can't use more than 255 distinct roles")
+
+    texts = [turn.parts.encode("utf-8") for turn in turns]
+    lengths = array("I", map(len, texts))  # 4-byte items on every supported platform
+
+    header = bytearray(struct.pack("<IB", len(turns), len(extra_roles)))
+    for role in extra_roles:
+        name = role.encode("utf-8")
+        header += struct.pack("<B", len(name)) + name
+    payload = b"".join((header, codes, _little_endian(lengths), *texts))
+
+    flags = 0
+    if compress and len(payload) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(payload, 1)
+        if len(compressed) < len(payload):
+            payload, flags = compressed, _COMPRESSED
+    return _MAGIC + bytes((_VERSION, flags)) + payload
+
+
+def decode_history(blob: bytes) -> List[Turn]:
+    if blob[:2] != _MAGIC or blob[2] != _VERSION:
+        raise ValueError("Not an encoded history")
+    body = memoryview(blob)[4:]
+    payload = memoryview(zlib.decompress(body)) if blob[3] & _COMPRESSED else body
+
+    count, extra = struct.unpack_from("<IB", payload)
+    offset = 5
+    roles = list(ROLES)
+    for _ in range(extra):
+        size = payload[offset]
+        roles.append(bytes(payload[offset + 1:offset + 1 + size]).decode("utf-8"))
+        offset += 1 + size
+    codes = payload[offset:offset + count]
+    offset += count
+    lengths = array("I")
+    lengths.frombytes(payload[offset:offset + 4 * count])
+    if _BIG_ENDIAN:
+        lengths.byteswap()
+    offset += 4 * count
+
+    turns = []
+    for code, length in zip(codes, lengths):
+        turns.append(Turn(roles[code], str(payload[offset:offset + length], "utf-8")))
+        offset += length
+    return turns
+
+
+def _little_endian(values: array) -> bytes:
+    if _BIG_ENDIAN:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class HistoryType(TypeDecorator):
+    """
+    Stores a session history as a compact binary blob (see `encode_history`) and loads it
+    as a list of Turns. Values written by the former JSON column are still read.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value: Optional[Iterable[Any]], dialect) -> Optional[bytes]:
+        if value is None:
+            return None
+        return encode_history(value)
+
+    def result_processor(self, dialect, coltype):
+        # Bypasses LargeBinary's processor, which can't take the str of legacy JSON rows
+        return lambda value: self.process_result_value(value, dialect)
+
+    def process_result_value(self, value: Optional[Union[bytes, str]], dialect) -> Optional[List[Turn]]:
+        if value is None:
+            return None
+        if isinstance(value, str) or bytes(value[:2]) != _MAGIC:
+            # A row written by the JSON column
+            return [Turn.coerce(entry) for entry in json.loads(value)]
+        return decode_history(bytes(value))
@@ -0,0 +1,35 @@
+# bot/database/migrations.py
+from sqlalchemy import event, inspect, text
+
+from .models import Base
+
+# Before individual sessions existed, chat_id alone identified a session through this unique index
+LEGACY_SESSION_INDEX = "ix_chat_session_states_chat_id"
+
+
+def migrate_session_keys(connection) -> None:
+    """
+    Upgrades a database from single-column (chat_id) session keys to (chat_id, user_id).
+
+    Existing sessions become the chats' shared sessions (user_id 0), so no history is lost.
+    `create_all` never alters existing tables, hence this runs after it and does nothing
+    on a database that is already up to date.
+    """
+    inspector = inspect(connection)
+    if not inspector.has_table("chat_session_states"):
+        return
+    columns = {column["name"] for column in inspector.get_columns("chat_session_states")}
+    if "user_id" not in columns:
+        connection.execute(text("ALTER TABLE chat_session_states ADD COLUMN user_id INTEGER NOT NULL DEFAULT 0"))
+    indexes = {index["name"] for index in inspector.get_indexes("chat_session_states")}
+    if LEGACY_SESSION_INDEX in indexes:
+        connection.execute(text(f"DROP INDEX {LEGACY_SESSION_INDEX}"))
+    if "ix_chat_session_states_chat_user" not in indexes:
+        connection.execute(text(
+            "CREATE UNIQUE INDEX ix_chat_session_states_chat_user ON chat_session_states (chat_id, user_id)"
+        ))
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _migrate_after_create(target, connection, **kw) -> None:
+    migrate_session_keys(connection)
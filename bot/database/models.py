@@ -6,15 +6,22 @@ from sqlalchemy import (
     Integer,
     String,
     Boolean,
+    Date,
     DateTime, # Important: We use DateTime from sqlalchemy
+    Index,
+    LargeBinary,
     Text,
     ForeignKey,
-    JSON,
 )
 from sqlalchemy.orm import declarative_base, relationship
 
+from .history import HistoryType
+
 Base = declarative_base()
 
+# The persona of a session nobody chose one for: the 'default' entry of prompts.yml
+DEFAULT_PROMPT_KEY = "yaml:default"
+
 
 class User(Base):
     """Represents a Telegram user."""
@@ -58,14 +65,77 @@ class ChatSessionState(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     # This ID can be a user_id for private chats or a group_id for group chats.
-    chat_id = Column(Integer, unique=True, nullable=False, index=True)
-    history = Column(JSON, nullable=False, default=list)
+    chat_id = Column(Integer, nullable=False)
+    # 0 for the chat's shared session; a member's user id for their own session in individual-mode groups
+    user_id = Column(Integer, nullable=False, default=0, server_default="0")
+    history = Column(HistoryType, nullable=False, default=list)  # A list of Turns, stored as a compact blob
     # This key will store values like 'yaml:default' or 'db:123'
-    active_prompt_key = Column(String, nullable=False, default="yaml:default") # <--- 关键：我们将使用此字段
+    active_prompt_key = Column(String, nullable=False, default=DEFAULT_PROMPT_KEY) # <--- 关键：我们将使用此字段
     messages_since_last_reply = Column(Integer, default=0, nullable=False)
 
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.datetime.now(timezone.utc))
     last_interaction_at = Column(DateTime(timezone=True), default=lambda: datetime.datetime.now(timezone.utc))
 
+    __table_args__ = (
+        # Sessions are always looked up by (chat_id, user_id)
+        Index("ix_chat_session_states_chat_user", "chat_id", "user_id", unique=True),
+    )
+
+    def __repr__(self):
+        return f"<ChatSessionState(chat_id={self.chat_id}, user_id={self.user_id}, active_prompt_key='{self.active_prompt_key}')>"
+
+
+class GroupSetting(Base):
+    """Per-group settings, e.g. whether members share one session or each get their own."""
+    __tablename__ = "group_settings"
+
+    chat_id = Column(Integer, primary_key=True, autoincrement=False)
+    mode = Column(String(16), nullable=False, default="shared")  # 'shared' or 'individual'
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.datetime.now(timezone.utc), onupdate=lambda: datetime.datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<GroupSetting(chat_id={self.chat_id}, mode='{self.mode}')>"
+
+
+class UsageCounter(Base):
+    """
+    Pre-aggregated Gemini token usage per day for one chat or one user.
+    Rows are upserted in batches by UsageTracker, so reading stats never scans history.
+    """
+    __tablename__ = "usage_counters"
+
+    day = Column(Date, primary_key=True)
+    scope = Column(String(4), primary_key=True)  # 'chat' or 'user'
+    subject_id = Column(Integer, primary_key=True, autoincrement=False)
+    requests = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(Integer, nullable=False, default=0)
+    output_tokens = Column(Integer, nullable=False, default=0)
+    cached_tokens = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<UsageCounter(day={self.day}, scope='{self.scope}', subject_id={self.subject_id})>"
+
+
+class BotState(Base):
+    """Small durable key/value state of the bot itself, e.g. the last processed update_id."""
+    __tablename__ = "bot_state"
+
+    key = Column(String(64), primary_key=True)
+    value = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.datetime.now(timezone.utc))
+
+    def __repr__(self):
+        return f"<BotState(key='{self.key}', value={self.value})>"
+
+
+class PersistenceEntry(Base):
+    """A pickled piece of python-telegram-bot state: one user's or chat's data, or a conversation's state."""
+    __tablename__ = "ptb_persistence"
+
+    kind = Column(String(64), primary_key=True)  # "user_data", "chat_data" or "conversation:<name>"
+    key = Column(String(128), primary_key=True)  # The user/chat id, or a conversation key as JSON
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.datetime.now(timezone.utc))
+
     def __repr__(self):
-        return f"<ChatSessionState(chat_id={self.chat_id}, active_prompt_key='{self.active_prompt_key}')>"
\ No newline at end of file
+        return f"<PersistenceEntry(kind='{self.kind}', key='{self.key}')>"
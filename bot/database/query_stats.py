@@ -0,0 +1,103 @@
+# bot/database/query_stats.py
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Statements kept per scope, for the message of a failed query budget
+_MAX_STATEMENTS = 50
+
+
+@dataclass
+class QueryStats:
+    """Queries and commits that reached the database within one scope (usually one update)."""
+    queries: int = 0
+    commits: int = 0
+    seconds: float = 0.0
+    statements: List[str] = field(default_factory=list)
+    # Open parts of the scope, e.g. an update's handler task that outlives process_update
+    pending: int = 0
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """The stats of the enclosing `count_queries()` block, or None outside of one."""
+    return _current.get()
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryStats]:
+    """
+    Counts the queries and commits of every engine run inside the block, including tasks
+    created in it (they inherit the context). Blocks don't nest: an inner block counts on its own.
+    """
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class QueryMetrics:
+    """Totals over all finished scopes, reported by /stats."""
+
+    def __init__(self):
+        self.updates = 0
+        self.queries = 0
+        self.commits = 0
+        self.seconds = 0.0
+        self.max_queries = 0
+
+    def record(self, stats: QueryStats) -> None:
+        self.updates += 1
+        self.queries += stats.queries
+        self.commits += stats.commits
+        self.seconds += stats.seconds
+        self.max_queries = max(self.max_queries, stats.queries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "updates": self.updates,
+            "queries": self.queries,
+            "commits": self.commits,
+            "avg_queries": self.queries / self.updates if self.updates else 0.0,
+            "avg_ms": self.seconds * 1000 / self.updates if self.updates else 0.0,
+            "max_queries": self.max_queries,
+        }
+
+
+query_metrics = QueryMetrics()
+
+
+# Listening on the Engine class covers every engine, including the ones tests create.
+# Outside of a count_queries() block the listeners only do a context variable lookup.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("query_started")
+    if stats is None or not started:
+        return
+    stats.seconds += time.perf_counter() - started.pop()
+    stats.queries += 1
+    if len(stats.statements) < _MAX_STATEMENTS:
+        stats.statements.append(" ".join(statement.split()))
+
+
+@event.listens_for(Engine, "commit")
+def _commit(conn):
+    stats = _current.get()
+    if stats is not None:
+        stats.commits += 1
@@ -0,0 +1,63 @@
+# bot/database/search.py
+from sqlalchemy import event, text
+
+from .models import Base
+
+# An external-content FTS5 table mirroring prompts.title and prompts.prompt_text.
+# The triggers keep it in sync with every insert, update and delete on `prompts`.
+PROMPTS_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(
+        title, prompt_text,
+        content='prompts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS prompts_fts_ai AFTER INSERT ON prompts BEGIN
+        INSERT INTO prompts_fts(rowid, title, prompt_text) VALUES (new.id, new.title, new.prompt_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS prompts_fts_ad AFTER DELETE ON prompts BEGIN
+        INSERT INTO prompts_fts(prompts_fts, rowid, title, prompt_text)
+        VALUES ('delete', old.id, old.title, old.prompt_text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS prompts_fts_au AFTER UPDATE ON prompts BEGIN
+        INSERT INTO prompts_fts(prompts_fts, rowid, title, prompt_text)
+        VALUES ('delete', old.id, old.title, old.prompt_text);
+        INSERT INTO prompts_fts(rowid, title, prompt_text) VALUES (new.id, new.title, new.prompt_text);
+    END
+    """,
+]
+
+
+def ensure_prompt_search_index(connection) -> None:
+    """
+    Creates the prompt search index if it is missing, and fills it from existing prompts
+    when it was just created (e.g. on a database that predates full-text search).
+    Only SQLite is supported; other databases are left untouched.
+    """
+    if connection.dialect.name != "sqlite":
+        return
+    existed = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'prompts_fts'")
+    ).first() is not None
+    for statement in PROMPTS_FTS_DDL:
+        connection.execute(text(statement))
+    if not existed:
+        connection.execute(text("INSERT INTO prompts_fts(prompts_fts) VALUES ('rebuild')"))
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_prompt_search_index(target, connection, **kw) -> None:
+    ensure_prompt_search_index(connection)
+
+
+@event.listens_for(Base.metadata, "before_drop")
+def _drop_prompt_search_index(target, connection, **kw) -> None:
+    # Dropping `prompts` doesn't fire the delete trigger, so the index must go with it
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS prompts_fts"))
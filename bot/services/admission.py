@@ -0,0 +1,121 @@
+# bot/services/admission.py
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+from bot.core.config import get_settings
+from bot.core.logging import logger
+from bot.services.model_router import RequestClass
+
+
+class Overloaded(Exception):
+    """Raised by AdmissionController.admit when a request is shed."""
+
+
+class AdmissionController:
+    """
+    Limits how many generations run at once, degrading in steps as load grows.
+
+    Load is the number of running plus queued generations. As it rises past the
+    configured thresholds, probabilistic group interjections are dropped first, then
+    other low-priority requests get a quick "busy" reply, and finally every admitted
+    request, whatever its class, queues for a free slot instead of starting immediately.
+    Private chats are never shed.
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self.shed_interjections = 0
+        self.busy_replies = 0
+        self.throttled = 0
+
+    @property
+    def load(self) -> int:
+        return self.in_flight + len(self._waiters)
+
+    def should_shed(self, request_class: RequestClass) -> bool:
+        """Whether a request of this class would be shed right now (no side effects)."""
+        config = get_settings().app.admission
+        if request_class is RequestClass.GROUP_INTERJECTION:
+            return bool(config.shed_interjections_at) and self.load >= config.shed_interjections_at
+        if request_class is not RequestClass.PRIVATE:
+            return bool(config.busy_reply_at) and self.load >= config.busy_reply_at
+        return False
+
+    @asynccontextmanager
+    async def admit(self, request_class: RequestClass) -> AsyncIterator[None]:
+        """
+        Holds a generation slot for the duration of the block.
+
+        Raises:
+            Overloaded: If the request is shed; the block is not run.
+        """
+        if self.should_shed(request_class):
+            if request_class is RequestClass.GROUP_INTERJECTION:
+                self.shed_interjections += 1
+            else:
+                self.busy_replies += 1
+            logger.info(f"Overloaded (load {self.load}); shedding a {request_class.value} request.")
+            raise Overloaded(request_class.value)
+
+        limit = get_settings().app.admission.max_in_flight
+        if limit and (self.in_flight >= limit or self._waiters):
+            await self._wait_for_slot()
+        else:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _wait_for_slot(self) -> None:
+        # Freed slots are handed to waiters in FIFO order, so in_flight already counts us on wake-up
+        self.throttled += 1
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def fill_free_slots(self) -> int:
+        """
+        Hands slots that are free under the current limit to waiters, e.g. after a
+        configuration reload raised it (otherwise they'd only move as requests finish).
+
+        Returns:
+            The number of waiters admitted.
+        """
+        limit = get_settings().app.admission.max_in_flight
+        admitted = 0
+        while self._waiters and (not limit or self.in_flight < limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+                admitted += 1
+        return admitted
+
+    def _release(self) -> None:
+        limit = get_settings().app.admission.max_in_flight
+        while self._waiters and (not limit or self.in_flight <= limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "shed_interjections": self.shed_interjections,
+            "busy_replies": self.busy_replies,
+            "throttled": self.throttled,
+        }
@@ -1,16 +1,41 @@
 # bot/services/chat_service.py
 import random
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
 
 from sqlalchemy.orm import Session
 import telegram
 
-from bot.core.config import settings
+from bot.core.config import get_settings
 from bot.core.logging import logger
 from bot.database import crud
+from bot.database.history import Turn
 from bot.services.gemini_service import GeminiService
+from bot.services.admission import AdmissionController, Overloaded
+from bot.services.context_loader import DEFAULT_PROMPT_KEY, ContextLoader, MessageContext
+from bot.services.group_log import GroupLogBuffer
+from bot.services.inflight import InFlightGenerations
+from bot.services.media import MediaInput
+from bot.services.model_router import RequestClass
 from bot.services.prompt_service import PromptService
+from bot.services.rate_limiter import RateLimiter
+
+BUSY_REPLY = "I'm a bit overwhelmed right now 😵 Please try again in a moment."
+
+# Group session modes: all members share one session, or each member has their own
+GROUP_MODE_SHARED = "shared"
+GROUP_MODE_INDIVIDUAL = "individual"
+GROUP_MODES = (GROUP_MODE_SHARED, GROUP_MODE_INDIVIDUAL)
+
+# Downloads a message's media; only awaited once the message passed the rate limits and admission
+MediaLoader = Callable[[], Awaitable[Sequence[MediaInput]]]
+# Awaited at the same point, before the media: e.g. shows "typing..." only for messages being answered
+AdmittedCallback = Callable[[], Awaitable[Any]]
+
+
+def with_media_label(text: str, media_kind: Optional[str]) -> str:
+    """The text a message is recorded with in the history; media itself is never stored."""
+    return f"[{media_kind}] {text}".rstrip() if media_kind else text
 
 
 class ChatService:
@@ -19,7 +44,8 @@ class ChatService:
     It orchestrates interactions between the database, the Gemini API, and other services.
     """
 
-    def __init__(self, db: Session, gemini_service: GeminiService, prompt_service: PromptService):
+    def __init__(self, db: Session, gemini_service: GeminiService, prompt_service: PromptService,
+                 rate_limiter: Optional[RateLimiter] = None, admission: Optional[AdmissionController] = None):
         """
         Initializes the ChatService with its dependencies.
 
@@ -27,110 +53,284 @@ class ChatService:
             db: An active SQLAlchemy Session.
             gemini_service: An instance of GeminiService.
             prompt_service: An instance of PromptService.
+            rate_limiter: Optional per-user/per-chat limits, checked before any other work.
+            admission: Overload protection shared by all generations; a new one is created if omitted.
         """
         self.db = db
         self.gemini_service = gemini_service
         self.prompt_service = prompt_service
+        self.rate_limiter = rate_limiter
+        self.admission = admission or AdmissionController()
+        self.group_log = GroupLogBuffer()
+        self.inflight = InFlightGenerations()
+        self.context_loader = ContextLoader(db=db, prompt_service=prompt_service)
+        # chat_id -> session mode; groups are looked up once, then served from memory
+        self._group_modes: Dict[int, str] = {}
         logger.info("ChatService initialized.")
 
-    async def _get_system_prompt(self, chat_id: int, is_group: bool) -> str:
+    def get_group_mode(self, chat_id: int) -> str:
+        """Returns a group's session mode (GROUP_MODE_SHARED or GROUP_MODE_INDIVIDUAL)."""
+        mode = self._group_modes.get(chat_id)
+        if mode is None:
+            mode = self._group_modes[chat_id] = crud.get_group_mode(db=self.db, chat_id=chat_id)
+        return mode
+
+    def set_group_mode(self, chat_id: int, mode: str) -> None:
+        """Switches a group between shared and individual sessions."""
+        crud.set_group_mode(db=self.db, chat_id=chat_id, mode=mode)
+        self._group_modes[chat_id] = mode
+        if mode == GROUP_MODE_INDIVIDUAL:
+            # Chatter is only kept for the shared session
+            self.flush_group_log()
+
+    def session_user_id(self, chat_id: int, user_id: int) -> int:
+        """
+        The user_id part of the session key for a message: the sender in individual-mode groups,
+        otherwise 0 (the chat's shared session; private chats have only that one).
+        """
+        if chat_id < 0 and self.get_group_mode(chat_id) == GROUP_MODE_INDIVIDUAL:
+            return user_id
+        return 0
+
+    def supersedes_on_new_message(self, is_private: bool) -> bool:
+        """Whether a new message cancels the reply the chat is still generating."""
+        policy = get_settings().app.cancellation.on_new_message
+        return policy == "always" or (policy == "private" and is_private)
+
+    def cancel_generation(self, chat_id: int, event: str, user_id: Optional[int] = None) -> bool:
+        """
+        Cancels in-flight generations after /clear ("clear") or a persona switch
+        ("prompt_switch"), if the cancellation policy asks for it.
+        Only the session of `user_id` (a session key part) is affected if it is given, otherwise the whole chat.
+        """
+        policy = get_settings().app.cancellation
+        if getattr(policy, f"on_{event}"):
+            return self.inflight.cancel(chat_id, user_id=user_id, reason=event)
+        return False
+
+    def _get_system_prompt(self, context: MessageContext, is_group: bool) -> Tuple[str, str]:
         """
         Determines the correct system prompt based on the session's active_prompt_key.
+
+        Returns:
+            The system prompt and the prompt key it was built from, which is the
+            default if the active key points to a deleted/invalid prompt.
         """
-        # 1. Get the session to find out which prompt is active for THIS chat.
-        session = crud.get_or_create_session(db=self.db, chat_id=chat_id)
-        active_key = session.active_prompt_key
-        logger.debug(f"Chat {chat_id} is using active prompt key: '{active_key}'")
+        active_key = context.active_prompt_key
+        logger.debug(f"Chat {context.chat_id} is using active prompt key: '{active_key}'")
 
-        # 2. Use the PromptService to get the text for that key (the "payload")
-        payload = self.prompt_service.get_prompt_text_by_key(active_key)
+        # The persona text was loaded with the context (database prompts) or comes from prompts.yml
+        payload = context.prompt_text()
 
         # Fallback if the key points to a deleted/invalid prompt
         if not payload:
             logger.warning(f"Could not resolve prompt key '{active_key}'. Falling back to default.")
-            payload = self.prompt_service.get_prompt_text_by_key("yaml:default")
-            # Also reset the session's key to the valid default
-            crud.set_active_prompt_key_for_session(db=self.db, chat_id=chat_id, prompt_key="yaml:default")
+            active_key = DEFAULT_PROMPT_KEY
+            payload = self.prompt_service.get_prompt_text_by_key(active_key)
 
-        # 3. Determine the Header (context-specific instructions)
+        # Determine the Header (context-specific instructions)
         header = ""
         if is_group:
-            header = settings.app.telegram_bot.group_chat_header
+            header = get_settings().app.telegram_bot.group_chat_header
 
         # Combine header and payload
-        return f"{header}\n\n{payload}".strip()
+        return f"{header}\n\n{payload}".strip(), active_key
 
-    async def handle_private_message(self, user_data: telegram.User, text: str) -> str:
+    async def handle_private_message(self, user_data: telegram.User, text: str,
+                                     load_media: Optional[MediaLoader] = None, media_kind: Optional[str] = None,
+                                     on_admitted: Optional[AdmittedCallback] = None) -> str:
         """
         Handles an incoming message from a private chat.
+        The media from `load_media` is sent to Gemini with the text; the history only records
+        `media_kind` (e.g. "photo"). It's downloaded last, so rate-limited messages cost no download.
+        `on_admitted` is awaited just before, once the message got a generation slot.
         """
         chat_id = user_data.id  # In private chat, chat_id is the user_id
-        crud.get_or_create_user(db=self.db, user_data=user_data)
-        session = crud.get_or_create_session(db=self.db, chat_id=chat_id)
+        if self.rate_limiter:
+            rejection = self.rate_limiter.check(chat_id=chat_id, user_id=user_data.id)
+            if rejection:
+                return rejection
+
+        # Private chats are never shed; under heavy load they wait for a free slot
+        async with self.admission.admit(RequestClass.PRIVATE):
+            if on_admitted:
+                await on_admitted()
+            media = await load_media() if load_media else ()
+            return await self._generate_private_reply(user_data=user_data, text=text, media=media,
+                                                      media_kind=media_kind)
+
+    async def _generate_private_reply(self, user_data: telegram.User, text: str,
+                                      media: Sequence[MediaInput] = (), media_kind: Optional[str] = None) -> str:
+        chat_id = user_data.id
+        # One query at most (often none); everything is written back with one commit below
+        context = self.context_loader.load(chat_id=chat_id, user_data=user_data)
 
         # ... (session timeout logic is fine) ...
 
-        history = session.history.copy() if session.history else []
+        history = list(context.history)
 
         # Get the appropriate system prompt for THIS chat session
-        system_prompt = await self._get_system_prompt(chat_id=chat_id, is_group=False)
+        system_prompt, prompt_key = self._get_system_prompt(context, is_group=False)
+
+        # Stateless personas are answered without history, so their replies can be cached
+        cacheable = self.prompt_service.is_prompt_cacheable(prompt_key)
 
-        # ... (the rest of the function is mostly fine, just ensure chat_id is used consistently) ...
         ai_response = await self.gemini_service.generate_response_async(
             system_prompt=system_prompt,
-            history=history,
-            user_prompt=text
+            history=[] if cacheable else history,
+            user_prompt=text,
+            cacheable=cacheable,
+            cache_tag=prompt_key,
+            chat_id=chat_id,
+            user_id=user_data.id,
+            request_class=RequestClass.PRIVATE,
+            prompt_key=prompt_key,
+            media=media,
         )
 
         if not ai_response:
             ai_response = "I'm sorry, I couldn't come up with a response."
 
-        history.append({"role": "user", "parts": text})
-        history.append({"role": "assistant", "parts": ai_response})
-        crud.update_session(db=self.db, chat_id=chat_id, new_history=history)
+        history.append(Turn("user", with_media_label(text, media_kind)))
+        history.append(Turn("assistant", ai_response))
+        self.context_loader.save(
+            context, user_data=user_data, history=history,
+            # Also reset the session's key if it had to fall back to the default
+            active_prompt_key=prompt_key if prompt_key != context.active_prompt_key else None,
+        )
 
         return ai_response
 
-    async def handle_group_message(self, chat_id: int, user_data: telegram.User, text: str, is_mention: bool) -> Optional[str]:
+    def should_reply_in_group(self, chat_id: int, is_mention: bool) -> bool:
         """
-        Handles an incoming message from a group chat.
+        Decides whether the bot will answer a group message.
+        This is purely in-memory, so it can run before any database or Bot API work.
         """
-        crud.get_or_create_user(db=self.db, user_data=user_data)
-        session = crud.get_or_create_session(db=self.db, chat_id=chat_id)
-
-        # Decide whether to reply
-        should_reply = False
         if is_mention:
-            should_reply = True
             logger.info(f"Bot was mentioned in group {chat_id}. Replying.")
-        elif random.random() < settings.app.telegram_bot.group_reply_probability:
-            should_reply = True
+            return True
+        if self.get_group_mode(chat_id) == GROUP_MODE_INDIVIDUAL:
+            # Members talk to the bot one-to-one; it doesn't join the group conversation
+            return False
+        if self.admission.should_shed(RequestClass.GROUP_INTERJECTION):
+            # Overloaded: interjections nobody asked for are the first thing to go
+            return False
+        if random.random() < get_settings().app.telegram_bot.group_reply_probability:
             logger.info(f"Probabilistic reply triggered in group {chat_id}.")
+            return True
+        return False
+
+    def log_group_message(self, chat_id: int, user_data: telegram.User, text: str) -> None:
+        """
+        Records a group message the bot won't reply to.
+        The message is only buffered; it reaches the database with the next batched flush.
+        Individual-mode groups have no shared conversation, so nothing is kept for them.
+        """
+        if self.get_group_mode(chat_id) == GROUP_MODE_INDIVIDUAL:
+            return
+        pending = self.group_log.append(chat_id, Turn("user", f"{user_data.first_name}: {text}"))
+        if pending >= get_settings().app.telegram_bot.group_log_max_pending:
+            self.flush_group_log()
+
+    def flush_group_log(self) -> int:
+        """
+        Writes all buffered group messages to their sessions in a single commit.
 
-        formatted_text = f"{user_data.first_name}: {text}"
-        history = session.history.copy() if session.history else []
-        history.append({"role": "user", "parts": formatted_text})
+        Returns:
+            The number of messages written.
+        """
+        pending = self.group_log.drain()
+        if not pending:
+            return 0
+        try:
+            crud.append_to_session_histories(db=self.db, pending=pending)
+        except Exception as e:
+            logger.error(f"Failed to flush buffered group messages: {e}", exc_info=True)
+            self.db.rollback()
+            self.group_log.restore(pending)
+            return 0
+        for chat_id in pending:
+            self.context_loader.invalidate(chat_id, user_id=0)
+        count = sum(len(entries) for entries in pending.values())
+        logger.debug(f"Flushed {count} buffered group messages for {len(pending)} chats.")
+        return count
+
+    async def handle_group_message(self, chat_id: int, user_data: telegram.User, text: str, is_mention: bool,
+                                   load_media: Optional[MediaLoader] = None,
+                                   media_kind: Optional[str] = None,
+                                   on_admitted: Optional[AdmittedCallback] = None) -> Optional[str]:
+        """
+        Generates a reply to a group message.
+        Callers decide first with `should_reply_in_group`, and send messages the bot won't
+        answer to `log_group_message` instead. `on_admitted` is awaited and media is only
+        downloaded once the message was admitted.
+        """
+        logged_text = with_media_label(text, media_kind)
+        if self.rate_limiter:
+            rejection = self.rate_limiter.check(chat_id=chat_id, user_id=user_data.id)
+            if rejection:
+                # Keep the message as context, but only tell the user when they asked directly
+                self.log_group_message(chat_id=chat_id, user_data=user_data, text=logged_text)
+                return rejection if is_mention else None
+
+        request_class = RequestClass.GROUP_MENTION if is_mention else RequestClass.GROUP_INTERJECTION
+        try:
+            async with self.admission.admit(request_class):
+                if on_admitted:
+                    await on_admitted()
+                media = await load_media() if load_media else ()
+                return await self._generate_group_reply(
+                    chat_id=chat_id, user_data=user_data, text=logged_text, request_class=request_class, media=media
+                )
+        except Overloaded:
+            self.log_group_message(chat_id=chat_id, user_data=user_data, text=logged_text)
+            return BUSY_REPLY if is_mention else None
+
+    async def _generate_group_reply(self, chat_id: int, user_data: telegram.User, text: str,
+                                    request_class: RequestClass, media: Sequence[MediaInput] = ()) -> Optional[str]:
+        session_user_id = self.session_user_id(chat_id, user_data.id)
+        # The persona is always the group's, kept on the shared session; the loader fetches both at once
+        context = self.context_loader.load(chat_id=chat_id, user_data=user_data, session_user_id=session_user_id)
+
+        # Messages buffered since the last flush are part of the context. The reply takes them
+        # out of the buffer and puts them back unless it's saved, so nothing is lost; until then
+        # the chat isn't flushed, as saving the reply rewrites its history.
+        # An individual session only holds its own member's conversation.
+        buffered = [] if session_user_id else self.group_log.take(chat_id)
+        saved = False
+        try:
+            formatted_text = f"{user_data.first_name}: {text}"
+            history = list(context.history)
+            history.extend(buffered)
+            history.append(Turn("user", formatted_text))
 
-        if should_reply:
             # Correctly get the prompt for THIS group chat
-            system_prompt = await self._get_system_prompt(chat_id=chat_id, is_group=True)
+            system_prompt, prompt_key = self._get_system_prompt(context, is_group=True)
 
             ai_response = await self.gemini_service.generate_response_async(
                 system_prompt=system_prompt,
                 history=history,
-                user_prompt=""
+                user_prompt="",
+                chat_id=chat_id,
+                user_id=user_data.id,
+                request_class=request_class,
+                prompt_key=prompt_key,
+                media=media,
             )
 
             if not ai_response:
                 # Don't save history if AI fails to respond
                 return None
 
-            history.append({"role": "assistant", "parts": ai_response})
+            history.append(Turn("assistant", ai_response))
             # Reset the counter since we replied
-            crud.update_session(db=self.db, chat_id=chat_id, new_history=history, messages_since_reply=0)
+            self.context_loader.save(
+                context, user_data=user_data, history=history, messages_since_reply=0,
+                active_prompt_key=(prompt_key if prompt_key != context.active_prompt_key and not session_user_id
+                                   else None),
+            )
+            saved = True
             return ai_response
-        else:
-            # Not replying, just update history and increment counter
-            new_counter = (session.messages_since_last_reply or 0) + 1
-            crud.update_session(db=self.db, chat_id=chat_id, new_history=history, messages_since_reply=new_counter)
-            return None
+        finally:
+            if not session_user_id:
+                self.group_log.release(chat_id, unsaved=() if saved else buffered)
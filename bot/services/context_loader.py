@@ -0,0 +1,156 @@
+# bot/services/context_loader.py
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+import telegram
+
+from bot.core.config import get_settings
+from bot.database import crud
+from bot.database.crud.context_crud import MessageContextRow
+from bot.database.history import Turn, encode_history
+from bot.database.models import DEFAULT_PROMPT_KEY
+from bot.services.prompt_service import PromptService
+
+_CACHE_SIZE = 1024
+
+
+@dataclass(frozen=True)
+class MessageContext:
+    """Everything ChatService needs about a session to answer one message."""
+    chat_id: int
+    session_user_id: int  # 0 for a chat's shared session
+    session_id: Optional[int]  # None until the session is first saved
+    history: Tuple[Turn, ...]
+    active_prompt_key: str
+    # Text of the active prompt when it's a database prompt; YAML prompts are read from the settings
+    db_prompt_text: Optional[str]
+    catalogue_version: int
+
+    def prompt_text(self) -> Optional[str]:
+        """The active persona's text, or None if the key no longer resolves."""
+        source, _, name = self.active_prompt_key.partition(":")
+        if source == "yaml":
+            prompt_config = get_settings().prompts.get(name)
+            return prompt_config.prompt if prompt_config else None
+        return self.db_prompt_text
+
+
+class ContextLoader:
+    """
+    Loads a message's context (session, persona, sender) with at most one query and saves
+    the outcome with one commit.
+
+    Contexts are cached per session and replaced on every save, so a conversation's
+    next message usually needs no query at all. Anything that changes a session outside
+    of `save` must call `invalidate`.
+    """
+
+    def __init__(self, db: Session, prompt_service: PromptService):
+        self.db = db
+        self.prompt_service = prompt_service
+        self._cache: "OrderedDict[Tuple[int, int], MessageContext]" = OrderedDict()
+        # user_id -> (username, first_name) as stored, to skip unchanged user upserts; an LRU
+        # like the contexts, so a forgotten sender only costs one extra upsert
+        self._users: "OrderedDict[int, Tuple[Optional[str], Optional[str]]]" = OrderedDict()
+
+    def load(self, chat_id: int, user_data: telegram.User, session_user_id: int = 0) -> MessageContext:
+        key = (chat_id, session_user_id)
+        context = self._cache.get(key)
+        if context is not None and context.catalogue_version == self.prompt_service.catalogue_version:
+            self._cache.move_to_end(key)
+            return context
+
+        row = crud.load_message_context(db=self.db, chat_id=chat_id, user_id=user_data.id,
+                                        session_user_id=session_user_id)
+        if row.user is not None:
+            self._remember_user(row.user.id, row.user.username, row.user.first_name)
+        context = self._build(chat_id, session_user_id, row)
+        self._remember(key, context)
+        return context
+
+    def preload(self, limit: int, max_bytes: int) -> int:
+        """
+        Caches the contexts of the most recently active sessions, so their next messages need no query.
+        Stops at `limit` sessions or once their histories would exceed `max_bytes` (encoded size).
+
+        Returns:
+            The number of sessions preloaded.
+        """
+        rows = crud.get_recent_message_contexts(db=self.db, limit=min(limit, _CACHE_SIZE))
+        selected, used = [], 0
+        for row in rows:
+            used += len(encode_history(row.session.history or [], compress=False))
+            if used > max_bytes:
+                break
+            selected.append(row)
+        # Least recent first, so the most recent sessions end up last in the LRU order
+        for row in reversed(selected):
+            key = (row.session.chat_id, row.session.user_id)
+            if key not in self._cache:
+                self._remember(key, self._build(row.session.chat_id, row.session.user_id, row))
+        return len(selected)
+
+    def save(self, context: MessageContext, user_data: telegram.User, history: List[Turn],
+             messages_since_reply: Optional[int] = None, active_prompt_key: Optional[str] = None) -> MessageContext:
+        """
+        Writes the new history plus the sender if they are new or renamed, in one commit.
+        `active_prompt_key` resets the persona; only pass it for a shared session, which is where
+        the persona lives. Returns the updated context, which is cached.
+        """
+        user_changed = self._users.get(user_data.id) != (user_data.username, user_data.first_name)
+        session_id = crud.save_message_context(
+            db=self.db,
+            chat_id=context.chat_id,
+            session_user_id=context.session_user_id,
+            session_id=context.session_id,
+            history=history,
+            messages_since_reply=messages_since_reply,
+            active_prompt_key=active_prompt_key,
+            user_data=user_data if user_changed else None,
+        )
+        self._remember_user(user_data.id, user_data.username, user_data.first_name)
+
+        updated = replace(
+            context,
+            session_id=session_id,
+            history=tuple(history),
+            active_prompt_key=active_prompt_key or context.active_prompt_key,
+        )
+        self._remember((context.chat_id, context.session_user_id), updated)
+        return updated
+
+    def invalidate(self, chat_id: int, user_id: Optional[int] = None) -> None:
+        """Forgets cached contexts of one session, or of all sessions of a chat if `user_id` is None."""
+        if user_id is not None:
+            self._cache.pop((chat_id, user_id), None)
+            return
+        for key in [key for key in self._cache if key[0] == chat_id]:
+            del self._cache[key]
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def _build(self, chat_id: int, session_user_id: int, row: MessageContextRow) -> MessageContext:
+        return MessageContext(
+            chat_id=chat_id,
+            session_user_id=session_user_id,
+            session_id=row.session.id if row.session else None,
+            history=tuple(row.session.history or ()) if row.session else (),
+            active_prompt_key=row.shared_prompt_key or DEFAULT_PROMPT_KEY,
+            db_prompt_text=row.db_prompt_text,
+            catalogue_version=self.prompt_service.catalogue_version,
+        )
+
+    def _remember_user(self, user_id: int, username: Optional[str], first_name: Optional[str]) -> None:
+        self._users[user_id] = (username, first_name)
+        self._users.move_to_end(user_id)
+        while len(self._users) > _CACHE_SIZE:
+            self._users.popitem(last=False)
+
+    def _remember(self, key: Tuple[int, int], context: MessageContext) -> None:
+        self._cache[key] = context
+        self._cache.move_to_end(key)
+        while len(self._cache) > _CACHE_SIZE:
+            self._cache.popitem(last=False)
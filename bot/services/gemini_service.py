@@ -1,14 +1,23 @@
 # bot/services/gemini_service.py
 import asyncio
-from typing import List, Dict, Any, Optional
+from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Sequence
 
-from google import genai
-from google.genai import types as genai_types
-from google.genai.types import HarmCategory
+# google-genai is slow to import, so it's only loaded when the service is actually used.
+if TYPE_CHECKING:
+    from google.genai import types as genai_types
+# from google.genai.types import HarmCategory
 # from google.generativeai.types import HarmBlockThreshold
 
-from bot.core.config import settings
+from bot.core.config import Settings, get_settings
+from bot.core.http_transport import gemini_http_options
 from bot.core.logging import logger
+from bot.database.history import Turn
+from bot.services.hedging import Hedger
+from bot.services.key_pool import ApiKey, KeyPool
+from bot.services.media import MediaInput
+from bot.services.model_router import RequestClass, choose_model
+from bot.services.response_cache import ResponseCache
+from bot.services.usage_service import UsageTracker
 
 
 class GeminiService:
@@ -17,32 +26,103 @@ class GeminiService:
     It follows the new `google-genai` library's patterns.
     """
 
-    def __init__(self):
+    def __init__(self, response_cache: Optional[ResponseCache] = None,
+                 usage_tracker: Optional[UsageTracker] = None,
+                 client_factory: Optional[Callable[[str], Any]] = None):
         """
         Initializes the Gemini client using the API key from settings.
+
+        Args:
+            response_cache: Optional cache used for replies of stateless (cacheable) personas.
+            usage_tracker: Optional tracker that receives the token usage of every response.
+            client_factory: Creates the client for an API key; defaults to a google-genai Client.
+                Replays pass a fake backend here.
         """
-        if not settings.gemini_api_key:
+        self.response_cache = response_cache
+        self.usage_tracker = usage_tracker
+
+        settings = get_settings()
+        self.hedger = Hedger(settings.app.gemini.hedging)
+        api_keys = settings.all_gemini_api_keys()
+        if not api_keys:
             logger.critical("GEMINI_API_KEY is not configured. GeminiService will not function.")
-            self.client = None
+            self.key_pool = None
             return
 
-        self.client = genai.Client(api_key=settings.gemini_api_key)
-        logger.info("GeminiService initialized successfully.")
+        if client_factory is None:
+            from google import genai
+
+            def client_factory(api_key: str) -> Any:
+                return genai.Client(api_key=api_key, http_options=gemini_http_options(settings))
+
+        # One client per key, each with its own connection pool; requests are spread over them by the key pool
+        self.key_pool = KeyPool(keys=api_keys, config=settings.app.gemini.key_pool, client_factory=client_factory)
+        logger.info(f"GeminiService initialized successfully with {len(self.key_pool)} API key(s).")
+
+    def reconfigure(self, settings: Settings) -> None:
+        """
+        Applies reloaded hedging and key pool settings. The set of API keys, the clients and
+        their connection pools stay as they were built until a restart.
+        """
+        self.hedger.reconfigure(settings.app.gemini.hedging)
+        if self.key_pool:
+            self.key_pool.config = settings.app.gemini.key_pool
+
+    async def warm_up(self, timeout: float) -> int:
+        """
+        Opens a connection with every API key (a model metadata request), so the first
+        replies after a restart don't pay for the TLS handshakes.
+
+        Returns:
+            The number of keys that connected.
+        """
+        if not self.key_pool:
+            return 0
+        model_name = get_settings().app.gemini.model_name
+
+        async def connect(key: ApiKey) -> bool:
+            try:
+                await asyncio.wait_for(key.client.aio.models.get(model=model_name), timeout)
+                return True
+            except Exception as e:
+                logger.warning(f"Could not warm up the connection for Gemini {key.label}: {e}")
+                return False
+
+        return sum(await asyncio.gather(*(connect(key) for key in self.key_pool.keys)))
+
+    async def close(self) -> None:
+        """Closes the keys' HTTP connection pools."""
+        if not self.key_pool:
+            return
+        for key in self.key_pool.keys:
+            aclose = getattr(getattr(key.client, "aio", None), "aclose", None)
+            if aclose is not None:
+                await aclose()
+                continue
+            # google-genai 1.20 and older have no public close(): fall back to the async httpx
+            # client that holds the pool, if these private attributes are still there
+            api_client = getattr(key.client, "_api_client", None)
+            http_client = getattr(api_client, "_async_httpx_client", None)
+            if http_client is not None:
+                await http_client.aclose()
 
-    def _format_history(self, history: List[Dict[str, Any]]) -> List[genai_types.Content]:
+    def _format_history(self, history: Sequence[Turn]) -> List["genai_types.Content"]:
         """
         Converts our internal chat history format to the format required by the google-genai library.
 
         Args:
-            history: A list of dictionaries, e.g., [{"role": "user", "parts": "Hello"}]
+            history: A list of Turns, e.g., [Turn("user", "Hello")]
 
         Returns:
             A list of genai_types.Content objects.
         """
+        from google.genai import types as genai_types
+
         formatted_history = []
         for item in history:
-            role = item.get("role")
-            parts_text = item.get("parts")
+            turn = Turn.coerce(item)
+            role = turn.role
+            parts_text = turn.parts
             # The API expects role to be 'user' or 'model'.
             # We ensure consistency here.
             if role == "assistant":
@@ -56,8 +136,15 @@ class GeminiService:
     async def generate_response_async(
             self,
             system_prompt: str,
-            history: List[Dict[str, Any]],
-            user_prompt: str
+            history: Sequence[Turn],
+            user_prompt: str,
+            cacheable: bool = False,
+            cache_tag: Optional[str] = None,
+            chat_id: Optional[int] = None,
+            user_id: Optional[int] = None,
+            request_class: RequestClass = RequestClass.PRIVATE,
+            prompt_key: Optional[str] = None,
+            media: Sequence[MediaInput] = ()
     ) -> Optional[str]:
         """
         Generates a response from the Gemini API asynchronously.
@@ -66,18 +153,50 @@ class GeminiService:
             system_prompt: The system instruction for the model.
             history: The conversation history.
             user_prompt: The latest user message to respond to.
+            cacheable: If True, the reply may be served from / stored in the response cache.
+                Only set this for stateless personas, as the history is not part of the cache key.
+            cache_tag: Tag stored with a cached reply (the prompt key), used to invalidate it
+                when that prompt changes.
+            chat_id: The chat the request is made for, used for usage accounting.
+            user_id: The user the request is made for, used for usage accounting.
+            request_class: The kind of request, used to route it to a model.
+            prompt_key: The active prompt key, whose persona may override the model.
+            media: Photos, voice notes etc. sent with the user prompt, as inline parts.
 
         Returns:
             The generated text response as a string, or None if an error occurs.
         """
-        if not self.client:
+        # Use one settings snapshot for the whole request
+        settings = get_settings()
+        model = choose_model(request_class, history_size=len(history), prompt_key=prompt_key, settings=settings)
+
+        cache_key = None
+        # The cache key only covers text, so replies to media are never cached
+        if cacheable and not media and self.response_cache is not None:
+            cache_key = ResponseCache.make_key(
+                model_name=model.model_name,
+                system_prompt=system_prompt,
+                generation_config=model.generation_config,
+                text=user_prompt,
+            )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                logger.debug("Serving Gemini reply from the response cache.")
+                return cached
+
+        if not self.key_pool:
             logger.error("Gemini client is not initialized. Cannot generate response.")
             return "Error: AI service is not configured."
 
+        from google.genai import types as genai_types
+
         try:
             # Format history and add the new user prompt
             full_contents = self._format_history(history)
-            full_contents.append(genai_types.Content(role="user", parts=[genai_types.Part.from_text(text=user_prompt)]))
+            parts = [genai_types.Part.from_bytes(data=item.data, mime_type=item.mime_type) for item in media]
+            if user_prompt or not parts:
+                parts.append(genai_types.Part.from_text(text=user_prompt))
+            full_contents.append(genai_types.Content(role="user", parts=parts))
 
             # Define safety settings to be less restrictive
             # safety_settings = [
@@ -103,21 +222,27 @@ class GeminiService:
             generation_config = genai_types.GenerateContentConfig(
                 system_instruction=[genai_types.Part.from_text(text=system_prompt)],
                 # safety_settings=safety_settings  # <-- MOVED TO THE CORRECT LOCATION
+                **model.generation_config,
             )
 
-            logger.debug(f"Sending request to Gemini with model: {settings.app.gemini.model_name}")
+            logger.debug(f"Sending {request_class.value} request to Gemini with model: {model.model_name}")
 
-            # 4. Run the synchronous API call in a separate thread
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
-                model=settings.app.gemini.model_name,
+            # 4. Send the request, hedging it if it turns out to be slow
+            response = await self._generate(
+                model=model.model_name,
                 contents=full_contents,
                 config=generation_config,
                 # No safety_settings argument here anymore
             )
 
+            if self.usage_tracker is not None and response is not None and response.usage_metadata:
+                self.usage_tracker.record_response(chat_id, user_id, response.usage_metadata)
+
             # 5. Extract and return the text from the response
             if response and response.text:
+                # Only genuine answers are cached; errors and blocked prompts fall through below
+                if cache_key is not None:
+                    self.response_cache.set(cache_key, response.text, tag=cache_tag)
                 return response.text
             else:
                 logger.warning("Gemini API returned an empty response.")
@@ -129,3 +254,57 @@ class GeminiService:
         except Exception as e:
             logger.error(f"An error occurred while generating Gemini response: {e}", exc_info=True)
             return "I'm sorry, an error occurred while I was thinking."
+
+    async def _generate(self, **request: Any) -> "genai_types.GenerateContentResponse":
+        """
+        Sends a request, with a hedge request if hedging is enabled and there is
+        another key or a hedge model to send it to.
+
+        Only the winner's token usage is recorded: a cancelled request reports none, though
+        it may have been billed. The hedger counts every hedge against its budget when it
+        is sent, so that spend stays bounded by `max_extra_fraction`.
+        """
+        hedging = self.hedger.config
+        if not hedging.enabled or (len(self.key_pool) < 2 and not hedging.model_name):
+            return await self._generate_with_pool(**request)
+
+        hedge_request = dict(request, model=hedging.model_name or request["model"])
+        # The primary's key is chosen up front so the hedge can avoid it: it may be the slow
+        # or rate-limited one. With a single key, the hedge only differs by its model.
+        primary_key = self.key_pool.acquire()
+        exclude = {primary_key.index} if len(self.key_pool) > 1 else set()
+        return await self.hedger.run(
+            primary=lambda: self._generate_with_pool(key=primary_key, **request),
+            hedge=lambda: self._generate_with_pool(exclude=exclude, **hedge_request),
+        )
+
+    async def _generate_with_pool(self, key: Optional[ApiKey] = None, exclude: Iterable[int] = (),
+                                  **request: Any) -> "genai_types.GenerateContentResponse":
+        """
+        Sends a generate_content request using `key`, or else a key from the pool that is
+        not in `exclude`. A request that is rate limited (429) is retried once on each other key.
+        """
+        from google.genai import errors as genai_errors
+
+        tried = set(exclude)
+        while True:
+            if key is None:
+                key = self.key_pool.acquire(exclude=tried)
+            tried.add(key.index)
+            try:
+                with self.key_pool.lease(key):
+                    # The async client lets a losing hedge be cancelled mid-request
+                    response = await key.client.aio.models.generate_content(**request)
+            except genai_errors.APIError as e:
+                rate_limited = e.code == 429
+                self.key_pool.report_error(key, rate_limited=rate_limited)
+                if rate_limited and len(tried) < len(self.key_pool):
+                    logger.info(f"Gemini {key.label} is rate limited; retrying with another key.")
+                    key = None
+                    continue
+                raise
+            except Exception:
+                self.key_pool.report_error(key)
+                raise
+            self.key_pool.report_success(key)
+            return response
@@ -0,0 +1,71 @@
+# bot/services/group_log.py
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Set
+
+from bot.database.history import Turn
+
+
+class GroupLogBuffer:
+    """
+    An in-memory buffer of group messages the bot did not reply to.
+
+    Appending is a plain list append, so the common case in a busy group (a message
+    the bot ignores) costs no database work. The buffered entries are written to the
+    session histories in batches by `ChatService.flush_group_log`.
+
+    While a reply is being generated for a chat, the reply owns the entries it took and
+    the chat is held back from `drain`: the reply's save rewrites the whole history, so
+    a flush in the meantime would be overwritten. Entries arriving meanwhile stay buffered
+    and are flushed after the reply.
+    """
+
+    def __init__(self):
+        self._pending: Dict[int, List[Turn]] = defaultdict(list)
+        # chat_id -> replies in progress
+        self._held: Counter = Counter()
+        # Held chats that were dropped since: their replies' entries are not put back
+        self._dropped: Set[int] = set()
+
+    def append(self, chat_id: int, entry: Turn) -> int:
+        """Buffers a history entry and returns the number of entries pending for the chat."""
+        entries = self._pending[chat_id]
+        entries.append(entry)
+        return len(entries)
+
+    def take(self, chat_id: int) -> List[Turn]:
+        """
+        Removes and returns the entries pending for a chat, for a reply that will save them.
+        The chat is held back from `drain` until the reply calls `release`.
+        """
+        self._held[chat_id] += 1
+        return self._pending.pop(chat_id, [])
+
+    def release(self, chat_id: int, unsaved: Sequence[Turn] = ()) -> None:
+        """Ends a reply started with `take`; `unsaved` entries (if it failed) go back in front."""
+        if unsaved and chat_id not in self._dropped:
+            self._pending[chat_id][:0] = unsaved
+        self._held[chat_id] -= 1
+        if self._held[chat_id] <= 0:
+            del self._held[chat_id]
+            self._dropped.discard(chat_id)
+
+    def drop(self, chat_id: int) -> None:
+        """Forgets everything pending for a chat, e.g. when its history is cleared, including what replies took."""
+        self._pending.pop(chat_id, None)
+        if chat_id in self._held:
+            self._dropped.add(chat_id)
+
+    def drain(self) -> Dict[int, List[Turn]]:
+        """Removes and returns everything pending, keyed by chat_id, except for chats with a reply in progress."""
+        pending = {chat_id: entries for chat_id, entries in self._pending.items() if chat_id not in self._held}
+        for chat_id in pending:
+            del self._pending[chat_id]
+        return pending
+
+    def restore(self, pending: Dict[int, List[Turn]]) -> None:
+        """Puts drained entries back in front of anything buffered since (e.g. after a failed flush)."""
+        for chat_id, entries in pending.items():
+            self._pending[chat_id][:0] = entries
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._pending.values())
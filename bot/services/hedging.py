@@ -0,0 +1,97 @@
+# bot/services/hedging.py
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from bot.core.config import HedgingConfig
+from bot.core.logging import logger
+
+
+class Hedger:
+    """
+    Sends a duplicate (hedge) request when the first one is slower than usual.
+
+    The hedge goes out once the primary has run longer than a percentile of recent
+    latencies; whichever finishes first wins and the other is cancelled. Hedges are
+    capped at `max_extra_fraction` of all requests, so the extra spend stays bounded.
+    """
+
+    def __init__(self, config: HedgingConfig):
+        self.config = config
+        self._latencies: Deque[float] = deque(maxlen=config.window)
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def reconfigure(self, config: HedgingConfig) -> None:
+        """Applies a reloaded hedging config, keeping the latencies measured so far."""
+        self.config = config
+        if self._latencies.maxlen != config.window:
+            self._latencies = deque(self._latencies, maxlen=config.window)
+
+    def record_latency(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def delay(self) -> Optional[float]:
+        """How long to wait before hedging, or None while there are too few samples."""
+        if len(self._latencies) < self.config.min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, math.ceil(self.config.percentile / 100 * len(ordered)) - 1)
+        return max(ordered[index], self.config.min_delay_seconds)
+
+    def _within_budget(self) -> bool:
+        return self.hedged + 1 <= self.config.max_extra_fraction * self.requests
+
+    async def run(self, primary: Callable[[], Awaitable[Any]], hedge: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Awaits `primary()`, starting `hedge()` as well if the primary is slow.
+        The first successful result is returned; if both fail, the primary's error is raised.
+        """
+        self.requests += 1
+        delay = self.delay()
+        started = time.monotonic()
+        primary_task = asyncio.ensure_future(primary())
+        tasks = [primary_task]
+        # Whatever is unfinished when this returns or is cancelled (superseded, /clear,
+        # the shutdown deadline) is cancelled, so no request keeps spending tokens
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({primary_task}, timeout=delay)
+                if not done and self._within_budget():
+                    self.hedged += 1
+                    logger.debug(f"Gemini request slower than {delay:.2f}s; sending a hedge request.")
+                    hedge_task = asyncio.ensure_future(hedge())
+                    tasks.append(hedge_task)
+                    pending = {primary_task, hedge_task}
+                    while pending:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            if task.exception() is None:
+                                if task is hedge_task:
+                                    self.hedge_wins += 1
+                                # When the hedge wins this is a lower bound of the primary's latency;
+                                # leaving it out would bias the percentile towards fast requests
+                                self.record_latency(time.monotonic() - started)
+                                return task.result()
+                    # Both failed
+                    return primary_task.result()
+
+            result = await primary_task
+            self.record_latency(time.monotonic() - started)
+            return result
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+            "delay_seconds": self.delay(),
+        }
@@ -0,0 +1,124 @@
+# bot/services/inflight.py
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from bot.core.logging import logger
+
+# (chat_id, user_id) as in ChatSessionState; user_id is 0 for a chat's shared session
+SessionKey = Tuple[int, int]
+
+
+class InFlightGenerations:
+    """
+    Tracks the reply generation running for each session, so it can be cancelled once superseded
+    (by /clear, a persona switch or a newer message).
+
+    Generations for the same session run one at a time. A cancelled generation stops at its
+    next await (normally the Gemini call), so it never reaches `update_session`;
+    generations still waiting their turn when the session is cancelled are dropped as well.
+    """
+
+    def __init__(self):
+        self._running: Dict[SessionKey, "asyncio.Task[Any]"] = {}
+        self._locks: Dict[SessionKey, asyncio.Lock] = {}
+        self._users: Dict[SessionKey, int] = {}
+        # Bumped on every cancel; a generation started under an older epoch is stale
+        self._epochs: Dict[SessionKey, int] = {}
+        self._superseded: Set["asyncio.Task[Any]"] = set()
+        self.cancelled = 0
+        # Set once the shutdown deadline has passed; no generation runs after that
+        self.closed = False
+        self._drain_timer: Optional[asyncio.TimerHandle] = None
+
+    def __contains__(self, key: SessionKey) -> bool:
+        return key in self._running
+
+    async def run(self, key: SessionKey, generate: Callable[[], Awaitable[Any]], supersede: bool = False) -> Optional[Any]:
+        """
+        Runs `generate()` as the session's generation.
+
+        Args:
+            key: The session the generation belongs to.
+            generate: Creates the coroutine to run; it's only called once it's this generation's turn.
+            supersede: Cancel whatever the session is already generating instead of waiting for it.
+
+        Returns:
+            The result of the generation, or None if it was cancelled.
+        """
+        if self.closed:
+            return None
+        if supersede:
+            self._cancel(key, reason="newer message")
+        epoch = self._epochs.get(key, 0)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                if self._epochs.get(key, 0) != epoch:
+                    return None
+                task = asyncio.ensure_future(generate())
+                self._running[key] = task
+                try:
+                    return await task
+                except asyncio.CancelledError:
+                    if task in self._superseded:
+                        return None
+                    raise
+                finally:
+                    self._superseded.discard(task)
+                    del self._running[key]
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key], self._locks[key]
+                self._epochs.pop(key, None)
+
+    def cancel(self, chat_id: int, user_id: Optional[int] = None, reason: str = "") -> bool:
+        """
+        Cancels the running and waiting generations of one session, or of every session
+        of the chat if `user_id` is None.
+
+        Returns:
+            True if a running generation was cancelled.
+        """
+        keys = [(chat_id, user_id)] if user_id is not None else [key for key in self._users if key[0] == chat_id]
+        cancelled = False
+        for key in keys:
+            cancelled = self._cancel(key, reason) or cancelled
+        return cancelled
+
+    def start_draining(self, timeout: float) -> None:
+        """
+        For shutdown: lets running and waiting generations finish for up to `timeout` seconds,
+        then cancels whatever is left and refuses new generations.
+        """
+        self._drain_timer = asyncio.get_running_loop().call_later(timeout, self._close)
+
+    def stop_draining(self) -> None:
+        if self._drain_timer is not None:
+            self._drain_timer.cancel()
+            self._drain_timer = None
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def _close(self) -> None:
+        self.closed = True
+        self._drain_timer = None
+        cancelled = sum(self._cancel(key, reason="shutdown") for key in list(self._users))
+        if cancelled:
+            logger.warning(f"Shutdown deadline reached; cancelled {cancelled} generation(s).")
+
+    def _cancel(self, key: SessionKey, reason: str) -> bool:
+        if key not in self._users:
+            return False
+        self._epochs[key] = self._epochs.get(key, 0) + 1
+        task = self._running.get(key)
+        if task is None or task.done():
+            return False
+        self._superseded.add(task)
+        task.cancel()
+        self.cancelled += 1
+        logger.info(f"Cancelled the in-flight generation for session {key} ({reason or 'superseded'}).")
+        return True
@@ -0,0 +1,129 @@
+# bot/services/key_pool.py
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Set
+
+from bot.core.config import KeyPoolConfig
+from bot.core.logging import logger
+
+WINDOW_SECONDS = 60.0
+
+
+class ApiKey:
+    """One Gemini API key with its client, its own request window and its health state."""
+
+    def __init__(self, index: int, key: str, client: Any):
+        self.index = index
+        self.key = key
+        self.client = client
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.consecutive_rate_limits = 0
+        self.cooldown_until = 0.0
+        self._window: Deque[float] = deque()
+
+    @property
+    def label(self) -> str:
+        """A name for logs and metrics that doesn't reveal the key."""
+        return f"key{self.index}(…{self.key[-4:]})"
+
+    def recent_requests(self, now: float) -> int:
+        while self._window and self._window[0] <= now - WINDOW_SECONDS:
+            self._window.popleft()
+        return len(self._window)
+
+    def begin(self, now: float) -> None:
+        self.in_flight += 1
+        self.requests += 1
+        self._window.append(now)
+
+    def load(self, now: float) -> int:
+        return self.in_flight + self.recent_requests(now)
+
+
+class KeyPool:
+    """
+    Spreads Gemini requests over several API keys.
+
+    Keys are picked least-loaded first (in-flight plus last-minute requests) or in
+    round-robin order. A key that is rate limited (HTTP 429) is cooled down, with the
+    cooldown doubling on consecutive 429s; it rejoins the pool when the cooldown ends.
+    """
+
+    def __init__(self, keys: List[str], config: KeyPoolConfig, client_factory: Callable[[str], Any]):
+        self.config = config
+        self.keys = [ApiKey(index, key, client_factory(key)) for index, key in enumerate(keys)]
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def acquire(self, exclude: Optional[Set[int]] = None) -> Optional[ApiKey]:
+        """
+        Picks a key for the next request, skipping the indexes in `exclude`.
+        Cooling-down keys and keys at their per-minute limit are only used if no other key is left.
+        """
+        now = time.monotonic()
+        candidates = [key for key in self.keys if not exclude or key.index not in exclude]
+        if not candidates:
+            return None
+        healthy = [key for key in candidates if key.cooldown_until <= now and not self._at_limit(key, now)]
+        if not healthy:
+            # Everything is saturated: use the key that recovers first rather than failing outright
+            return min(candidates, key=lambda key: key.cooldown_until)
+
+        if self.config.strategy == "round_robin":
+            ordered = sorted(healthy, key=lambda key: (key.index - self._next) % len(self.keys))
+            chosen = ordered[0]
+            self._next = (chosen.index + 1) % len(self.keys)
+            return chosen
+        return min(healthy, key=lambda key: (key.load(now), key.index))
+
+    @contextmanager
+    def lease(self, key: ApiKey) -> Iterator[ApiKey]:
+        """Counts a request against a key for as long as it runs."""
+        key.begin(time.monotonic())
+        try:
+            yield key
+        finally:
+            key.in_flight -= 1
+
+    def report_success(self, key: ApiKey) -> None:
+        key.consecutive_rate_limits = 0
+
+    def report_error(self, key: ApiKey, rate_limited: bool = False) -> None:
+        """Records a failed request; a rate-limited key is taken out of rotation for a while."""
+        key.errors += 1
+        if not rate_limited:
+            return
+        key.rate_limited += 1
+        key.consecutive_rate_limits += 1
+        cooldown = min(
+            self.config.cooldown_seconds * 2 ** (key.consecutive_rate_limits - 1),
+            self.config.max_cooldown_seconds,
+        )
+        key.cooldown_until = time.monotonic() + cooldown
+        logger.warning(f"Gemini {key.label} is rate limited; cooling down for {cooldown:.0f}s.")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Per-key usage and health, safe to show to admins."""
+        now = time.monotonic()
+        return [
+            {
+                "key": key.label,
+                "requests": key.requests,
+                "last_minute": key.recent_requests(now),
+                "in_flight": key.in_flight,
+                "errors": key.errors,
+                "rate_limited": key.rate_limited,
+                "cooldown_seconds": max(0, round(key.cooldown_until - now)),
+            }
+            for key in self.keys
+        ]
+
+    def _at_limit(self, key: ApiKey, now: float) -> bool:
+        limit = self.config.requests_per_minute
+        return bool(limit) and key.recent_requests(now) >= limit
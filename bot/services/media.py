@@ -0,0 +1,112 @@
+# bot/services/media.py
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from bot.core.logging import logger
+
+# file_unique_ids are URL-safe base64; anything else is not used as a file name
+_SAFE_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+@dataclass(frozen=True)
+class MediaInput:
+    """A downloaded photo, voice note or document, sent to Gemini as an inline part."""
+    data: bytes
+    mime_type: str
+
+
+class MediaTooLarge(Exception):
+    """Raised for media over the configured size limit, before anything is downloaded if possible."""
+
+    def __init__(self, size: int, limit: int):
+        super().__init__(f"Media of {size} bytes exceeds the limit of {limit} bytes")
+        self.size = size
+        self.limit = limit
+
+
+class UnsupportedMedia(Exception):
+    """Raised for media of a type Gemini can't read, before anything is downloaded."""
+
+    def __init__(self, mime_type: str):
+        super().__init__(f"Media of type {mime_type} is not supported")
+        self.mime_type = mime_type
+
+
+class MediaCache:
+    """
+    A bounded on-disk LRU of downloaded Telegram files, keyed by `file_unique_id`.
+
+    Unlike file_id, the unique id is the same for every copy of a file, so forwarded
+    and re-sent media hit the cache. Recency is kept as the files' modification time,
+    so the LRU order survives restarts.
+
+    Reads and writes block (files are up to 20 MB); call them off the event loop,
+    e.g. with asyncio.to_thread. The index is guarded by a lock.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        # file_unique_id -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        files = [path for path in self.directory.iterdir() if path.is_file() and _SAFE_ID.match(path.name)]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            size = path.stat().st_size
+            self._entries[path.name] = size
+            self._size += size
+        with self._lock:
+            self._evict()
+        logger.info(f"Media cache at {self.directory}: {len(self._entries)} files, {self._size} bytes.")
+
+    def get(self, file_unique_id: str) -> Optional[bytes]:
+        """Returns the cached file's content, or None if it isn't cached."""
+        with self._lock:
+            if file_unique_id not in self._entries:
+                self.misses += 1
+                return None
+            path = self.directory / file_unique_id
+            try:
+                data = path.read_bytes()
+                os.utime(path)
+            except OSError:
+                # Deleted behind our back
+                self._size -= self._entries.pop(file_unique_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(file_unique_id)
+            self.hits += 1
+            return data
+
+    def put(self, file_unique_id: str, data: bytes) -> None:
+        """Stores a file, evicting the least recently used ones if the cache gets too big."""
+        if not _SAFE_ID.match(file_unique_id) or len(data) > self.max_bytes:
+            return
+        with self._lock:
+            path = self.directory / file_unique_id
+            # Written under a temporary name first, so a crash never leaves a truncated file
+            temporary = path.with_name(f".{file_unique_id}.tmp")
+            temporary.write_bytes(data)
+            os.replace(temporary, path)
+            self._size += len(data) - self._entries.pop(file_unique_id, 0)
+            self._entries[file_unique_id] = len(data)
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes and self._entries:
+            file_unique_id, size = self._entries.popitem(last=False)
+            self._size -= size
+            try:
+                (self.directory / file_unique_id).unlink()
+            except OSError:
+                pass
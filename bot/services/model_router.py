@@ -0,0 +1,42 @@
+# bot/services/model_router.py
+from typing import Any, Dict, NamedTuple, Optional
+
+# RequestClass lives with the config, which validates the route names against it
+from bot.core.config import ModelRoute, RequestClass, Settings, get_settings
+
+
+class ModelChoice(NamedTuple):
+    model_name: str
+    generation_config: Dict[str, Any]  # Only the parameters that are set
+
+
+def choose_model(request_class: RequestClass, history_size: int = 0, prompt_key: Optional[str] = None,
+                 settings: Optional[Settings] = None) -> ModelChoice:
+    """
+    Picks the model and generation parameters for a request.
+
+    Later rules override earlier ones: the `gemini` defaults, the route of the request class,
+    the long-context route (if the history is large enough), and finally the `model` block
+    of the active YAML persona.
+    """
+    settings = settings or get_settings()
+    gemini = settings.app.gemini
+
+    model_name = gemini.model_name
+    generation_config = gemini.generation_config.model_dump(exclude_none=True)
+
+    def apply(route: Optional[ModelRoute]) -> None:
+        nonlocal model_name
+        if route is None:
+            return
+        model_name = route.model_name or model_name
+        generation_config.update(route.generation_config.model_dump(exclude_none=True))
+
+    apply(gemini.routes.get(request_class))
+    if gemini.long_context_messages is not None and history_size >= gemini.long_context_messages:
+        apply(gemini.long_context)
+    if prompt_key and prompt_key.startswith("yaml:"):
+        prompt = settings.prompts.get(prompt_key.split(":", 1)[1])
+        apply(prompt.model if prompt else None)
+
+    return ModelChoice(model_name, generation_config)
@@ -1,10 +1,14 @@
 # bot/services/prompt_service.py
+import re
+import unicodedata
+import zlib
+from collections import OrderedDict
 from sqlalchemy.orm import Session
-from typing import List, Optional, TypedDict, Literal
+from typing import List, NamedTuple, Optional, Tuple, TypedDict, Literal
 
 from bot.database import crud
 from bot.database import models
-from bot.core.config import settings
+from bot.core.config import get_settings
 from bot.core.logging import logger
 
 
@@ -15,17 +19,49 @@ class UnifiedPrompt(TypedDict):
     source: Literal["yaml", "db"]
 
 
+class PromptPage(NamedTuple):
+    """One page of the prompt catalogue, with keyset cursors for its neighbours."""
+    prompts: List[UnifiedPrompt]
+    # Cursor of the first prompt, if there is a previous page (use as `before`)
+    prev_cursor: Optional[str]
+    # Cursor of the last prompt, if there is a next page (use as `after`)
+    next_cursor: Optional[str]
+
+
+class PromptSearchResult(NamedTuple):
+    prompt: UnifiedPrompt
+    snippet: str
+
+
+class _SearchEntry(NamedTuple):
+    results: List[PromptSearchResult]
+    # What each result was matched against, so results for longer queries can be filtered from these
+    texts: List[str]
+    # False if the results may have been cut off at the limit
+    complete: bool
+
+
+# Rendered pages and search results kept in memory; they are dropped whenever the catalogue changes
+_PAGE_CACHE_SIZE = 64
+_SEARCH_CACHE_SIZE = 256
+_SNIPPET_LENGTH = 100
+
+
 class PromptService:
     """Service layer for handling logic related to all available prompts."""
 
     def __init__(self, db: Session):
         self.db = db
+        self._page_cache: "OrderedDict[Tuple[Optional[str], Optional[str], int], PromptPage]" = OrderedDict()
+        self._search_cache: "OrderedDict[Tuple[str, int], _SearchEntry]" = OrderedDict()
+        self.catalogue_version = 0
 
     def create_new_prompt(self, user_id: int, title: str, text: str) -> Optional[models.Prompt]:
         """Creates a new shared prompt in the database."""
         try:
             # This correctly calls the working CRUD function
             prompt = crud.create_user_prompt(db=self.db, user_id=user_id, title=title, text=text)
+            self.invalidate_catalogue()
             logger.info(f"Successfully created shared prompt '{title}' for user {user_id}.")
             return prompt
         except Exception as e:
@@ -41,10 +77,10 @@ class PromptService:
         unified_list: List[UnifiedPrompt] = []
 
         # 1. Add public prompts from prompts.yml
-        for key, value in settings.prompts.items():
+        for key, value in get_settings().prompts.items():
             unified_list.append({
                 "key": f"yaml:{key}",
-                "title": f"[Public] {value.get('title', key)}",
+                "title": f"[Public] {value.title or key}",
                 "source": "yaml"
             })
 
@@ -59,6 +95,161 @@ class PromptService:
 
         return unified_list
 
+    def get_prompt_page(self, after: Optional[str] = None, before: Optional[str] = None,
+                        page_size: Optional[int] = None) -> PromptPage:
+        """
+        Gets one page of the catalogue: the YAML prompts in config order, then the shared
+        database prompts by ID.
+
+        Pages are addressed with keyset cursors ('y<name checksum>' for YAML prompts, so they
+        survive a reload of prompts.yml, 'd<id>' for database prompts): `after` returns the
+        page following that prompt, `before` the page preceding it, and neither returns the
+        first page. Cursors come back in callback data, so a malformed one, or one of a YAML
+        prompt that is gone, also returns the first page. Database access is a single
+        LIMIT query, so every page costs the same however large the catalogue is, and
+        pages are cached until the catalogue changes.
+        """
+        size = page_size or get_settings().app.telegram_bot.prompt_page_size
+        cache_key = (after, before, size)
+        page = self._page_cache.get(cache_key)
+        if page is not None:
+            self._page_cache.move_to_end(cache_key)
+            return page
+
+        try:
+            if before is not None:
+                items = self._page_before(before, size)
+                has_prev, has_next = len(items) > size, True
+                items = items[-size:]
+            else:
+                items = self._page_after(after, size)
+                has_prev, has_next = after is not None, len(items) > size
+                items = items[:size]
+        except ValueError as e:
+            logger.info(f"Showing the first prompt page instead: {e}")
+            return self.get_prompt_page(page_size=size)
+
+        page = PromptPage(
+            prompts=[prompt for _, prompt in items],
+            prev_cursor=items[0][0] if has_prev and items else None,
+            next_cursor=items[-1][0] if has_next and items else None,
+        )
+        self._page_cache[cache_key] = page
+        while len(self._page_cache) > _PAGE_CACHE_SIZE:
+            self._page_cache.popitem(last=False)
+        return page
+
+    def search_prompts(self, query: str, limit: int = 20) -> List[PromptSearchResult]:
+        """
+        Searches all prompts by title and text, best matches first.
+
+        YAML prompts are matched by substring in memory and listed first; shared prompts
+        come from the full-text index. Results are cached per (normalised) query. While a
+        user types, each query extends one already searched: if that one's results weren't
+        cut off at `limit`, they are filtered instead of searching the index again (keeping
+        the shorter query's ranking).
+        """
+        normalised = " ".join(query.lower().split())
+        cache_key = (normalised, limit)
+        entry = self._search_cache.get(cache_key)
+        if entry is not None:
+            self._search_cache.move_to_end(cache_key)
+            return entry.results
+
+        entry = self._search_from_prefix(normalised, limit) or self._search(normalised, limit)
+        self._search_cache[cache_key] = entry
+        while len(self._search_cache) > _SEARCH_CACHE_SIZE:
+            self._search_cache.popitem(last=False)
+        return entry.results
+
+    def _search(self, normalised: str, limit: int) -> _SearchEntry:
+        results, texts = [], []
+        for key, value in get_settings().prompts.items():
+            title = value.title or key
+            text = f"{key} {title} {value.prompt}".lower()
+            if normalised in text:
+                results.append(PromptSearchResult(
+                    {"key": f"yaml:{key}", "title": f"[Public] {title}", "source": "yaml"},
+                    _snippet(value.prompt),
+                ))
+                texts.append(text)
+        remaining = limit - len(results)
+        if normalised and remaining > 0:
+            for prompt in crud.search_prompts(db=self.db, query=normalised, limit=remaining):
+                results.append(PromptSearchResult(
+                    {"key": f"db:{prompt.id}", "title": f"[Shared] {prompt.title}", "source": "db"},
+                    _snippet(prompt.prompt_text),
+                ))
+                texts.append(f"{prompt.title} {prompt.prompt_text}")
+        # An empty query never reaches the index, so it can't stand in for longer ones
+        return _SearchEntry(results[:limit], texts[:limit], complete=bool(normalised) and len(results) < limit)
+
+    def _search_from_prefix(self, normalised: str, limit: int) -> Optional[_SearchEntry]:
+        # Whatever matches a query also matches its prefixes: as a substring for YAML prompts,
+        # and word by word as a prefix in the full-text index
+        for end in range(len(normalised) - 1, 0, -1):
+            prefix = self._search_cache.get((normalised[:end], limit))
+            if prefix is None:
+                continue
+            if not prefix.complete:
+                # Shorter prefixes match even more, so they were cut off as well
+                return None
+            kept = [
+                (result, text) for result, text in zip(prefix.results, prefix.texts)
+                if _matches(normalised, result.prompt["source"], text)
+            ]
+            return _SearchEntry([result for result, _ in kept], [text for _, text in kept], complete=True)
+        return None
+
+    def invalidate_catalogue(self) -> None:
+        """Drops cached pages and search results; called whenever prompts are added, removed or reloaded."""
+        self._page_cache.clear()
+        self._search_cache.clear()
+        # Lets other caches holding prompt data (e.g. message contexts) notice the change
+        self.catalogue_version += 1
+
+    def _yaml_items(self) -> List[Tuple[str, UnifiedPrompt]]:
+        return [
+            (_yaml_cursor(key), {"key": f"yaml:{key}", "title": f"[Public] {value.title or key}", "source": "yaml"})
+            for key, value in get_settings().prompts.items()
+        ]
+
+    @staticmethod
+    def _yaml_position(items: List[Tuple[str, UnifiedPrompt]], cursor: str) -> int:
+        for position, (item_cursor, _) in enumerate(items):
+            if item_cursor == cursor:
+                return position
+        raise ValueError(f"unknown prompt cursor {cursor!r}")
+
+    def _db_items(self, after_id: Optional[int] = None, before_id: Optional[int] = None,
+                  limit: int = 0) -> List[Tuple[str, UnifiedPrompt]]:
+        if limit <= 0:
+            return []
+        rows = crud.get_db_prompts_page(db=self.db, after_id=after_id, before_id=before_id, limit=limit)
+        return [
+            (f"d{prompt.id}", {"key": f"db:{prompt.id}", "title": f"[Shared] {prompt.title}", "source": "db"})
+            for prompt in rows
+        ]
+
+    def _page_after(self, cursor: Optional[str], size: int) -> List[Tuple[str, UnifiedPrompt]]:
+        # Returns up to size + 1 items, the extra one only telling whether a next page exists
+        if cursor is not None and cursor.startswith("d"):
+            return self._db_items(after_id=int(cursor[1:]), limit=size + 1)
+        yaml_items = self._yaml_items()
+        start = self._yaml_position(yaml_items, cursor) + 1 if cursor else 0
+        items = yaml_items[start:start + size + 1]
+        return items + self._db_items(limit=size + 1 - len(items))
+
+    def _page_before(self, cursor: str, size: int) -> List[Tuple[str, UnifiedPrompt]]:
+        # Returns up to size + 1 items, the extra one only telling whether a previous page exists
+        yaml_items = self._yaml_items()
+        if cursor.startswith("d"):
+            items = self._db_items(before_id=int(cursor[1:]), limit=size + 1)
+            missing = size + 1 - len(items)
+            return (yaml_items[-missing:] if missing else []) + items
+        end = self._yaml_position(yaml_items, cursor)
+        return yaml_items[max(0, end - size - 1):end]
+
     def get_prompt_text_by_key(self, prompt_key: str) -> Optional[str]:
         """
         Resolves a prompt key (e.g., 'yaml:default', 'db:123') to its text content.
@@ -69,7 +260,8 @@ class PromptService:
         try:
             source, key = prompt_key.split(":", 1)
             if source == "yaml":
-                return settings.prompts.get(key, {}).get("prompt")
+                prompt_config = get_settings().prompts.get(key)
+                return prompt_config.prompt if prompt_config else None
             elif source == "db":
                 prompt_id = int(key)
                 prompt_obj = crud.get_db_prompt_by_id(db=self.db, prompt_id=prompt_id)
@@ -78,6 +270,42 @@ class PromptService:
             logger.error(f"Invalid prompt key format: {prompt_key}. Error: {e}")
             return None # Return None if key is invalid
 
+    def is_prompt_cacheable(self, prompt_key: str) -> bool:
+        """
+        Tells whether replies for this prompt may be cached.
+        Only YAML personas can opt in, via `cacheable: true` in prompts.yml.
+        """
+        if not prompt_key or not prompt_key.startswith("yaml:"):
+            return False
+        prompt_config = get_settings().prompts.get(prompt_key.split(":", 1)[1])
+        return bool(prompt_config and prompt_config.cacheable)
+
     def delete_shared_prompt(self, user_id: int, prompt_id: int) -> bool:
         """Deletes a shared prompt from the database."""
-        return crud.delete_prompt(db=self.db, user_id=user_id, prompt_id=prompt_id)
\ No newline at end of file
+        deleted = crud.delete_prompt(db=self.db, user_id=user_id, prompt_id=prompt_id)
+        if deleted:
+            self.invalidate_catalogue()
+        return deleted
+
+def _yaml_cursor(name: str) -> str:
+    # A checksum keeps the cursor short enough for callback data, however long the name
+    return f"y{zlib.crc32(name.encode('utf-8')):08x}"
+
+
+def _search_words(text: str) -> List[str]:
+    # Folded like the index's unicode61 tokenizer with remove_diacritics
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    return re.findall(r"\w+", "".join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+def _matches(query: str, source: str, text: str) -> bool:
+    """Tells whether a search result for a shorter query also matches `query`."""
+    if source == "yaml":
+        return query in text
+    words = _search_words(text)
+    return all(any(word.startswith(term) for word in words) for term in _search_words(query))
+
+
+def _snippet(text: str) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= _SNIPPET_LENGTH else text[:_SNIPPET_LENGTH - 1] + "…"
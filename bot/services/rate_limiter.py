@@ -0,0 +1,77 @@
+# bot/services/rate_limiter.py
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from bot.core.config import get_settings
+from bot.core.logging import logger
+from bot.services.usage_service import UsageTracker
+
+WINDOW_SECONDS = 60.0
+
+
+class RateLimiter:
+    """
+    Enforces per-user and per-chat limits before a message is processed.
+
+    Messages per minute are counted in in-memory sliding windows; tokens per day come
+    from the UsageTracker's daily totals, which are persisted with the usage counters.
+    A check never touches the database or Gemini, so rejections are cheap.
+    """
+
+    def __init__(self, usage_tracker: Optional[UsageTracker] = None):
+        self.usage_tracker = usage_tracker
+        # (scope, subject_id) -> timestamps of the messages admitted in the last minute
+        self._windows: Dict[Tuple[str, int], Deque[float]] = {}
+        self.rejected = 0
+
+    def check(self, chat_id: int, user_id: int) -> Optional[str]:
+        """
+        Admits a message, or explains why it is rejected.
+
+        Returns:
+            None if the message may be processed (it then counts towards the limits),
+            otherwise a short message for the user.
+        """
+        settings = get_settings()
+        limits = settings.app.rate_limits
+        if not limits.enabled or user_id in settings.admin_user_ids:
+            return None
+
+        now = time.monotonic()
+        subjects = (
+            ("user", user_id, limits.user_messages_per_minute, limits.user_tokens_per_day),
+            ("chat", chat_id, limits.chat_messages_per_minute, limits.chat_tokens_per_day),
+        )
+        for scope, subject_id, per_minute, tokens_per_day in subjects:
+            if per_minute and len(self._window(scope, subject_id, now)) >= per_minute:
+                return self._reject(scope, subject_id, "You're sending messages too quickly. Please wait a minute.")
+            if (tokens_per_day and self.usage_tracker
+                    and self.usage_tracker.tokens_today(scope, subject_id) >= tokens_per_day):
+                return self._reject(scope, subject_id, "The daily usage limit has been reached. Please try again tomorrow.")
+
+        for scope, subject_id, per_minute, _ in subjects:
+            if per_minute:
+                self._windows.setdefault((scope, subject_id), deque()).append(now)
+        return None
+
+    def prune(self) -> int:
+        """Drops the windows of users and chats that were idle for a whole minute. Returns how many were dropped."""
+        now = time.monotonic()
+        idle = [key for key in self._windows if not self._window(*key, now)]
+        for key in idle:
+            del self._windows[key]
+        return len(idle)
+
+    def _window(self, scope: str, subject_id: int, now: float) -> Deque[float]:
+        window = self._windows.get((scope, subject_id))
+        if window is None:
+            return deque()
+        while window and window[0] <= now - WINDOW_SECONDS:
+            window.popleft()
+        return window
+
+    def _reject(self, scope: str, subject_id: int, reason: str) -> str:
+        self.rejected += 1
+        logger.info(f"Rate limit hit for {scope} {subject_id}: {reason}")
+        return reason
@@ -0,0 +1,141 @@
+# bot/services/response_cache.py
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from bot.core.logging import logger
+
+
+class ResponseCache:
+    """
+    An LRU + TTL cache for Gemini replies of stateless personas.
+
+    Entries live in memory and, if a `disk_path` is given, are also written to a small
+    SQLite file so that they survive restarts. The in-memory layer is always checked first.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: int = 86400, disk_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (expires_at, value, tag); the tag (e.g. a prompt key) allows targeted invalidation
+        self._entries: "OrderedDict[str, Tuple[float, str, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self._disk: Optional[sqlite3.Connection] = None
+        if disk_path:
+            path = Path(disk_path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._disk = sqlite3.connect(str(path), check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, tag TEXT)"
+            )
+            columns = {row[1] for row in self._disk.execute("PRAGMA table_info(response_cache)")}
+            if "tag" not in columns:  # Cache files written before tags existed
+                self._disk.execute("ALTER TABLE response_cache ADD COLUMN tag TEXT")
+            # Expired rows are never served, so drop them on startup to keep the file small
+            self._disk.execute("DELETE FROM response_cache WHERE expires_at < ?", (time.time(),))
+            self._disk.commit()
+            logger.info(f"Response cache backed by disk at: {path}")
+
+    @staticmethod
+    def make_key(model_name: str, system_prompt: str, generation_config: Dict[str, Any], text: str) -> str:
+        """Builds a stable cache key from everything that influences the model's answer."""
+        raw = json.dumps(
+            [model_name, system_prompt, generation_config, text],
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached reply for `key`, or None if it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value, _ = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, expires_at, tag FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row[1] >= now:
+                    self._store_in_memory(key, row[0], row[1], row[2])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str, tag: Optional[str] = None) -> None:
+        """
+        Stores a reply, evicting the least recently used entry if the cache is full.
+        Entries stored with a `tag` can later be dropped together with `invalidate_tag`.
+        """
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store_in_memory(key, value, expires_at, tag)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, value, expires_at, tag) VALUES (?, ?, ?, ?)",
+                    (key, value, expires_at, tag),
+                )
+                self._disk.commit()
+
+    def invalidate_tag(self, tag: str) -> int:
+        """Drops every entry stored with `tag` and returns how many were in memory."""
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry[2] == tag]
+            for key in keys:
+                del self._entries[key]
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM response_cache WHERE tag = ?", (tag,))
+                self._disk.commit()
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drops every cached reply, both in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM response_cache")
+                self._disk.commit()
+
+    def resize(self, max_entries: int, ttl_seconds: int) -> None:
+        """Applies new limits, e.g. after a configuration reload; the TTL applies to new entries."""
+        with self._lock:
+            self.max_entries = max_entries
+            self.ttl_seconds = ttl_seconds
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def close(self) -> None:
+        """Closes the on-disk backing store, if any."""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _store_in_memory(self, key: str, value: str, expires_at: float, tag: Optional[str]) -> None:
+        # Caller must hold the lock
+        self._entries[key] = (expires_at, value, tag)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
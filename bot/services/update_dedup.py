@@ -0,0 +1,91 @@
+# bot/services/update_dedup.py
+import datetime
+from collections import OrderedDict
+from datetime import timezone
+from typing import Optional, Set
+
+from sqlalchemy.orm import Session
+
+from bot.core.logging import logger
+from bot.database import crud
+
+HIGH_WATER_MARK_KEY = "last_update_id"
+MARK_MAX_AGE = datetime.timedelta(days=6)
+
+
+def _age(moment: datetime.datetime) -> datetime.timedelta:
+    # SQLite returns naive datetimes; they are stored in UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return datetime.datetime.now(timezone.utc) - moment
+
+
+class UpdateDeduplicator:
+    """
+    Recognises updates that were already processed, so redeliveries cost nothing.
+
+    Recently seen update_ids are kept in a bounded in-memory set. The highest update that
+    finished being handled, with no earlier one still in progress, is also written to the
+    database (by `flush`), so after a restart every update at or below it is skipped without
+    a lookup. Updates that were still being handled when the process died are above the
+    saved mark, so their redelivery is processed again.
+    """
+
+    def __init__(self, db: Session, capacity: int = 10_000):
+        self.db = db
+        self.capacity = capacity
+        self._recent: "OrderedDict[int, None]" = OrderedDict()
+        self.high_water_mark: Optional[int] = None
+        state = crud.get_bot_state(db=db, key=HIGH_WATER_MARK_KEY)
+        # After a week without updates Telegram may restart update_ids at a random value,
+        # so an old mark could hide new updates
+        if state is not None and _age(state.updated_at) < MARK_MAX_AGE:
+            self.high_water_mark = state.value
+        # Updates from before the restart are judged by the mark, later ones by the set,
+        # so updates of this process arriving out of order are never dropped
+        self._startup_mark = self.high_water_mark
+        self._saved_mark = self.high_water_mark
+        # Seen but not finished yet
+        self._in_flight: Set[int] = set()
+        self._finished_max: Optional[int] = None
+        self.duplicates = 0
+
+    def is_duplicate(self, update_id: int) -> bool:
+        """
+        Records an update as being handled; returns True if it had been seen before.
+        Call `finish` once it has been handled.
+        """
+        if update_id in self._recent or (self._startup_mark is not None and update_id <= self._startup_mark):
+            self.duplicates += 1
+            return True
+        self._recent[update_id] = None
+        if len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)
+        self._in_flight.add(update_id)
+        return False
+
+    def finish(self, update_id: int) -> None:
+        """Records that an update has been handled, moving the high-water mark up to the oldest unfinished one."""
+        if update_id not in self._in_flight:
+            return
+        self._in_flight.discard(update_id)
+        if self._finished_max is None or update_id > self._finished_max:
+            self._finished_max = update_id
+        mark = self._finished_max
+        if self._in_flight:
+            mark = min(mark, min(self._in_flight) - 1)
+        if self.high_water_mark is None or mark > self.high_water_mark:
+            self.high_water_mark = mark
+
+    def flush(self) -> bool:
+        """Persists the high-water mark if it moved. Returns True if it was written."""
+        if self.high_water_mark is None or self.high_water_mark == self._saved_mark:
+            return False
+        try:
+            crud.set_bot_state(db=self.db, key=HIGH_WATER_MARK_KEY, value=self.high_water_mark)
+        except Exception as e:
+            logger.error(f"Failed to save the update high-water mark: {e}", exc_info=True)
+            self.db.rollback()
+            return False
+        self._saved_mark = self.high_water_mark
+        return True
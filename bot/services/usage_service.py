@@ -0,0 +1,89 @@
+# bot/services/usage_service.py
+import datetime
+from collections import defaultdict
+from datetime import timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from bot.core.logging import logger
+from bot.database import crud
+from bot.database.crud.usage_crud import USAGE_FIELDS, UsageKey
+
+
+class UsageTracker:
+    """
+    Accounts Gemini token usage per chat, per user and per day.
+
+    Recording only updates in-memory counters; `flush` writes the accumulated deltas
+    to the `usage_counters` table in a single batched upsert.
+    Today's token totals are also kept in memory, so quotas can be checked without a query.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._pending: Dict[UsageKey, List[int]] = defaultdict(lambda: [0] * len(USAGE_FIELDS))
+        self._totals_day: Optional[datetime.date] = None
+        self._daily_tokens: Dict[Tuple[str, int], int] = {}
+
+    @staticmethod
+    def today() -> datetime.date:
+        return datetime.datetime.now(timezone.utc).date()
+
+    def record(self, chat_id: Optional[int], user_id: Optional[int], input_tokens: int = 0,
+               output_tokens: int = 0, cached_tokens: int = 0) -> None:
+        """Adds one request's usage to the counters of its chat and user."""
+        day = self.today()
+        daily_tokens = self._daily_totals(day)
+        delta = (1, input_tokens, output_tokens, cached_tokens)
+        for scope, subject_id in (("chat", chat_id), ("user", user_id)):
+            if subject_id is None:
+                continue
+            counters = self._pending[(day, scope, subject_id)]
+            for index, value in enumerate(delta):
+                counters[index] += value
+            daily_tokens[(scope, subject_id)] = daily_tokens.get((scope, subject_id), 0) + input_tokens + output_tokens
+
+    def tokens_today(self, scope: str, subject_id: int) -> int:
+        """Returns the tokens (input + output) a chat or user has used today, including unflushed usage."""
+        return self._daily_totals(self.today()).get((scope, subject_id), 0)
+
+    def _daily_totals(self, day: datetime.date) -> Dict[Tuple[str, int], int]:
+        # Loaded from the database once per day (at startup and after midnight UTC)
+        if self._totals_day != day:
+            self._daily_tokens = crud.get_daily_token_totals(db=self.db, day=day)
+            self._totals_day = day
+        return self._daily_tokens
+
+    def record_response(self, chat_id: Optional[int], user_id: Optional[int], usage_metadata: Any) -> None:
+        """Records the `usage_metadata` of a Gemini response (missing counts are treated as 0)."""
+        self.record(
+            chat_id=chat_id,
+            user_id=user_id,
+            input_tokens=getattr(usage_metadata, "prompt_token_count", None) or 0,
+            output_tokens=getattr(usage_metadata, "candidates_token_count", None) or 0,
+            cached_tokens=getattr(usage_metadata, "cached_content_token_count", None) or 0,
+        )
+
+    def flush(self) -> int:
+        """
+        Writes the pending counters to the database.
+
+        Returns:
+            The number of counter rows written.
+        """
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, defaultdict(lambda: [0] * len(USAGE_FIELDS))
+        try:
+            crud.add_usage_counts(db=self.db, counts=pending)
+        except Exception as e:
+            logger.error(f"Failed to flush usage counters: {e}", exc_info=True)
+            self.db.rollback()
+            # Merge the unsaved deltas back so they go out with the next flush
+            for key, values in pending.items():
+                counters = self._pending[key]
+                for index, value in enumerate(values):
+                    counters[index] += value
+            return 0
+        return len(pending)
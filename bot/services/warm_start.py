@@ -0,0 +1,51 @@
+# bot/services/warm_start.py
+import time
+from typing import Any, Dict, Optional
+
+from bot.core.config import WarmStartConfig
+from bot.core.logging import logger
+from bot.services.chat_service import ChatService
+from bot.services.gemini_service import GeminiService
+
+
+class WarmStart:
+    """
+    Warms the caches and connections at boot and reports how long the first reply
+    after the restart took.
+    """
+
+    def __init__(self, config: WarmStartConfig):
+        self.config = config
+        self.started_at = time.monotonic()
+        self.first_reply_seconds: Optional[float] = None
+
+    async def run(self, chat_service: ChatService, gemini_service: GeminiService) -> Dict[str, Any]:
+        """
+        Preloads the most recently active sessions, caches the first prompt page and connects to Gemini.
+        The Telegram connection is already open: Application.initialize() calls getMe before post_init.
+        """
+        if not self.config.enabled:
+            return {}
+        began = time.monotonic()
+        sessions = chat_service.context_loader.preload(
+            limit=self.config.preload_sessions, max_bytes=self.config.preload_max_bytes
+        )
+        chat_service.prompt_service.get_prompt_page()
+        keys = await gemini_service.warm_up(timeout=self.config.connect_timeout_seconds)
+        result = {"sessions": sessions, "gemini_keys": keys, "seconds": time.monotonic() - began}
+        logger.info(
+            f"Warm start: preloaded {sessions} sessions, connected {keys} Gemini key(s) "
+            f"in {result['seconds']:.2f}s."
+        )
+        return result
+
+    def record_reply(self, received_at: float) -> None:
+        """Reports the first reply after the restart; `received_at` is when its message arrived (monotonic)."""
+        if self.first_reply_seconds is not None:
+            return
+        now = time.monotonic()
+        self.first_reply_seconds = now - received_at
+        logger.info(
+            f"First reply after restart took {self.first_reply_seconds * 1000:.0f}ms "
+            f"({now - self.started_at:.1f}s after boot)."
+        )
@@ -1,25 +1,46 @@
 # bot/telegram/app.py
-from telegram import BotCommand
+from typing import Optional
+
+from telegram import BotCommand, Update
 from telegram.ext import (
     Application,
     ApplicationBuilder,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    ContextTypes,
+    InlineQueryHandler,
+    TypeHandler,
     filters, ConversationHandler,
 )
+from telegram.request import BaseRequest
 
 # Import our settings and logger
-from bot.core.config import settings
+from bot.core.config import (
+    Settings, add_reload_listener, changed_prompt_keys, get_settings, restart_required_changes,
+)
+from bot.core.config_watcher import ConfigWatcher
+from bot.core.http_transport import telegram_request, transport_stats
 from bot.core.logging import logger
 
-from bot.database import SessionLocal, init_db
+from bot.database import SessionLocal, dispose_engine, init_db
+from bot.database.query_stats import query_metrics
 
 from bot.services.gemini_service import GeminiService
+from bot.services.media import MediaCache
 from bot.services.prompt_service import PromptService
 from bot.services.chat_service import ChatService
+from bot.services.response_cache import ResponseCache
+from bot.services.rate_limiter import RateLimiter
+from bot.services.update_dedup import UpdateDeduplicator
+from bot.services.usage_service import UsageTracker
+from bot.services.warm_start import WarmStart
 
-from .handlers import commands, messages, callbacks
+from .handlers import commands, messages, callbacks, inline, dedup, recording
+from .application import BotApplication
+from .persistence import SqlPersistence
+from .recording import UpdateRecorder
+from .sender import OutboundSender
 from .handlers.conversations import ( # <--- 2. 导入我们新的对话处理函数和状态
     add_prompt_start,
     received_prompt_text,
@@ -29,12 +50,45 @@ from .handlers.conversations import ( # <--- 2. 导入我们新的对话处理
 
 
 
+async def flush_group_log(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job callback that writes buffered group messages to the database."""
+    chat_service: ChatService = context.bot_data["chat_service"]
+    chat_service.flush_group_log()
+
+
+async def flush_usage(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job callback that writes the in-memory token usage counters to the database and prunes idle rate windows."""
+    usage_tracker: UsageTracker = context.bot_data["usage_tracker"]
+    usage_tracker.flush()
+    rate_limiter: RateLimiter = context.bot_data["rate_limiter"]
+    rate_limiter.prune()
+
+
+async def flush_update_dedup(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job callback that saves the highest processed update_id."""
+    update_dedup: UpdateDeduplicator = context.bot_data["update_dedup"]
+    update_dedup.flush()
+
+
+def invalidate_response_cache(response_cache: ResponseCache, old: Settings, new: Settings) -> None:
+    """Drops cached replies made stale by a configuration reload."""
+    if old.app.gemini != new.app.gemini:
+        # Model or generation parameters changed: no cached reply can be hit again
+        response_cache.clear()
+        return
+    for name in changed_prompt_keys(old, new):
+        dropped = response_cache.invalidate_tag(f"yaml:{name}")
+        logger.info(f"Prompt 'yaml:{name}' changed; dropped {dropped} cached replies.")
+
+
 async def post_init(application: Application) -> None:
     """
     A function that runs after the Application is built but before polling starts.
     This is the perfect place to initialize our database and services.
     """
     logger.info("Running post-initialization setup...")
+    settings = get_settings()
+    warm_start = WarmStart(settings.app.warm_start)
 
     # 1. Initialize the database (create tables)
     init_db()
@@ -43,39 +97,201 @@ async def post_init(application: Application) -> None:
     db_session = SessionLocal()
 
     # 3. Initialize our services
-    gemini_service = GeminiService()
+    response_cache = None
+    cache_config = settings.app.response_cache
+    if cache_config.enabled:
+        response_cache = ResponseCache(
+            max_entries=cache_config.max_entries,
+            ttl_seconds=cache_config.ttl_seconds,
+            disk_path=cache_config.disk_path,
+        )
+    usage_tracker = UsageTracker(db=db_session)
+    gemini_service = GeminiService(
+        response_cache=response_cache,
+        usage_tracker=usage_tracker,
+        # Set by replays, to answer with a fake backend instead of the Gemini API
+        client_factory=application.bot_data.get("gemini_client_factory"),
+    )
     prompt_service = PromptService(db=db_session)
-    chat_service = ChatService(db=db_session, gemini_service=gemini_service, prompt_service=prompt_service)
+    rate_limiter = RateLimiter(usage_tracker=usage_tracker)
+    chat_service = ChatService(
+        db=db_session, gemini_service=gemini_service, prompt_service=prompt_service, rate_limiter=rate_limiter
+    )
+    sender = OutboundSender(bot=application.bot, config=settings.app.outbound)
 
     # 4. Store the session and services in the bot_data dictionary.
     # This makes them accessible in any handler via context.bot_data.
     application.bot_data["db_session"] = db_session
     application.bot_data["gemini_service"] = gemini_service
+    application.bot_data["response_cache"] = response_cache
+    application.bot_data["usage_tracker"] = usage_tracker
+    application.bot_data["update_dedup"] = UpdateDeduplicator(db=db_session, capacity=settings.app.dedup.capacity)
+    application.bot_data["rate_limiter"] = rate_limiter
     application.bot_data["prompt_service"] = prompt_service
     application.bot_data["chat_service"] = chat_service
+    application.bot_data["sender"] = sender
+    application.bot_data["warm_start"] = warm_start
+    media_config = settings.app.media
+    if media_config.enabled:
+        application.bot_data["media_cache"] = MediaCache(
+            directory=media_config.cache_dir, max_bytes=media_config.cache_max_bytes
+        )
+    recording_config = settings.app.recording
+    if recording_config.enabled:
+        application.bot_data["update_recorder"] = UpdateRecorder(
+            directory=recording_config.directory,
+            bot_id=application.bot.id,
+            bot_username=application.bot.username,
+            max_updates=recording_config.max_updates,
+        )
+
+    # 5. Periodically write buffered (non-reply) group messages to the database
+    if application.job_queue:
+        application.job_queue.run_repeating(
+            flush_group_log,
+            interval=settings.app.telegram_bot.group_log_flush_seconds,
+            first=settings.app.telegram_bot.group_log_flush_seconds,
+            name="flush_group_log",
+        )
+        application.job_queue.run_repeating(
+            flush_usage,
+            interval=settings.app.usage.flush_seconds,
+            first=settings.app.usage.flush_seconds,
+            name="flush_usage",
+        )
+        application.job_queue.run_repeating(
+            flush_update_dedup,
+            interval=settings.app.dedup.flush_seconds,
+            first=settings.app.dedup.flush_seconds,
+            name="flush_update_dedup",
+        )
+    else:
+        logger.warning("JobQueue is not available; buffered group messages are only flushed by size.")
+
+    # 6. Apply changes to the YAML config files without a restart
+    def invalidate_prompt_pages(old: Settings, new: Settings) -> None:
+        if changed_prompt_keys(old, new):
+            prompt_service.invalidate_catalogue()
+
+    def apply_reloaded_config(old: Settings, new: Settings) -> None:
+        # Services built with a copy of their section get the new one; admission control,
+        # rate limits and routing read get_settings() on every request anyway
+        sender.reconfigure(new.app.outbound)
+        gemini_service.reconfigure(new)
+        if response_cache is not None:
+            response_cache.resize(new.app.response_cache.max_entries, new.app.response_cache.ttl_seconds)
+        changed = restart_required_changes(old, new)
+        if changed:
+            logger.warning(f"Configuration reload: {', '.join(changed)} changed, which only applies after a restart.")
+
+    add_reload_listener(invalidate_prompt_pages)
+    add_reload_listener(apply_reloaded_config)
+    # A raised admission limit admits queued generations right away
+    add_reload_listener(lambda old, new: chat_service.admission.fill_free_slots())
+    if response_cache is not None:
+        add_reload_listener(lambda old, new: invalidate_response_cache(response_cache, old, new))
+    if settings.app.config_reload.enabled:
+        watcher = ConfigWatcher(poll_interval=settings.app.config_reload.poll_interval_seconds)
+        watcher.start()
+        application.bot_data["config_watcher"] = watcher
 
     commands_to_set = [
         BotCommand("start", "Restart the bot and show the main menu"),
         BotCommand("my_prompts", "View and manage your personas"),
         BotCommand("clear", "Clear the current conversation history"),
+        BotCommand("mode", "Group chats: shared or individual conversations"),
         BotCommand("help", "Show help information"),
     ]
     await application.bot.set_my_commands(commands_to_set)
 
+    # 7. Load hot sessions and open connections before the first update arrives
+    await warm_start.run(chat_service=chat_service, gemini_service=gemini_service)
+
     logger.info("Services and database session initialized and stored in bot_data.")
 
 
-def run() -> None:
-    """Initializes and runs the Telegram bot."""
+async def post_stop(application: Application) -> None:
+    """
+    Runs once updates are no longer fetched and every handler has finished (or its generation
+    was cancelled at the drain deadline); writes everything still buffered in memory.
+    """
+    bot_data = application.bot_data
+    sender = bot_data.get("sender")
+    if sender is not None:
+        # Handlers await their replies, so the queues are empty by now unless a send is stuck
+        if sender.queued:
+            logger.warning(f"Shutdown: dropping {sender.queued} unsent outbound messages.")
+        await sender.close()
+    chat_service = bot_data.get("chat_service")
+    if chat_service is not None:
+        flushed = chat_service.flush_group_log()
+        logger.info(f"Shutdown: flushed {flushed} buffered group messages.")
+    for name in ("usage_tracker", "update_dedup"):
+        service = bot_data.get(name)
+        if service is not None:
+            service.flush()
+    recorder = bot_data.get("update_recorder")
+    if recorder is not None:
+        recorder.close()
+        logger.info(f"Shutdown: recorded {recorder.recorded} updates to {recorder.path}.")
+
+    queries = query_metrics.stats()
+    logger.info(
+        f"Shutdown: {queries['updates']} updates processed, {queries['avg_queries']:.1f} queries per update; "
+        + ", ".join(f"{name} {transport.stats()['reuse_rate']:.0%} connections reused"
+                    for name, transport in transport_stats.items())
+    )
+
+
+async def post_shutdown(application: Application) -> None:
+    """
+    Runs last, after the persistence is flushed and the Bot API connection is closed;
+    releases the remaining connections and files.
+    """
+    bot_data = application.bot_data
+    watcher = bot_data.get("config_watcher")
+    if watcher is not None:
+        await watcher.stop()
+    gemini_service = bot_data.get("gemini_service")
+    if gemini_service is not None:
+        await gemini_service.close()
+    response_cache = bot_data.get("response_cache")
+    if response_cache is not None:
+        response_cache.close()
+    db_session = bot_data.get("db_session")
+    if db_session is not None:
+        db_session.close()
+    dispose_engine()
+    logger.info("Shutdown complete.")
+
+
+def build_application(request: Optional[BaseRequest] = None) -> Application:
+    """
+    Builds the Application and registers all handlers, without touching the network.
+    `request` answers the Bot API calls instead of the HTTP transport (replays pass a fake Bot API).
+    """
     logger.info("Building and configuring the bot application...")
 
+    settings = get_settings()
+    persistence = None
+    if settings.app.persistence.enabled:
+        persistence = SqlPersistence(update_interval=settings.app.persistence.flush_seconds)
+
     # Create the Application instance
-    application = (
+    builder = (
         ApplicationBuilder()
+        .application_class(BotApplication)  # Counts each update's database queries, drains on stop
         .token(settings.telegram_bot_token)
+        # Tuned connection pools, timeouts and proxy (http in app_config.yml); getUpdates gets its own connection
+        .request(request or telegram_request(settings))
+        .get_updates_request(request or telegram_request(settings, pool_size=1))
         .post_init(post_init)  # Register our setup function
-        .build()
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
     )
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
     add_prompt_conv_handler = ConversationHandler(
         entry_points=[
             # 对话的入口是点击 "＋ Add New" 按钮
@@ -93,10 +309,20 @@ def run() -> None:
             CommandHandler("cancel", cancel_conversation)
         ],
         # 可选：如果对话长时间没有响应，可以自动超时
-        conversation_timeout=300  # 5分钟
+        conversation_timeout=300,  # 5分钟
+        # 持久化：重启后对话状态不会丢失
+        name="add_prompt",
+        persistent=persistence is not None,
     )
 
     # --- 4. 注册 Handlers 到 Application ---
+    # 录制：group=-2 在去重之前运行，按原样记录（脱敏后）每个收到的 update，供回放使用
+    if settings.app.recording.enabled:
+        application.add_handler(TypeHandler(Update, recording.record_update), group=-2)
+
+    # 去重：group=-1 先于所有 handler 运行，重复投递的 update 直接丢弃
+    application.add_handler(TypeHandler(Update, dedup.skip_duplicate_updates), group=-1)
+
     # 注意：ConversationHandler 应该在其他可能冲突的 handler 之前注册
     application.add_handler(add_prompt_conv_handler)
 
@@ -105,14 +331,28 @@ def run() -> None:
     application.add_handler(CommandHandler("my_prompts", commands.my_prompts_command))
     application.add_handler(CommandHandler("clear", commands.clear_command))
     application.add_handler(CommandHandler("help", commands.help_command))
+    application.add_handler(CommandHandler("mode", commands.mode_command))
+    application.add_handler(CommandHandler("stats", commands.stats_command))
 
     # CallbackQueryHandler 现在处理除 add_new_prompt 之外的所有回调
     application.add_handler(CallbackQueryHandler(callbacks.handle_callback_query))
 
+    # Inline 模式：@bot <关键词> 搜索角色
+    application.add_handler(InlineQueryHandler(inline.handle_inline_query))
+
     # MessageHandler 应该在最后，作为默认处理器
-    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, messages.handle_message))
+    # block=False：生成回复时不阻塞后续更新，这样 /clear、切换人设或新消息可以取消正在进行的生成
+    # 图片、语音、音频、视频和文件（连同说明文字）也交给 handle_message，作为多模态输入发给 Gemini
+    media_filter = filters.PHOTO | filters.VOICE | filters.AUDIO | filters.VIDEO | filters.Document.ALL
+    application.add_handler(MessageHandler((filters.TEXT | media_filter) & ~filters.COMMAND, messages.handle_message, block=False))
 
     logger.info("All handlers registered.")
+    return application
+
+
+def run() -> None:
+    """Initializes and runs the Telegram bot."""
+    application = build_application()
 
     # Start the bot
     logger.info("Starting bot polling...")
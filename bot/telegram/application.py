@@ -0,0 +1,94 @@
+# bot/telegram/application.py
+import inspect
+from typing import Any, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from bot.core.config import get_settings
+from bot.core.logging import logger
+from bot.database.query_stats import QueryStats, count_queries, current_query_stats, query_metrics
+
+
+class BotApplication(Application):
+    """
+    The bot's Application: counts the database queries of every update and stops
+    within a deadline.
+
+    The query count covers the update's handlers, including non-blocking ones that are
+    still running after `process_update` returns; it's logged and added to `query_metrics`
+    once the last of them finishes.
+
+    On stop, pending updates are still processed and in-flight reply generations get
+    `shutdown.drain_seconds` to finish; what's still running then is cancelled, so
+    stopping never waits on a slow Gemini request.
+
+    Once all of an update's handlers are done, it's reported to the duplicate check as
+    handled, so the saved high-water mark only ever covers finished updates. Updates
+    ending after the drain deadline are not reported: their generations were cancelled,
+    and a redelivery after the restart should be handled again.
+    """
+
+    async def stop(self) -> None:
+        chat_service = self.bot_data.get("chat_service")
+        if chat_service is None:
+            await super().stop()
+            return
+        inflight = chat_service.inflight
+        logger.info(f"Stopping: draining {inflight.running} in-flight generation(s).")
+        inflight.start_draining(get_settings().app.shutdown.drain_seconds)
+        try:
+            await super().stop()
+        finally:
+            inflight.stop_draining()
+
+    async def process_update(self, update: object) -> None:
+        if not isinstance(update, Update):
+            await super().process_update(update)
+            return
+        with count_queries() as stats:
+            stats.pending += 1
+            try:
+                await super().process_update(update)
+            finally:
+                self._finish(update, stats)
+
+    def create_task(self, coroutine: Any, update: Optional[object] = None, *, name: Optional[str] = None):
+        stats = current_query_stats()
+        if stats is not None and isinstance(update, Update) and inspect.iscoroutine(coroutine):
+            # Registered now, before process_update's own part of the scope can finish
+            stats.pending += 1
+            coroutine = self._finish_after(coroutine, update, stats)
+        return super().create_task(coroutine, update, name=name)
+
+    async def _finish_after(self, coroutine: Any, update: Update, stats: QueryStats) -> Any:
+        try:
+            return await coroutine
+        finally:
+            self._finish(update, stats)
+
+    def _finish(self, update: Update, stats: QueryStats) -> None:
+        stats.pending -= 1
+        if stats.pending:
+            return
+        self._mark_handled(update)
+        query_metrics.record(stats)
+        if not stats.queries:
+            return
+        message = (
+            f"Update {update.update_id}: {stats.queries} queries, {stats.commits} commits "
+            f"in {stats.seconds * 1000:.1f}ms"
+        )
+        if stats.queries > get_settings().app.database.warn_queries_per_update:
+            logger.warning(f"{message}; statements: {stats.statements}")
+        else:
+            logger.debug(message)
+
+    def _mark_handled(self, update: Update) -> None:
+        dedup = self.bot_data.get("update_dedup")
+        if dedup is None:
+            return
+        chat_service = self.bot_data.get("chat_service")
+        if chat_service is not None and chat_service.inflight.closed:
+            return
+        dedup.finish(update.update_id)
@@ -0,0 +1,76 @@
+# bot/telegram/callback_data.py
+import zlib
+from typing import Iterable, List, Optional, Tuple
+
+# Telegram rejects callback_data longer than 64 bytes
+MAX_CALLBACK_BYTES = 64
+
+# Bump when the payload layout changes; older payloads are then ignored instead of misread
+CALLBACK_VERSION = "1"
+_SEPARATOR = ":"
+
+# --- Actions ---
+SELECT_PROMPT = "s"      # s:<prompt token>
+PAGE_NEXT = "n"          # n:<cursor of the last prompt on the page>
+PAGE_PREV = "p"          # p:<cursor of the first prompt on the page>
+DELETE_PROMPT = "d"      # d:<prompt id>
+CONFIRM_DELETE = "D"     # D:<prompt id>
+CANCEL_DELETE = "c"      # c:<prompt id>
+
+# YAML prompt names longer than this are sent as a short checksum instead
+_MAX_INLINE_NAME_BYTES = 40
+
+
+def encode(action: str, *args: str) -> str:
+    """
+    Builds a compact, versioned callback payload such as '1:s:d123'.
+
+    Raises:
+        ValueError: If the payload would exceed Telegram's 64-byte limit.
+    """
+    data = _SEPARATOR.join((CALLBACK_VERSION, action, *args))
+    if len(data.encode("utf-8")) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"Callback data exceeds {MAX_CALLBACK_BYTES} bytes: {data!r}")
+    return data
+
+
+def decode(data: str) -> Optional[Tuple[str, List[str]]]:
+    """
+    Parses a payload built by `encode`.
+
+    Returns:
+        (action, args), or None if the data isn't a payload of the current version.
+    """
+    parts = data.split(_SEPARATOR)
+    if len(parts) < 2 or parts[0] != CALLBACK_VERSION:
+        return None
+    return parts[1], parts[2:]
+
+
+def encode_prompt_key(prompt_key: str) -> str:
+    """
+    Turns a prompt key into a short token: 'db:123' -> 'd123', 'yaml:default' -> 'ydefault'.
+    Long YAML names become 'h' + the CRC32 of the name.
+    """
+    source, key = prompt_key.split(":", 1)
+    if source == "db":
+        return f"d{key}"
+    if len(key.encode("utf-8")) > _MAX_INLINE_NAME_BYTES or _SEPARATOR in key:
+        return f"h{zlib.crc32(key.encode('utf-8')):08x}"
+    return f"y{key}"
+
+
+def decode_prompt_key(token: str, yaml_names: Iterable[str]) -> Optional[str]:
+    """Reverses `encode_prompt_key`; `yaml_names` is needed to resolve checksum tokens."""
+    if not token:
+        return None
+    kind, value = token[0], token[1:]
+    if kind == "d" and value.isdigit():
+        return f"db:{value}"
+    if kind == "y" and value:
+        return f"yaml:{value}"
+    if kind == "h":
+        for name in yaml_names:
+            if f"{zlib.crc32(name.encode('utf-8')):08x}" == value:
+                return f"yaml:{name}"
+    return None
@@ -1,30 +1,46 @@
 # bot/telegram/handlers/callbacks.py
+from typing import List, Optional
+
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 
+from bot.core.config import get_settings
 from bot.database import crud
-from bot.telegram import keyboards
+from bot.telegram import callback_data, keyboards
+from bot.telegram.sender import OutboundSender
 from bot.services.prompt_service import PromptService
 from bot.core.logging import logger
 
 
+async def edit_menu(update: Update, context: ContextTypes.DEFAULT_TYPE, text: str,
+                    reply_markup: Optional[InlineKeyboardMarkup] = None) -> None:
+    """Replaces the text (and keyboard) of the message whose button was pressed, via the outbound queue."""
+    query = update.callback_query
+    if query.message is None:
+        # Messages sent via inline mode belong to no chat the queue could serve
+        await query.edit_message_text(text=text, reply_markup=reply_markup)
+        return
+    sender: OutboundSender = context.bot_data["sender"]
+    await sender.edit_text(query.message.chat.id, query.message.message_id, text, reply_markup=reply_markup)
+
+
 # A helper function to avoid code duplication, as this menu is shown in multiple places.
-async def show_prompt_management_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Displays the prompt management menu to the user."""
+async def show_prompt_management_menu(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                      after: Optional[str] = None, before: Optional[str] = None):
+    """Displays one page of the prompt management menu to the user."""
     query = update.callback_query
     chat_id = update.effective_chat.id
 
     prompt_service: PromptService = context.bot_data["prompt_service"]
     db_session = context.bot_data["db_session"]
 
-    # 1. Get all available prompts
-    all_prompts = prompt_service.get_available_prompts()
+    # 1. Get the requested page of available prompts
+    page = prompt_service.get_prompt_page(after=after, before=before)
 
-    # 2. Get the active prompt key FOR THIS CHAT
-    session = crud.get_or_create_session(db=db_session, chat_id=chat_id)
-    active_key = session.active_prompt_key
+    # 2. Get the active prompt key FOR THIS CHAT (a read; showing the menu writes nothing)
+    active_key = crud.get_active_prompt_key(db=db_session, chat_id=chat_id)
 
-    if not all_prompts:
+    if not page.prompts:
         # This case is unlikely now with yaml prompts, but good to have
         text = "No prompts are available. Use the button below to add one."
         keyboard = InlineKeyboardMarkup([
@@ -32,10 +48,92 @@ async def show_prompt_management_menu(update: Update, context: ContextTypes.DEFA
             [InlineKeyboardButton("« Back to Main Menu", callback_data="start_menu")]])
     else:
         text = "Here are the available personas. Click one to make it active for this chat, or ❌ to delete a shared one."
-        # 3. Pass both lists to the keyboard builder
-        keyboard = keyboards.create_prompt_list_keyboard(prompts=all_prompts, active_key=active_key)
+        # 3. Pass the page and the active key to the keyboard builder
+        keyboard = keyboards.create_prompt_list_keyboard(page=page, active_key=active_key)
 
-    await query.edit_message_text(text=text, reply_markup=keyboard)
+    await edit_menu(update, context, text, reply_markup=keyboard)
+
+
+def _callback_chat_id(update: Update) -> int:
+    # Buttons on messages sent via inline mode carry no chat; they act on the user's private chat
+    if update.effective_chat:
+        return update.effective_chat.id
+    return update.callback_query.from_user.id
+
+
+async def select_prompt(update: Update, context: ContextTypes.DEFAULT_TYPE, prompt_key: str) -> None:
+    """Makes a prompt active for the current chat and moves the ✅ mark on the current page."""
+    query = update.callback_query
+    chat_id = _callback_chat_id(update)
+
+    chat_service = context.bot_data["chat_service"]
+    # A reply in the old persona is no longer wanted
+    chat_service.cancel_generation(chat_id, event="prompt_switch")
+
+    # Pass the STRING key directly to the CRUD function
+    crud.set_active_prompt_key_for_session(
+        db=context.bot_data["db_session"],
+        chat_id=chat_id,
+        prompt_key=prompt_key  # Passing the correct 'str' type
+    )
+    # Every session of the chat uses this persona
+    chat_service.context_loader.invalidate(chat_id)
+    if query.inline_message_id:
+        # Chosen from inline search results: there is no menu to refresh
+        await query.answer("Persona updated for your private chat with me!", show_alert=True)
+        return
+    await query.answer("Persona updated for this chat!", show_alert=False)
+
+    # Refresh the menu to show the new checkmark, staying on the same page
+    if query.message and query.message.reply_markup:
+        keyboard = keyboards.mark_active_prompt(query.message.reply_markup, prompt_key)
+        sender: OutboundSender = context.bot_data["sender"]
+        await sender.edit_reply_markup(query.message.chat.id, query.message.message_id, keyboard)
+    else:
+        await show_prompt_management_menu(update, context)
+
+
+async def handle_compact_callback(update: Update, context: ContextTypes.DEFAULT_TYPE,
+                                  action: str, args: List[str]) -> None:
+    """Handles the versioned payloads built by bot.telegram.callback_data."""
+    query = update.callback_query
+    user_id = query.from_user.id
+    prompt_service: PromptService = context.bot_data["prompt_service"]
+
+    if action == callback_data.PAGE_NEXT and args:
+        await show_prompt_management_menu(update, context, after=args[0])
+
+    elif action == callback_data.PAGE_PREV and args:
+        await show_prompt_management_menu(update, context, before=args[0])
+
+    elif action == callback_data.SELECT_PROMPT and args:
+        prompt_key = callback_data.decode_prompt_key(args[0], get_settings().prompts)
+        if prompt_key is None:
+            await query.answer("This persona no longer exists.", show_alert=True)
+            await show_prompt_management_menu(update, context)
+            return
+        await select_prompt(update, context, prompt_key)
+
+    elif action == callback_data.DELETE_PROMPT and args and args[0].isdigit():
+        keyboard = keyboards.create_confirm_delete_keyboard(int(args[0]))
+        await edit_menu(update, context, "Are you sure you want to delete this shared prompt?",
+                        reply_markup=keyboard)
+
+    elif action == callback_data.CONFIRM_DELETE and args and args[0].isdigit():
+        # We call the service method, which calls the correct crud method
+        deleted = prompt_service.delete_shared_prompt(user_id=user_id, prompt_id=int(args[0]))
+        if deleted:
+            await query.answer("Shared prompt deleted.", show_alert=True)
+        else:
+            await query.answer("Could not delete prompt.", show_alert=True)
+        await show_prompt_management_menu(update, context)
+
+    elif action == callback_data.CANCEL_DELETE:
+        await show_prompt_management_menu(update, context)
+
+    else:
+        logger.warning(f"Unknown compact callback: {query.data}")
+        await query.answer("Invalid action.", show_alert=True)
 
 
 async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -45,30 +143,25 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
 
     # We need both user_id (for ownership/logging) and chat_id (for session state)
     user_id = query.from_user.id
-    chat_id = update.effective_chat.id
+    chat_id = _callback_chat_id(update)
     data = query.data
 
     logger.info(f"Callback query from user {user_id} in chat {chat_id}: {data}")
 
     # --- ROUTING LOGIC ---
-    if data == "manage_prompts":
+    decoded = callback_data.decode(data)
+    if decoded is not None:
+        await handle_compact_callback(update, context, *decoded)
+
+    elif data == "manage_prompts":
         await show_prompt_management_menu(update, context)
 
-        # --- THIS IS THE MOST IMPORTANT FIX ---
+    # --- Legacy payloads, still found on menus sent before compact callbacks ---
     elif data.startswith("select_prompt:"):
         try:
             # The key is the full string, e.g., "db:123" or "yaml:default"
             prompt_key = data.split(":", 1)[1]
-
-            # Pass the STRING key directly to the CRUD function
-            crud.set_active_prompt_key_for_session(
-                db=context.bot_data["db_session"],
-                chat_id=chat_id,
-                prompt_key=prompt_key  # Passing the correct 'str' type
-            )
-            await query.answer("Persona updated for this chat!", show_alert=False)
-            # Refresh the menu to show the new checkmark
-            await show_prompt_management_menu(update, context)
+            await select_prompt(update, context, prompt_key)
         except (ValueError, IndexError):
             logger.warning(f"Invalid callback data format for select: {data}")
             await query.answer("Invalid action.", show_alert=True)
@@ -79,10 +172,8 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
             prompt_id_str = data.split(":")[1]
             prompt_id = int(prompt_id_str)
             keyboard = keyboards.create_confirm_delete_keyboard(prompt_id)
-            await query.edit_message_text(
-                "Are you sure you want to delete this shared prompt?",
-                reply_markup=keyboard
-            )
+            await edit_menu(update, context, "Are you sure you want to delete this shared prompt?",
+                            reply_markup=keyboard)
         except (ValueError, IndexError):
             logger.warning(f"Invalid callback data format for delete: {data}")
 
@@ -100,5 +191,5 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
         except (ValueError, IndexError):
             logger.warning(f"Invalid callback data format for confirm_delete: {data}")
 
-    elif data == "cancel_delete":
+    elif data.startswith("cancel_delete"):
         await show_prompt_management_menu(update, context)
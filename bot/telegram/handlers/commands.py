@@ -1,10 +1,16 @@
 # bot/telegram/handlers/commands.py
-from telegram import Update
+from telegram import ChatMember, Update, constants
 from telegram.ext import ContextTypes
 
+from bot.core.config import get_settings
+from bot.core.http_transport import transport_stats
 from bot.database import crud
+from bot.database.query_stats import query_metrics
 from bot.telegram import keyboards
+from bot.telegram.sender import OutboundSender
+from bot.services.chat_service import GROUP_MODES, ChatService
 from bot.services.prompt_service import PromptService
+from bot.services.usage_service import UsageTracker
 from bot.core.logging import logger
 
 
@@ -16,6 +22,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     chat_id = update.effective_chat.id
     logger.info(f"/start command received from user {user.id} in chat {chat_id}")
+    sender: OutboundSender = context.bot_data["sender"]
 
     # Retrieve the db session from context
     db = context.bot_data["db_session"]
@@ -30,7 +37,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     )
     keyboard = keyboards.create_start_menu_keyboard()
 
-    await update.message.reply_text(welcome_text, reply_markup=keyboard)
+    await sender.reply_text(update.message, welcome_text, reply_markup=keyboard)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -40,6 +47,7 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     """
     user = update.effective_user
     logger.info(f"/help command received from user {user.id}")
+    sender: OutboundSender = context.bot_data["sender"]
 
     help_text = (
         "Here's how I can help you:\n\n"
@@ -47,10 +55,11 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         "• /start - Shows the main menu.\n"
         "• /my_prompts - View and manage your custom personas for me.\n"
         "• /clear - Clears our recent conversation history, giving us a fresh start.\n"
+        "• /mode - In groups: one shared conversation, or an individual one per member.\n"
         "• /help - Shows this help message."
     )
 
-    await update.message.reply_text(help_text)
+    await sender.reply_text(update.message, help_text)
 
 
 async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -61,11 +70,22 @@ async def clear_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     user = update.effective_user
     chat_id = update.effective_chat.id
     logger.info(f"/clear command received from user {user.id} in chat {chat_id}")
+    sender: OutboundSender = context.bot_data["sender"]
+
+    chat_service: ChatService = context.bot_data["chat_service"]
+    # In individual-mode groups only the sender's own session is cleared
+    session_user_id = chat_service.session_user_id(chat_id, user.id)
+    # A reply still being generated would write the old conversation back
+    chat_service.cancel_generation(chat_id, event="clear", user_id=session_user_id)
 
     db = context.bot_data["db_session"]
-    crud.reset_session(db=db, chat_id=chat_id)
+    crud.reset_session(db=db, chat_id=chat_id, user_id=session_user_id)
+    chat_service.context_loader.invalidate(chat_id, user_id=session_user_id)
+    if not session_user_id:
+        # Buffered group messages belong to the old history as well
+        chat_service.group_log.drop(chat_id)
 
-    await update.message.reply_text("✨ Our conversation history has been cleared.")
+    await sender.reply_text(update.message, "✨ Our conversation history has been cleared.")
 
 
 async def my_prompts_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -76,26 +96,147 @@ async def my_prompts_command(update: Update, context: ContextTypes.DEFAULT_TYPE)
     user = update.effective_user
     chat_id = update.effective_chat.id
     logger.info(f"/my_prompts command from user {user.id} in chat {chat_id}")
+    sender: OutboundSender = context.bot_data["sender"]
 
     prompt_service: PromptService = context.bot_data["prompt_service"]
     db = context.bot_data["db_session"]
 
-    # Get all available prompts (from YAML and DB)
-    all_prompts = prompt_service.get_available_prompts()
+    # Get the first page of available prompts (from YAML and DB)
+    page = prompt_service.get_prompt_page()
 
     # Get the active key for the current chat session
-    session = crud.get_or_create_session(db=db, chat_id=chat_id)
-    active_key = session.active_prompt_key
+    active_key = crud.get_active_prompt_key(db=db, chat_id=chat_id)
 
-    if not all_prompts:
-        await update.message.reply_text(
+    if not page.prompts:
+        await sender.reply_text(
+            update.message,
             "No prompts are available. You can add a new shared one via the menu."
         )
         return
 
-    # Pass the full list and the active key to the keyboard builder
-    keyboard = keyboards.create_prompt_list_keyboard(prompts=all_prompts, active_key=active_key)
-    await update.message.reply_text(
+    # Pass the page and the active key to the keyboard builder
+    keyboard = keyboards.create_prompt_list_keyboard(page=page, active_key=active_key)
+    await sender.reply_text(
+        update.message,
         "Here are the available personas. Click one to make it active for this chat.",
         reply_markup=keyboard
     )
+
+
+async def mode_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles the /mode command (groups only).
+    `/mode` shows the current mode; group admins switch it with `/mode shared` or `/mode individual`.
+    """
+    user = update.effective_user
+    chat = update.effective_chat
+    logger.info(f"/mode command from user {user.id} in chat {chat.id}")
+    sender: OutboundSender = context.bot_data["sender"]
+
+    if chat.type not in (constants.ChatType.GROUP, constants.ChatType.SUPERGROUP):
+        await sender.reply_text(update.message, "Session modes only apply to group chats.")
+        return
+
+    chat_service: ChatService = context.bot_data["chat_service"]
+    current = chat_service.get_group_mode(chat.id)
+    if not context.args:
+        await sender.reply_text(
+            update.message,
+            f"This group is in *{current}* mode.\n"
+            "• shared: everyone talks to one conversation and I may chime in on my own\n"
+            "• individual: each member has their own conversation with me when they @mention me",
+            parse_mode="Markdown",
+        )
+        return
+
+    mode = context.args[0].lower()
+    if mode not in GROUP_MODES:
+        await sender.reply_text(update.message, f"Usage: /mode {' | '.join(GROUP_MODES)}")
+        return
+
+    member = await context.bot.get_chat_member(chat.id, user.id)
+    if member.status not in (ChatMember.ADMINISTRATOR, ChatMember.OWNER) and user.id not in get_settings().admin_user_ids:
+        await sender.reply_text(update.message, "Sorry, only group admins can change the mode.")
+        return
+
+    chat_service.set_group_mode(chat.id, mode)
+    await sender.reply_text(update.message, f"✅ Switched this group to {mode} mode.")
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles the /stats command (admins only).
+    Shows today's Gemini token usage from the pre-aggregated counters, database load per update
+    and the health of the API keys.
+    """
+    user = update.effective_user
+    logger.info(f"/stats command from user {user.id}")
+    sender: OutboundSender = context.bot_data["sender"]
+
+    if user.id not in get_settings().admin_user_ids:
+        await sender.reply_text(update.message, "Sorry, this command is only available to admins.")
+        return
+
+    db = context.bot_data["db_session"]
+    usage_tracker: UsageTracker = context.bot_data["usage_tracker"]
+    # Write what's still in memory first, so the numbers are current
+    usage_tracker.flush()
+
+    day = usage_tracker.today()
+    totals = crud.get_usage_totals(db=db, day=day)
+    lines = [
+        f"📊 Usage for {day.isoformat()} (UTC)",
+        f"Requests: {totals['requests']}",
+        f"Tokens: {totals['input_tokens']} in / {totals['output_tokens']} out / {totals['cached_tokens']} cached",
+    ]
+    for scope, label in (("chat", "Top chats"), ("user", "Top users")):
+        top = crud.get_top_usage(db=db, day=day, scope=scope)
+        if top:
+            lines.append(f"\n{label}:")
+            lines.extend(
+                f"• {row.subject_id}: {row.input_tokens + row.output_tokens} tokens in {row.requests} requests"
+                for row in top
+            )
+
+    admission = context.bot_data["chat_service"].admission.stats()
+    lines.append(
+        f"\nLoad: {admission['in_flight']} running, {admission['queued']} queued; "
+        f"shed {admission['shed_interjections']} interjections, {admission['busy_replies']} busy replies, "
+        f"throttled {admission['throttled']} requests"
+    )
+
+    queries = query_metrics.stats()
+    lines.append(
+        f"Database: {queries['avg_queries']:.1f} queries / {queries['avg_ms']:.1f}ms per update on average, "
+        f"max {queries['max_queries']} queries, {queries['commits']} commits over {queries['updates']} updates"
+    )
+    transports = []
+    for name, transport in transport_stats.items():
+        http = transport.stats()
+        transports.append(
+            f"{name} {http['requests']} requests over {http['connections']} connections ({http['reuse_rate']:.0%} reused)"
+        )
+    lines.append(f"HTTP: {', '.join(transports)}")
+    warm_start = context.bot_data.get("warm_start")
+    if warm_start is not None and warm_start.first_reply_seconds is not None:
+        lines.append(f"First reply after restart: {warm_start.first_reply_seconds * 1000:.0f}ms")
+
+    gemini_service = context.bot_data["gemini_service"]
+    hedging = gemini_service.hedger.stats()
+    if hedging["hedged"]:
+        lines.append(
+            f"\nHedging: {hedging['hedged']}/{hedging['requests']} requests hedged "
+            f"({hedging['hedge_rate']:.1%}), hedge won {hedging['hedge_wins']} times"
+        )
+
+    key_pool = gemini_service.key_pool
+    if key_pool:
+        lines.append("\nAPI keys:")
+        lines.extend(
+            f"• {key['key']}: {key['requests']} requests ({key['last_minute']}/min), "
+            f"{key['errors']} errors, {key['rate_limited']} rate limited"
+            + (f", cooling down {key['cooldown_seconds']}s" if key["cooldown_seconds"] else "")
+            for key in key_pool.snapshot()
+        )
+
+    await sender.reply_text(update.message, "\n".join(lines))
@@ -6,7 +6,8 @@ from telegram.ext import ContextTypes, ConversationHandler
 from bot.database import crud
 from bot.services.prompt_service import PromptService
 from bot.core.logging import logger
-from .callbacks import show_prompt_management_menu
+from bot.telegram.sender import OutboundSender
+from .callbacks import edit_menu, show_prompt_management_menu
 
 # --- 1. 定义对话状态 (Define Conversation States) ---
 # 使用数字常量来表示对话的不同阶段，清晰明了
@@ -21,7 +22,8 @@ async def add_prompt_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     query = update.callback_query
     if query:
         await query.answer()
-        await query.edit_message_text(
+        await edit_menu(
+            update, context,
             text="好的，请发送你想要添加的新角色设定。\n\n"
                  "请遵循以下格式：\n\n"
                  "Title: [你的角色标题]\n\n"
@@ -39,6 +41,7 @@ async def received_prompt_text(update: Update, context: ContextTypes.DEFAULT_TYP
     It parses, validates, and saves the prompt.
     """
     user_id = update.effective_user.id
+    sender: OutboundSender = context.bot_data["sender"]
     message_text = update.message.text
 
     # --- 2. 解析用户输入 (Parse User Input) ---
@@ -47,7 +50,8 @@ async def received_prompt_text(update: Update, context: ContextTypes.DEFAULT_TYP
     parts = re.split(r'\n\s*\n', message_text, 1)
 
     if not title_match or len(parts) < 2:
-        await update.message.reply_text(
+        await sender.reply_text(
+            update.message,
             "格式似乎不对哦。请确保你的消息包含 'Title: ...' 和一个空行来分隔标题和描述。\n\n"
             "例如：\n"
             "Title: 莎士比亚\n\n"
@@ -61,7 +65,8 @@ async def received_prompt_text(update: Update, context: ContextTypes.DEFAULT_TYP
     prompt_text = parts[1].strip()
 
     if not title or not prompt_text:
-        await update.message.reply_text(
+        await sender.reply_text(
+            update.message,
             "标题和描述都不能为空，请重新发送。或输入 /cancel 取消。"
         )
         return AWAITING_PROMPT_TEXT
@@ -71,12 +76,13 @@ async def received_prompt_text(update: Update, context: ContextTypes.DEFAULT_TYP
         prompt_service: PromptService = context.bot_data["prompt_service"]
         prompt_service.create_new_prompt(user_id=user_id, title=title, text=prompt_text)
         logger.info(f"User {user_id} successfully created prompt '{title}'")
-        await update.message.reply_text(
+        await sender.reply_text(
+            update.message,
             f"✅ 角色 '{title}' 添加成功！现在所有用户都可以使用它了。"
         )
     except Exception as e:
         logger.error(f"Failed to create prompt by user {user_id}. Error: {e}", exc_info=True)
-        await update.message.reply_text("抱歉，创建角色时发生错误，请稍后再试。")
+        await sender.reply_text(update.message, "抱歉，创建角色时发生错误，请稍后再试。")
 
     # --- 4. 结束对话 (End Conversation) ---
     # 显示更新后的 prompt 列表
@@ -92,7 +98,9 @@ async def cancel_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE
     """
     user = update.effective_user
     logger.info(f"User {user.id} canceled the conversation.")
-    await update.message.reply_text(
+    sender: OutboundSender = context.bot_data["sender"]
+    await sender.reply_text(
+        update.message,
         "好的，操作已取消。"
     )
     # 告诉 ConversationHandler 对话已结束
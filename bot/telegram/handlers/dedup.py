@@ -0,0 +1,17 @@
+# bot/telegram/handlers/dedup.py
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+
+from bot.services.update_dedup import UpdateDeduplicator
+from bot.core.logging import logger
+
+
+async def skip_duplicate_updates(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Runs before every other handler and stops updates that were already processed,
+    e.g. ones Telegram redelivers after a restart.
+    """
+    dedup: UpdateDeduplicator = context.bot_data["update_dedup"]
+    if dedup.is_duplicate(update.update_id):
+        logger.info(f"Skipping already processed update {update.update_id}.")
+        raise ApplicationHandlerStop
@@ -0,0 +1,55 @@
+# bot/telegram/handlers/inline.py
+from telegram import (
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    Update,
+)
+from telegram.ext import ContextTypes
+
+from bot.core.config import get_settings
+from bot.services.prompt_service import PromptSearchResult, PromptService
+from bot.telegram import callback_data
+
+
+def _to_article(result: PromptSearchResult) -> InlineQueryResultArticle:
+    """Turns a search result into an inline article with a button that activates the persona."""
+    prompt = result.prompt
+    token = callback_data.encode_prompt_key(prompt["key"])
+    return InlineQueryResultArticle(
+        id=token,
+        title=prompt["title"],
+        description=result.snippet or None,
+        input_message_content=InputTextMessageContent(f"🎭 {prompt['title']}\n\n{result.snippet}".strip()),
+        reply_markup=InlineKeyboardMarkup([[
+            InlineKeyboardButton(
+                "Use this persona",
+                callback_data=callback_data.encode(callback_data.SELECT_PROMPT, token),
+            )
+        ]]),
+    )
+
+
+async def handle_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Handles inline queries (@bot <text>) by returning the best matching personas.
+    An empty query lists the first page of the catalogue.
+    """
+    inline_query = update.inline_query
+    settings = get_settings().app.telegram_bot
+    prompt_service: PromptService = context.bot_data["prompt_service"]
+
+    query = inline_query.query.strip()
+    if query:
+        results = prompt_service.search_prompts(query, limit=settings.inline_results_limit)
+    else:
+        page = prompt_service.get_prompt_page(page_size=settings.inline_results_limit)
+        results = [PromptSearchResult(prompt, "") for prompt in page.prompts]
+
+    await inline_query.answer(
+        [_to_article(result) for result in results],
+        # The same query gives everyone the same results, so Telegram may cache them for all users
+        cache_time=settings.inline_cache_seconds,
+        is_personal=False,
+    )
@@ -1,55 +1,110 @@
 # bot/telegram/handlers/messages.py
+import time
+from typing import List, Optional
+
 from telegram import Update, constants
 from telegram.ext import ContextTypes
 
-from bot.services.chat_service import ChatService
+from bot.core.config import get_settings
+from bot.services.chat_service import ChatService, with_media_label
+from bot.services.media import MediaCache, MediaInput, MediaTooLarge, UnsupportedMedia
+from bot.telegram.media import Attachment, download_attachment, find_attachment
+from bot.telegram.sender import OutboundSender
 from bot.core.logging import logger
 
 
+async def _download_media(context: ContextTypes.DEFAULT_TYPE, attachment: Optional[Attachment]) -> List[MediaInput]:
+    if attachment is None:
+        return []
+    media_cache: Optional[MediaCache] = context.bot_data.get("media_cache")
+    media_config = get_settings().app.media
+    return [await download_attachment(context.bot, attachment, media_cache,
+                                      max_bytes=media_config.max_file_bytes, mime_types=media_config.mime_types)]
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
-    Handles all non-command text messages and routes them to the appropriate service.
+    Handles all non-command text and media messages and routes them to the appropriate service.
+    Media (photos, voice notes, documents...) is sent to Gemini along with its caption; it's
+    downloaded by the chat service, after the rate limits and admission control.
     """
+    message = update.message
+    attachment = find_attachment(message) if message and get_settings().app.media.enabled else None
     # Ignore empty messages
-    if not update.message or not update.message.text:
+    if not message or not (message.text or attachment):
         return
+    received_at = time.monotonic()
 
     user = update.effective_user
     chat = update.effective_chat
-    text = update.message.text
+    text = message.text or message.caption or ""
+    media_kind = attachment.kind if attachment else None
+    load_media = (lambda: _download_media(context, attachment)) if attachment else None
 
-    logger.info(f"Message received from user {user.id} in chat {chat.id} ({chat.type})")
+    async def show_typing() -> None:
+        # Only for messages that will be answered: not for rate-limited, shed or busy-replied ones
+        await context.bot.send_chat_action(chat_id=chat.id, action=constants.ChatAction.TYPING)
 
-    # Show "typing..." action to the user
-    await context.bot.send_chat_action(chat_id=chat.id, action=constants.ChatAction.TYPING)
+    logger.info(f"Message received from user {user.id} in chat {chat.id} ({chat.type})")
 
-    # Retrieve the chat service from context
+    # Retrieve the chat service and the outbound queue from context
     chat_service: ChatService = context.bot_data["chat_service"]
+    sender: OutboundSender = context.bot_data["sender"]
 
     response = None
     try:
         # Route to the correct service method based on chat type
         if chat.type == constants.ChatType.PRIVATE:
-            response = await chat_service.handle_private_message(user_data=user, text=text)
+            response = await chat_service.inflight.run(
+                (chat.id, 0),
+                lambda: chat_service.handle_private_message(user_data=user, text=text, load_media=load_media,
+                                                            media_kind=media_kind, on_admitted=show_typing),
+                supersede=chat_service.supersedes_on_new_message(is_private=True),
+            )
         elif chat.type in [constants.ChatType.GROUP, constants.ChatType.SUPERGROUP]:
             # Check if the bot was mentioned
             bot_username = context.bot.username
             is_mention = any(
                 e.type == constants.MessageEntityType.MENTION and text[
                                                                   e.offset:e.offset + e.length] == f"@{bot_username}"
-                for e in update.message.entities
+                for e in (message.entities if message.text else message.caption_entities)
             )
-            response = await chat_service.handle_group_message(
-                chat_id=chat.id,
-                user_data=user,
-                text=text,
-                is_mention=is_mention
+
+            # Most group messages are never answered: just buffer them, with no
+            # Bot API call, no download and no database work.
+            if not chat_service.should_reply_in_group(chat_id=chat.id, is_mention=is_mention):
+                chat_service.log_group_message(chat_id=chat.id, user_data=user,
+                                               text=with_media_label(text, media_kind))
+                return
+
+            response = await chat_service.inflight.run(
+                (chat.id, chat_service.session_user_id(chat.id, user.id)),
+                lambda: chat_service.handle_group_message(
+                    chat_id=chat.id,
+                    user_data=user,
+                    text=text,
+                    is_mention=is_mention,
+                    load_media=load_media,
+                    media_kind=media_kind,
+                    on_admitted=show_typing,
+                ),
+                supersede=chat_service.supersedes_on_new_message(is_private=False),
             )
 
-        # If the service returned a response, send it
+        # If the service returned a response, send it (a cancelled generation returns None)
         if response:
-            await update.message.reply_text(response)
+            await sender.reply_text(message, response)
+            warm_start = context.bot_data.get("warm_start")
+            if warm_start is not None:
+                warm_start.record_reply(received_at)
 
+    except UnsupportedMedia as e:
+        logger.info(f"Refused a {media_kind} in chat {chat.id}: {e}")
+        await sender.reply_text(message, f"Sorry, I can't read {e.mime_type} files. "
+                                         f"Photos, PDFs, text files, audio and video work.")
+    except MediaTooLarge as e:
+        logger.info(f"Refused a {media_kind} in chat {chat.id}: {e}")
+        await sender.reply_text(message, f"Sorry, that {media_kind} is too large for me (the limit is {e.limit // 1_000_000} MB).")
     except Exception as e:
         logger.error(f"Error handling message in chat {chat.id}: {e}", exc_info=True)
-        await update.message.reply_text("I'm sorry, an unexpected error occurred. Please try again later.")
+        await sender.reply_text(message, "I'm sorry, an unexpected error occurred. Please try again later.")
@@ -0,0 +1,17 @@
+# bot/telegram/handlers/recording.py
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from bot.telegram.recording import UpdateRecorder
+
+
+async def record_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Runs before every other handler, the duplicate check included, and records the update
+    as it arrived.
+    """
+    recorder: Optional[UpdateRecorder] = context.bot_data.get("update_recorder")
+    if recorder is not None:
+        recorder.record(update)
@@ -1,8 +1,9 @@
 # bot/telegram/keyboards.py
-from typing import List
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from bot.services.prompt_service import UnifiedPrompt
-from bot.database import models
+from bot.services.prompt_service import PromptPage
+from bot.telegram import callback_data
+
+ACTIVE_MARK = "✅ "
 
 
 def create_start_menu_keyboard() -> InlineKeyboardMarkup:
@@ -20,33 +21,46 @@ def create_start_menu_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(keyboard)
 
 
-def create_prompt_list_keyboard(prompts: List[UnifiedPrompt], active_key: str) -> InlineKeyboardMarkup:
+def create_prompt_list_keyboard(page: PromptPage, active_key: str) -> InlineKeyboardMarkup:
     """
-    Creates a keyboard to display a list of all available prompts.
+    Creates a keyboard to display one page of the available prompts.
 
     Args:
-        prompts: A list of UnifiedPrompt objects from PromptService.
+        page: A PromptPage from PromptService.get_prompt_page.
         active_key: The key of the currently active prompt for this session.
     """
     keyboard = []
-    for prompt in prompts:
+    for prompt in page.prompts:
         # Check if the current prompt's key matches the session's active key
         is_active = prompt["key"] == active_key
-        button_text = f"✅ {prompt['title']}" if is_active else prompt['title']
+        button_text = f"{ACTIVE_MARK}{prompt['title']}" if is_active else prompt['title']
 
-        # The callback data must be the unique key
-        callback_data_select = f"select_prompt:{prompt['key']}"
+        # The callback data carries a compact token of the unique key
+        callback_data_select = callback_data.encode(
+            callback_data.SELECT_PROMPT, callback_data.encode_prompt_key(prompt["key"])
+        )
 
         row = [InlineKeyboardButton(button_text, callback_data=callback_data_select)]
 
         # Only allow deleting prompts from the database (source: 'db')
         if prompt['source'] == 'db':
             prompt_id = prompt['key'].split(':')[1]
-            callback_data_delete = f"delete_prompt:{prompt_id}"
+            callback_data_delete = callback_data.encode(callback_data.DELETE_PROMPT, prompt_id)
             row.append(InlineKeyboardButton("❌", callback_data=callback_data_delete))
 
         keyboard.append(row)
 
+    # Page navigation
+    navigation = []
+    if page.prev_cursor:
+        navigation.append(InlineKeyboardButton(
+            "‹ Prev", callback_data=callback_data.encode(callback_data.PAGE_PREV, page.prev_cursor)))
+    if page.next_cursor:
+        navigation.append(InlineKeyboardButton(
+            "Next ›", callback_data=callback_data.encode(callback_data.PAGE_NEXT, page.next_cursor)))
+    if navigation:
+        keyboard.append(navigation)
+
     # Add navigation buttons at the bottom
     keyboard.append([
         InlineKeyboardButton("＋ Add New", callback_data="add_new_prompt"),
@@ -56,6 +70,26 @@ def create_prompt_list_keyboard(prompts: List[UnifiedPrompt], active_key: str) -
     return InlineKeyboardMarkup(keyboard)
 
 
+def mark_active_prompt(markup: InlineKeyboardMarkup, active_key: str) -> InlineKeyboardMarkup:
+    """
+    Moves the ✅ mark of an existing prompt list keyboard to `active_key`.
+    This re-renders the current page after a selection without querying anything.
+    """
+    active_data = callback_data.encode(callback_data.SELECT_PROMPT, callback_data.encode_prompt_key(active_key))
+    keyboard = []
+    for row in markup.inline_keyboard:
+        new_row = []
+        for button in row:
+            decoded = callback_data.decode(button.callback_data or "")
+            if decoded and decoded[0] == callback_data.SELECT_PROMPT:
+                title = button.text.removeprefix(ACTIVE_MARK)
+                text = f"{ACTIVE_MARK}{title}" if button.callback_data == active_data else title
+                button = InlineKeyboardButton(text, callback_data=button.callback_data)
+            new_row.append(button)
+        keyboard.append(new_row)
+    return InlineKeyboardMarkup(keyboard)
+
+
 def create_confirm_delete_keyboard(prompt_id: int) -> InlineKeyboardMarkup:
     """
     Creates a confirmation keyboard for deleting a prompt.
@@ -65,8 +99,10 @@ def create_confirm_delete_keyboard(prompt_id: int) -> InlineKeyboardMarkup:
     """
     keyboard = [
         [
-            InlineKeyboardButton("Yes, Delete It", callback_data=f"confirm_delete_prompt:{prompt_id}"),
-            InlineKeyboardButton("Cancel", callback_data=f"cancel_delete_prompt:{prompt_id}")
+            InlineKeyboardButton("Yes, Delete It",
+                                 callback_data=callback_data.encode(callback_data.CONFIRM_DELETE, str(prompt_id))),
+            InlineKeyboardButton("Cancel",
+                                 callback_data=callback_data.encode(callback_data.CANCEL_DELETE, str(prompt_id)))
         ]
     ]
     return InlineKeyboardMarkup(keyboard)
@@ -0,0 +1,61 @@
+# bot/telegram/media.py
+import asyncio
+from dataclasses import dataclass
+from typing import Collection, Optional
+
+from telegram import Bot, Message
+
+from bot.core.logging import logger
+from bot.services.media import MediaCache, MediaInput, MediaTooLarge, UnsupportedMedia
+
+
+@dataclass(frozen=True)
+class Attachment:
+    """The media of a message, before it is downloaded."""
+    kind: str  # "photo", "voice", ... as shown in the session history
+    file_id: str
+    file_unique_id: str
+    file_size: Optional[int]
+    mime_type: str
+
+
+def find_attachment(message: Message) -> Optional[Attachment]:
+    """Returns the message's photo, voice note, audio, video or document, if it has one."""
+    if message.photo:
+        # Sizes are in ascending order; the largest one reads best
+        photo = message.photo[-1]
+        return Attachment("photo", photo.file_id, photo.file_unique_id, photo.file_size, "image/jpeg")
+    for kind, default_mime_type in (("voice", "audio/ogg"), ("audio", "audio/mpeg"),
+                                    ("video", "video/mp4"), ("document", "application/octet-stream")):
+        media = getattr(message, kind)
+        if media:
+            return Attachment(kind, media.file_id, media.file_unique_id, media.file_size,
+                              media.mime_type or default_mime_type)
+    return None
+
+
+async def download_attachment(bot: Bot, attachment: Attachment, cache: Optional[MediaCache],
+                              max_bytes: int, mime_types: Optional[Collection[str]] = None) -> MediaInput:
+    """
+    Returns the attachment's content, from the cache or downloaded straight into memory.
+
+    Raises:
+        UnsupportedMedia: If `mime_types` is given and doesn't include the attachment's type.
+        MediaTooLarge: If the file is over `max_bytes`.
+    """
+    mime_type = attachment.mime_type.split(";", 1)[0].strip().lower()
+    if mime_types is not None and mime_type not in mime_types:
+        raise UnsupportedMedia(mime_type)
+    if attachment.file_size and attachment.file_size > max_bytes:
+        raise MediaTooLarge(attachment.file_size, max_bytes)
+
+    data = await asyncio.to_thread(cache.get, attachment.file_unique_id) if cache is not None else None
+    if data is None:
+        telegram_file = await bot.get_file(attachment.file_id)
+        data = bytes(await telegram_file.download_as_bytearray())
+        if len(data) > max_bytes:
+            raise MediaTooLarge(len(data), max_bytes)
+        logger.debug(f"Downloaded {attachment.kind} {attachment.file_unique_id} ({len(data)} bytes).")
+        if cache is not None:
+            await asyncio.to_thread(cache.put, attachment.file_unique_id, data)
+    return MediaInput(data=data, mime_type=attachment.mime_type)
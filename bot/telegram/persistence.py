@@ -0,0 +1,171 @@
+# bot/telegram/persistence.py
+import asyncio
+import json
+import pickle
+from collections import defaultdict
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from sqlalchemy.orm import Session
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot.core.logging import logger
+from bot.database import SessionLocal, get_engine
+from bot.database import crud
+from bot.database.crud.persistence_crud import EntryKey
+from bot.database.models import Base
+
+USER_DATA = "user_data"
+CHAT_DATA = "chat_data"
+
+# The shapes PTB documents for BasePersistence subclasses (its own aliases are private)
+ConversationKey = Tuple[Union[int, str], ...]
+ConversationDict = Dict[ConversationKey, object]
+
+
+class SqlPersistence(BasePersistence):
+    """
+    Keeps user_data, chat_data and ConversationHandler states in the bot's database, so
+    they survive restarts. bot_data holds the services and is not persisted.
+
+    The Application hands over the data of the users and chats touched since its last
+    run every `update_interval` seconds. Entries whose pickled content didn't change since
+    they were last written are skipped; the rest of a run is written with one commit.
+    """
+
+    def __init__(self, update_interval: float = 60, session_factory: Optional[Callable[[], Session]] = None):
+        super().__init__(store_data=PersistenceInput(bot_data=False, callback_data=False),
+                         update_interval=update_interval)
+        self._session_factory = session_factory
+        self._db: Optional[Session] = None
+        # Pickled content as last loaded or written, to skip unchanged entries
+        self._stored: Dict[EntryKey, bytes] = {}
+        # Changes waiting to be written; None deletes the entry
+        self._pending: Dict[EntryKey, Optional[bytes]] = {}
+        self._write_task: Optional["asyncio.Task[None]"] = None
+        self.writes = 0
+
+    def _session(self) -> Session:
+        if self._db is None:
+            if self._session_factory is None:
+                get_engine()  # Binds SessionLocal
+                self._session_factory = SessionLocal
+            self._db = self._session_factory()
+            # The Application loads the persistence before post_init creates the tables
+            Base.metadata.create_all(bind=self._db.get_bind())
+        return self._db
+
+    def _load(self, kind: str) -> Dict[str, Any]:
+        loaded = {}
+        for key, data in crud.load_persistence_entries(db=self._session(), kind=kind).items():
+            self._stored[(kind, key)] = data
+            loaded[key] = pickle.loads(data)
+        return loaded
+
+    # --- Loading, once at startup ---
+
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return defaultdict(dict, {int(key): data for key, data in self._load(USER_DATA).items()})
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return defaultdict(dict, {int(key): data for key, data in self._load(CHAT_DATA).items()})
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        return {tuple(json.loads(key)): state for key, state in self._load(f"conversation:{name}").items()}
+
+    # --- Updates, batched ---
+
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]) -> None:
+        self._change((USER_DATA, str(user_id)), data)
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]) -> None:
+        self._change((CHAT_DATA, str(chat_id)), data)
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        entry = (f"conversation:{name}", json.dumps(list(key)))
+        if new_state is None:
+            self._delete(entry)
+        else:
+            self._change(entry, new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._delete((USER_DATA, str(user_id)))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._delete((CHAT_DATA, str(chat_id)))
+
+    async def update_bot_data(self, data: Dict[Any, Any]) -> None:
+        pass
+
+    async def update_callback_data(self, data: Any) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Writes whatever is pending; called by the Application on shutdown."""
+        self._write()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _change(self, entry: EntryKey, value: Any) -> None:
+        try:
+            data = pickle.dumps(value)
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            logger.error(f"Could not persist {entry[0]} {entry[1]}: {e}")
+            return
+        if self._stored.get(entry) == data:
+            self._pending.pop(entry, None)
+            return
+        self._pending[entry] = data
+        self._schedule_write()
+
+    def _delete(self, entry: EntryKey) -> None:
+        if entry in self._stored or entry in self._pending:
+            self._pending[entry] = None
+            self._schedule_write()
+
+    def _schedule_write(self) -> None:
+        # The Application runs all update_* calls of one run together; writing once they are
+        # done turns the run into a single commit
+        if self._write_task is None:
+            self._write_task = asyncio.get_running_loop().create_task(self._write_soon())
+
+    async def _write_soon(self) -> None:
+        try:
+            await asyncio.sleep(0)
+            self._write()
+        finally:
+            self._write_task = None
+
+    def _write(self) -> None:
+        if not self._pending:
+            return
+        changes, self._pending = self._pending, {}
+        try:
+            crud.save_persistence_entries(db=self._session(), changes=changes)
+        except Exception as e:
+            logger.error(f"Failed to write {len(changes)} persistence entries: {e}", exc_info=True)
+            self._session().rollback()
+            # Retried with the next run, unless newer data arrived in the meantime
+            self._pending = {**changes, **self._pending}
+            return
+        for entry, data in changes.items():
+            if data is None:
+                self._stored.pop(entry, None)
+            else:
+                self._stored[entry] = data
+        self.writes += 1
@@ -0,0 +1,177 @@
+# bot/telegram/recording.py
+import gzip
+import hashlib
+import hmac
+import json
+import secrets
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, Mapping, Optional, Sequence, Tuple
+
+from telegram import Update
+
+from bot.core.logging import logger
+
+FORMAT_VERSION = 1
+CHAT_TYPES = {"private", "group", "supergroup", "channel"}
+# Strings that describe structure rather than content are kept as they are
+_KEPT_STRINGS = {"type", "mime_type", "language_code", "data", "chat_instance", "id", "inline_message_id"}
+# Opaque references that could still be used to fetch content (e.g. a file_id with the real token)
+_OPAQUE_STRINGS = {"file_id", "file_unique_id"}
+# Replacement characters of the same UTF-16 length, so entity offsets stay valid
+_FILLER = {1: "x", 2: "\U0001F600"}
+
+
+def _utf16_slice(text: str, start: int, end: int) -> str:
+    return text.encode("utf-16-le")[2 * start:2 * end].decode("utf-16-le", errors="replace")
+
+
+class UpdateScrubber:
+    """
+    Removes personal data from an update's dict while keeping its shape.
+
+    Texts, captions, names and queries keep their length (in UTF-16 units, so entity
+    offsets stay valid) and their whitespace; every other character is replaced. Commands
+    and mentions of the bot are kept, so replies and mention ratios replay as recorded.
+    User and chat ids and file ids are replaced by keyed hashes: consistent within one
+    recording (the same user is the same pseudonym throughout), but the key is never
+    written, so they can't be traced back. Coordinates are zeroed. The bot's own user
+    object is public and kept.
+    """
+
+    def __init__(self, bot_id: int, bot_username: str):
+        self.bot_id = bot_id
+        self.bot_mention = f"@{bot_username}"
+        self._key = secrets.token_bytes(16)
+
+    def scrub(self, value: Any, key: Optional[str] = None) -> Any:
+        if isinstance(value, dict):
+            return self._scrub_object(value)
+        if isinstance(value, list):
+            return [self.scrub(item, key) for item in value]
+        if isinstance(value, str):
+            if key in _OPAQUE_STRINGS:
+                return self._digest(value).hex()[:32]
+            if key in _KEPT_STRINGS:
+                return value
+            return self.scrub_text(value)
+        if isinstance(value, bool) or value is None:
+            return value
+        if isinstance(value, int):
+            if key is not None and key.endswith(("user_id", "chat_id")):
+                return self._pseudonym(value)
+            return value  # Dates, message ids, offsets, sizes
+        if isinstance(value, float):
+            return 0.0  # Coordinates
+        return value
+
+    def scrub_text(self, text: str, entities: Optional[Sequence[Mapping[str, Any]]] = None) -> str:
+        kept = []  # (start, end) in UTF-16 units
+        for entity in entities or ():
+            start, end = entity["offset"], entity["offset"] + entity["length"]
+            if entity["type"] == "bot_command" or (
+                    entity["type"] == "mention" and _utf16_slice(text, start, end) == self.bot_mention):
+                kept.append((start, end))
+        scrubbed, position = [], 0
+        for char in text:
+            width = 2 if ord(char) > 0xFFFF else 1
+            if char.isspace() or any(start <= position < end for start, end in kept):
+                scrubbed.append(char)
+            else:
+                scrubbed.append(_FILLER[width])
+            position += width
+        return "".join(scrubbed)
+
+    def _scrub_object(self, obj: Dict[str, Any]) -> Dict[str, Any]:
+        is_party = "is_bot" in obj or obj.get("type") in CHAT_TYPES
+        if is_party and obj.get("id") == self.bot_id:
+            return dict(obj)
+        scrubbed = {}
+        for key, value in obj.items():
+            if is_party and key == "id":
+                scrubbed[key] = self._pseudonym(value)
+            elif key == "text":
+                scrubbed[key] = self.scrub_text(value, obj.get("entities"))
+            elif key == "caption":
+                scrubbed[key] = self.scrub_text(value, obj.get("caption_entities"))
+            else:
+                scrubbed[key] = self.scrub(value, key)
+        return scrubbed
+
+    def _digest(self, value: Any) -> bytes:
+        return hmac.new(self._key, str(value).encode(), hashlib.sha256).digest()
+
+    def _pseudonym(self, value: int) -> int:
+        # Keeps the sign: group and channel ids are negative
+        pseudonym = int.from_bytes(self._digest(value)[:6], "big") % 10**12 + 1
+        return -pseudonym if value < 0 else pseudonym
+
+
+class UpdateRecorder:
+    """
+    Writes incoming updates, scrubbed, to a gzip-compressed JSONL file for replays
+    (see bot.telegram.replay).
+
+    The first line describes the recording and the bot; every other line is one update
+    with `t`, the seconds since recording started, so replays keep the traffic's timing.
+    """
+
+    def __init__(self, directory: str, bot_id: int, bot_username: str, max_updates: int = 0):
+        started = datetime.now(timezone.utc)
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.path = Path(directory) / f"updates-{started:%Y%m%d-%H%M%S}.jsonl.gz"
+        self.max_updates = max_updates
+        self.recorded = 0
+        self.scrubber = UpdateScrubber(bot_id=bot_id, bot_username=bot_username)
+        self._started = time.monotonic()
+        self._file = gzip.open(self.path, "wt", encoding="utf-8", compresslevel=6)
+        self._write({
+            "version": FORMAT_VERSION,
+            "started_at": started.isoformat(),
+            "bot": {"id": bot_id, "username": bot_username},
+        })
+        logger.info(f"Recording incoming updates to {self.path}.")
+
+    def record(self, update: Update) -> None:
+        if self._file is None:
+            return
+        self._write({
+            "t": round(time.monotonic() - self._started, 4),
+            "update": self.scrubber.scrub(update.to_dict()),
+        })
+        self.recorded += 1
+        if self.max_updates and self.recorded >= self.max_updates:
+            logger.info(f"Recorded {self.recorded} updates, the configured maximum.")
+            self.close()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def read_recording(path: str) -> Tuple[Dict[str, Any], Iterator[Tuple[float, Dict[str, Any]]]]:
+    """
+    Opens a recording.
+
+    Returns:
+        Its header and an iterator over (seconds since start, update dict).
+    """
+    file = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(file.readline())
+    if header.get("version") != FORMAT_VERSION:
+        file.close()
+        raise ValueError(f"{path} is not a version {FORMAT_VERSION} update recording")
+
+    def updates() -> Iterator[Tuple[float, Dict[str, Any]]]:
+        with file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    yield entry["t"], entry["update"]
+
+    return header, updates()
@@ -0,0 +1,272 @@
+# bot/telegram/replay.py
+"""
+Replays a recording of incoming updates (see bot.telegram.recording) through the full
+Application, against a fake Bot API and a fake Gemini backend:
+
+    python -m bot.telegram.replay data/recordings/updates-....jsonl.gz --speed 10
+
+Everything else (handlers, services, admission control, rate limits, the database) is the
+real code, configured from config/app_config.yml, so concurrency settings can be tuned and
+regressions caught on realistic traffic before a deploy. The database is a scratch one.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import tempfile
+import time
+from collections import Counter
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+from bot.core.config import Settings, load_yaml_configs, use_settings
+from bot.core.logging import logger
+from bot.database import dispose_engine
+from bot.database.query_stats import query_metrics
+from bot.telegram.app import build_application
+from bot.telegram.recording import read_recording
+
+REPLAY_TOKEN = "123456:replay"
+
+
+class FakeBotApi(BaseRequest):
+    """
+    Answers Bot API calls in memory, after `latency` seconds each, and counts them by method.
+
+    Sent messages get increasing message_ids; file downloads return zero bytes of the size
+    the recorded update gave. When a reply to a replayed message is sent, the time since
+    that message was fed in is kept in `reply_latencies`.
+    """
+
+    def __init__(self, bot: Dict[str, Any], latency: float = 0.0):
+        self.bot = {"is_bot": True, "first_name": bot.get("username") or "bot", **bot}
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.reply_latencies: List[float] = []
+        self.file_sizes: Dict[str, int] = {}
+        self._fed_at: Dict[tuple, float] = {}
+        self._message_ids = itertools.count(1)
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def feed(self, update: Dict[str, Any]) -> None:
+        """Registers an update about to be processed: its message, for reply latencies, and its files."""
+        message = update.get("message") or update.get("edited_message")
+        if message:
+            self._fed_at[(message["chat"]["id"], message["message_id"])] = time.monotonic()
+        self._find_files(update)
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         *args: Any, **kwargs: Any) -> tuple:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if "/file/bot" in url:
+            self.calls["download"] += 1
+            return 200, bytes(self.file_sizes.get(url.rsplit("/", 1)[-1], 0))
+        name = url.rsplit("/", 1)[-1]
+        self.calls[name] += 1
+        parameters = request_data.parameters if request_data else {}
+        return 200, json.dumps({"ok": True, "result": self._result(name, parameters)}).encode()
+
+    def _result(self, name: str, parameters: Dict[str, Any]) -> Any:
+        if name == "getMe":
+            return self.bot
+        if name == "getUpdates":
+            return []
+        if name == "getFile":
+            file_id = parameters["file_id"]
+            return {"file_id": file_id, "file_unique_id": file_id,
+                    "file_size": self.file_sizes.get(file_id, 0), "file_path": f"replay/{file_id}"}
+        if name.startswith("send") and name != "sendChatAction":
+            chat_id = int(parameters["chat_id"])
+            reply_to = (parameters.get("reply_parameters") or {}).get("message_id")
+            fed_at = self._fed_at.pop((chat_id, reply_to), None)
+            if fed_at is not None:
+                self.reply_latencies.append(time.monotonic() - fed_at)
+            return self._message(chat_id, next(self._message_ids), parameters.get("text", ""))
+        if name.startswith("edit") and "inline_message_id" not in parameters:
+            return self._message(int(parameters["chat_id"]), parameters["message_id"], parameters.get("text", ""))
+        return True
+
+    def _message(self, chat_id: int, message_id: int, text: str) -> Dict[str, Any]:
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup"},
+            "from": self.bot,
+            "text": text,
+        }
+
+    def _find_files(self, value: Any) -> None:
+        if isinstance(value, dict):
+            if "file_id" in value:
+                self.file_sizes[value["file_id"]] = value.get("file_size") or 0
+            for item in value.values():
+                self._find_files(item)
+        elif isinstance(value, list):
+            for item in value:
+                self._find_files(item)
+
+
+class FakeGeminiClient:
+    """
+    Stands in for a google-genai Client: generate_content answers after `latency` seconds
+    (± `jitter` of it) with a reply of `reply_chars` characters, and reports token usage
+    of about four characters per token.
+    """
+
+    def __init__(self, latency: float = 1.0, jitter: float = 0.5, reply_chars: int = 400, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.reply_chars = reply_chars
+        self.requests = 0
+        self._random = random.Random(seed)
+        # Mirrors the client.aio.models.<method> path GeminiService calls
+        self.aio = SimpleNamespace(models=self)
+
+    async def get(self, model: str, **kwargs: Any) -> None:
+        pass
+
+    async def generate_content(self, model: str, contents: List[Any], config: Any = None) -> Any:
+        from google.genai import types as genai_types
+
+        self.requests += 1
+        await asyncio.sleep(self.latency * (1 + self.jitter * self._random.uniform(-1, 1)))
+        prompt_chars = sum(len(part.text or "") for content in contents for part in content.parts or ())
+        text = ("lorem ipsum dolor sit amet " * (self.reply_chars // 27 + 1))[:self.reply_chars]
+        return genai_types.GenerateContentResponse(
+            candidates=[genai_types.Candidate(
+                content=genai_types.Content(role="model", parts=[genai_types.Part.from_text(text=text)]),
+            )],
+            usage_metadata=genai_types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt_chars // 4,
+                candidates_token_count=len(text) // 4,
+                total_token_count=(prompt_chars + len(text)) // 4,
+            ),
+        )
+
+
+def replay_settings(database_url: str, media_cache_dir: str) -> Settings:
+    """
+    The configuration from the YAML files, pointed at scratch resources: the database, the
+    media cache and the response cache, with recording and config reloads off. The drain
+    deadline is lifted, so stopping waits for every reply.
+    """
+    data = load_yaml_configs()
+    app = data["app"]
+    app["database"] = {**(app.get("database") or {}), "url": database_url}
+    app["response_cache"] = {**(app.get("response_cache") or {}), "disk_path": None}
+    app["media"] = {**(app.get("media") or {}), "cache_dir": media_cache_dir}
+    app["config_reload"] = {"enabled": False}
+    app["recording"] = {"enabled": False}
+    app["shutdown"] = {"drain_seconds": 3600}
+    return Settings(telegram_bot_token=REPLAY_TOKEN, gemini_api_key="replay", gemini_api_keys=[], **data)
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+async def replay(path: str, speed: float = 1.0, bot_latency: float = 0.05,
+                 llm: Optional[FakeGeminiClient] = None, database_url: str = "sqlite:///:memory:") -> Dict[str, Any]:
+    """
+    Feeds a recording's updates into the Application at `speed` times the recorded pace
+    (0 = as fast as possible), waits for every reply and reports what happened.
+    """
+    header, records = read_recording(path)
+    bot_api = FakeBotApi(bot=header["bot"], latency=bot_latency)
+    llm = llm or FakeGeminiClient()
+
+    with tempfile.TemporaryDirectory() as media_cache_dir:
+        previous = use_settings(replay_settings(database_url, media_cache_dir))
+        # An engine created earlier in this process would still point at the real database
+        dispose_engine()
+        application = build_application(request=bot_api)
+        application.bot_data["gemini_client_factory"] = lambda api_key: llm
+        try:
+            await application.initialize()
+            await application.post_init(application)
+            await application.start()
+
+            began, behind, updates = time.monotonic(), 0.0, 0
+            for at, data in records:
+                if speed > 0:
+                    delay = began + at / speed - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    else:
+                        behind = max(behind, -delay)
+                bot_api.feed(data)
+                await application.update_queue.put(Update.de_json(data, application.bot))
+                updates += 1
+
+            # Handlers started once stop() is under way wouldn't be waited for
+            await application.update_queue.join()
+            await application.stop()
+            await application.post_stop(application)
+            seconds = time.monotonic() - began
+            chat_service = application.bot_data["chat_service"]
+            latencies = bot_api.reply_latencies
+            report = {
+                "updates": updates,
+                "seconds": round(seconds, 3),
+                "updates_per_second": round(updates / seconds, 1) if seconds else 0.0,
+                "max_seconds_behind_schedule": round(behind, 3),
+                "replies": len(latencies),
+                "reply_latency_p50": round(_percentile(latencies, 50), 3),
+                "reply_latency_p95": round(_percentile(latencies, 95), 3),
+                "reply_latency_max": round(max(latencies, default=0.0), 3),
+                "llm_requests": llm.requests,
+                "bot_api_calls": dict(bot_api.calls),
+                "admission": chat_service.admission.stats(),
+                "queries": query_metrics.stats(),
+            }
+        finally:
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+            await application.post_shutdown(application)
+            use_settings(previous)
+    logger.info(f"Replayed {updates} updates in {seconds:.1f}s.")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m bot.telegram.replay",
+                                     description="Replays recorded updates against a fake Bot API and Gemini.")
+    parser.add_argument("recording", help="A .jsonl.gz file written with recording.enabled")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Multiple of the recorded pace; 0 feeds the updates as fast as possible")
+    parser.add_argument("--bot-latency", type=float, default=0.05, help="Seconds per Bot API call")
+    parser.add_argument("--llm-latency", type=float, default=1.0, help="Mean seconds per Gemini reply")
+    parser.add_argument("--reply-chars", type=int, default=400, help="Length of the fake Gemini replies")
+    parser.add_argument("--database", default="sqlite:///:memory:", help="Scratch database URL")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(replay(
+        args.recording,
+        speed=args.speed,
+        bot_latency=args.bot_latency,
+        llm=FakeGeminiClient(latency=args.llm_latency, reply_chars=args.reply_chars),
+        database_url=args.database,
+    ))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+# bot/telegram/sender.py
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+
+from telegram import Bot, Message, ReplyParameters
+from telegram.constants import MessageLimit
+from telegram.error import RetryAfter
+
+from bot.core.config import OutboundConfig
+from bot.core.logging import logger
+
+
+def _utf16_len(text: str) -> int:
+    """Telegram measures message length in UTF-16 code units."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_text(text: str, limit: int = MessageLimit.MAX_TEXT_LENGTH) -> List[str]:
+    """
+    Splits a text into chunks Telegram accepts, preferring paragraph, line and word
+    boundaries, in that order. Only falls back to a hard cut for a single overlong word.
+    """
+    chunks = []
+    remaining = text
+    while _utf16_len(remaining) > limit:
+        # Largest prefix (in code points) that fits the UTF-16 limit
+        end = min(len(remaining), limit)
+        while _utf16_len(remaining[:end]) > limit:
+            end -= 1
+        window = remaining[:end]
+
+        # Take the first separator that still leaves at least half a chunk, so that an early
+        # paragraph break doesn't produce a tiny message; any space beats a hard cut.
+        cut = next(
+            (index for index in (window.rfind(sep) for sep in ("\n\n", "\n", " ")) if index >= end // 2),
+            window.rfind(" "),
+        )
+        if cut <= 0:
+            cut = end
+
+        chunks.append(remaining[:cut].rstrip())
+        remaining = remaining[cut:].lstrip()
+
+    if remaining or not chunks:
+        chunks.append(remaining)
+    return chunks
+
+
+class TokenBucket:
+    """A token bucket that hands out send slots at `rate` per second, with bursts of `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        """Takes a token and returns how long the caller must wait before using it."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        self._tokens -= 1
+        if self._tokens >= 0:
+            return 0.0
+        return -self._tokens / self.rate
+
+    def reconfigure(self, rate: float, capacity: float) -> None:
+        """Changes the rate and burst size, keeping the tokens (or debt) the bucket has now."""
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = min(self._tokens, capacity)
+
+    def pause(self, seconds: float) -> None:
+        """Drains the bucket so that no token is available for `seconds` (used for flood control)."""
+        self._tokens = min(self._tokens, -seconds * self.rate)
+        self._updated_at = time.monotonic()
+
+
+@dataclass
+class _Operation:
+    kind: str  # 'send', 'edit' (text) or 'markup' (keyboard only)
+    text: str
+    kwargs: Dict[str, Any]
+    future: asyncio.Future
+    message_id: Optional[int] = None
+    # Futures of earlier edits that were merged into this one
+    merged: List[asyncio.Future] = field(default_factory=list)
+
+
+class OutboundSender:
+    """
+    Queues outgoing messages per chat and sends them within Telegram's rate limits.
+
+    Every chat gets its own queue, served in order by a short-lived worker task, and its own
+    token bucket; a global bucket caps the overall rate. `RetryAfter` errors pause the chat
+    and the operation is retried. Queued edits of the same message are merged, so only the
+    latest text is sent. Every reply, menu and edit the bot makes goes through here.
+    """
+
+    def __init__(self, bot: Bot, config: OutboundConfig):
+        self.bot = bot
+        self.config = config
+        self._global_bucket = TokenBucket(config.global_rate, config.burst)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        self._queues: Dict[int, Deque[_Operation]] = {}
+        self._workers: Dict[int, asyncio.Task] = {}
+        self.retry_after_count = 0
+        self.merged_edits = 0
+
+    async def send_text(self, chat_id: int, text: str, reply_to_message_id: Optional[int] = None,
+                        reply_markup: Any = None, parse_mode: Optional[str] = None) -> List[Message]:
+        """
+        Sends a text, split into several messages if it is too long.
+        Only the first chunk is sent as a reply and only the last one carries the markup.
+        """
+        chunks = split_text(text)
+        futures = []
+        for index, chunk in enumerate(chunks):
+            kwargs: Dict[str, Any] = {}
+            if parse_mode is not None:
+                kwargs["parse_mode"] = parse_mode
+            if index == 0 and reply_to_message_id is not None:
+                kwargs["reply_parameters"] = ReplyParameters(
+                    message_id=reply_to_message_id, allow_sending_without_reply=True
+                )
+            if index == len(chunks) - 1 and reply_markup is not None:
+                kwargs["reply_markup"] = reply_markup
+            futures.append(self._enqueue(chat_id, _Operation("send", chunk, kwargs, self._new_future())))
+        return list(await asyncio.gather(*futures))
+
+    async def reply_text(self, message: Message, text: str, reply_markup: Any = None,
+                         parse_mode: Optional[str] = None) -> List[Message]:
+        """Convenience wrapper that replies to an incoming message."""
+        return await self.send_text(message.chat_id, text, reply_to_message_id=message.message_id,
+                                    reply_markup=reply_markup, parse_mode=parse_mode)
+
+    async def edit_text(self, chat_id: int, message_id: int, text: str, reply_markup: Any = None) -> Any:
+        """Edits a message's text; overlong texts are truncated to Telegram's limit."""
+        kwargs: Dict[str, Any] = {}
+        if reply_markup is not None:
+            kwargs["reply_markup"] = reply_markup
+        operation = _Operation("edit", split_text(text)[0], kwargs, self._new_future(), message_id=message_id)
+        return await self._enqueue(chat_id, operation)
+
+    async def edit_reply_markup(self, chat_id: int, message_id: int, reply_markup: Any) -> Any:
+        """Replaces only a message's inline keyboard."""
+        operation = _Operation("markup", "", {"reply_markup": reply_markup}, self._new_future(), message_id=message_id)
+        return await self._enqueue(chat_id, operation)
+
+    def reconfigure(self, config: OutboundConfig) -> None:
+        """Applies a reloaded outbound config to the buckets in use, without losing their state."""
+        self.config = config
+        self._global_bucket.reconfigure(config.global_rate, config.burst)
+        for chat_id, bucket in self._chat_buckets.items():
+            bucket.reconfigure(self._chat_rate(chat_id), config.burst)
+
+    async def close(self) -> None:
+        """Stops all chat workers. Queued operations that were not sent yet are cancelled."""
+        for task in list(self._workers.values()):
+            task.cancel()
+        await asyncio.gather(*self._workers.values(), return_exceptions=True)
+        self._workers.clear()
+        for queue in self._queues.values():
+            for operation in queue:
+                operation.future.cancel()
+        self._queues.clear()
+
+    @property
+    def queued(self) -> int:
+        """Number of operations waiting to be sent, over all chats."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    @staticmethod
+    def _new_future() -> asyncio.Future:
+        return asyncio.get_running_loop().create_future()
+
+    def _enqueue(self, chat_id: int, operation: _Operation) -> asyncio.Future:
+        queue = self._queues.setdefault(chat_id, deque())
+        if operation.kind != "send":
+            # A queued edit of the same message is superseded by this one; a text edit sets
+            # the keyboard as well, so it also supersedes a keyboard-only edit, but not vice versa
+            superseded = ("edit", "markup") if operation.kind == "edit" else ("markup",)
+            for queued in queue:
+                if queued.kind in superseded and queued.message_id == operation.message_id:
+                    queue.remove(queued)
+                    operation.merged.append(queued.future)
+                    operation.merged.extend(queued.merged)
+                    self.merged_edits += 1
+                    break
+        queue.append(operation)
+
+        if chat_id not in self._workers:
+            self._workers[chat_id] = asyncio.create_task(self._run_chat_worker(chat_id))
+        return operation.future
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self._chat_rate(chat_id), self.config.burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _chat_rate(self, chat_id: int) -> float:
+        # Negative IDs are groups and channels, which have a much lower limit
+        return self.config.group_chat_rate if chat_id < 0 else self.config.private_chat_rate
+
+    async def _run_chat_worker(self, chat_id: int) -> None:
+        queue = self._queues[chat_id]
+        try:
+            while queue:
+                operation = queue.popleft()
+                try:
+                    result = await self._execute(chat_id, operation)
+                except asyncio.CancelledError:
+                    for future in [operation.future, *operation.merged]:
+                        future.cancel()
+                    raise
+                except Exception as e:
+                    for future in [operation.future, *operation.merged]:
+                        if not future.done():
+                            future.set_exception(e)
+                else:
+                    for future in [operation.future, *operation.merged]:
+                        if not future.done():
+                            future.set_result(result)
+        finally:
+            self._workers.pop(chat_id, None)
+            if not queue:
+                self._queues.pop(chat_id, None)
+
+    async def _execute(self, chat_id: int, operation: _Operation) -> Any:
+        chat_bucket = self._chat_bucket(chat_id)
+        attempt = 0
+        while True:
+            delay = max(chat_bucket.reserve(), self._global_bucket.reserve())
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                if operation.kind == "send":
+                    return await self.bot.send_message(chat_id=chat_id, text=operation.text, **operation.kwargs)
+                if operation.kind == "markup":
+                    return await self.bot.edit_message_reply_markup(
+                        chat_id=chat_id, message_id=operation.message_id, **operation.kwargs
+                    )
+                return await self.bot.edit_message_text(
+                    text=operation.text, chat_id=chat_id, message_id=operation.message_id, **operation.kwargs
+                )
+            except RetryAfter as e:
+                attempt += 1
+                self.retry_after_count += 1
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if hasattr(retry_after, "total_seconds") else float(retry_after)
+                if attempt > self.config.max_retries:
+                    raise
+                logger.warning(f"Flood control in chat {chat_id}: retrying in {seconds}s (attempt {attempt}).")
+                chat_bucket.pause(seconds)
@@ -0,0 +1,76 @@
+# tests/bench_history.py
+"""
+Compares the stored history format with the former JSON column.
+
+    python -m test.bench_history [turns]
+
+Reports encode/decode time, stored size and the memory of the loaded history for
+10k turns (by default), as a list of dicts from JSON and as a list of Turns.
+"""
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from bot.database.history import Turn, decode_history, encode_history
+
+
+def _sample(count: int):
+    words = "the a bot group message reply hello weather today Gemini 你好 👋 question answer".split()
+    rng = random.Random(0)
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "parts": " ".join(rng.choice(words) for _ in range(rng.randint(5, 80)))}
+        for i in range(count)
+    ]
+
+
+def _best_of(function, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _loaded_size(decode) -> int:
+    tracemalloc.start()
+    loaded = decode()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+    return size
+
+
+def main(count: int = 10_000) -> None:
+    dicts = _sample(count)
+    turns = [Turn.coerce(entry) for entry in dicts]
+    as_json = json.dumps(dicts, ensure_ascii=False).encode()
+    blob = encode_history(turns)
+    raw = encode_history(turns, compress=False)
+
+    rows = [
+        ("json", len(as_json),
+         _best_of(lambda: json.dumps(dicts, ensure_ascii=False).encode()),
+         _best_of(lambda: json.loads(as_json)),
+         _loaded_size(lambda: json.loads(as_json))),
+        ("blob", len(raw),
+         _best_of(lambda: encode_history(turns, compress=False)),
+         _best_of(lambda: decode_history(raw)),
+         _loaded_size(lambda: decode_history(raw))),
+        ("blob+zlib", len(blob),
+         _best_of(lambda: encode_history(turns)),
+         _best_of(lambda: decode_history(blob)),
+         _loaded_size(lambda: decode_history(blob))),
+    ]
+    print(f"{count} turns")
+    print(f"{'format':<10} {'stored':>10} {'encode':>10} {'decode':>10} {'in memory':>11}")
+    for name, stored, encode, decode, memory in rows:
+        print(f"{name:<10} {stored / 1024:>8.0f}KB {encode * 1000:>8.2f}ms {decode * 1000:>8.2f}ms "
+              f"{memory / 1024:>9.0f}KB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -0,0 +1,27 @@
+# tests/conftest.py
+from contextlib import contextmanager
+
+import pytest
+
+from bot.database.query_stats import count_queries
+
+
+@pytest.fixture()
+def query_budget():
+    """
+    Fails the test if the block runs more queries or commits than allowed:
+
+        with query_budget(queries=2, commits=1):
+            ...
+
+    Guards the hot paths against N+1 queries and extra refreshes creeping back in.
+    """
+    @contextmanager
+    def budget(queries: int, commits: int):
+        with count_queries() as stats:
+            yield stats
+        statements = "\n".join(stats.statements)
+        assert stats.queries <= queries, f"{stats.queries} queries, budget {queries}:\n{statements}"
+        assert stats.commits <= commits, f"{stats.commits} commits, budget {commits}:\n{statements}"
+
+    return budget
@@ -0,0 +1,88 @@
+# tests/test_admission.py
+import asyncio
+
+import pytest
+
+from bot.core.config import get_settings
+from bot.services.admission import AdmissionController, Overloaded
+from bot.services.model_router import RequestClass
+
+
+@pytest.fixture()
+def thresholds(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    app = get_settings().app
+    monkeypatch.setattr(app, "admission", app.admission.model_copy(update={
+        "shed_interjections_at": 1, "busy_reply_at": 2, "max_in_flight": 2,
+    }))
+
+
+def test_load_is_shed_in_steps(thresholds):
+    """
+    Tests that interjections go first, then mentions get a busy reply,
+    and private chats wait for a slot in order instead of being rejected.
+    """
+    async def scenario():
+        admission = AdmissionController()
+        order = []
+        release = asyncio.Event()
+
+        async def private(name):
+            async with admission.admit(RequestClass.PRIVATE):
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.ensure_future(private("first"))
+        await asyncio.sleep(0)
+        assert admission.should_shed(RequestClass.GROUP_INTERJECTION)
+        assert not admission.should_shed(RequestClass.GROUP_MENTION)
+
+        second = asyncio.ensure_future(private("second"))
+        third = asyncio.ensure_future(private("third"))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded):
+            async with admission.admit(RequestClass.GROUP_MENTION):
+                pass
+        assert admission.stats()["queued"] == 1
+
+        release.set()
+        await asyncio.gather(first, second, third)
+        return admission, order
+
+    admission, order = asyncio.run(scenario())
+    assert order == ["first", "second", "third"]
+    assert admission.stats() == {
+        "in_flight": 0, "queued": 0, "shed_interjections": 0, "busy_replies": 1, "throttled": 1,
+    }
+
+
+def test_raised_limit_admits_waiters(thresholds, monkeypatch):
+    """
+    Tests that waiters are admitted as soon as the limit is raised, not when a request finishes.
+    """
+    async def scenario():
+        admission = AdmissionController()
+        release = asyncio.Event()
+        started = []
+
+        async def private(name):
+            async with admission.admit(RequestClass.PRIVATE):
+                started.append(name)
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(private(name)) for name in ("a", "b", "c", "d")]
+        await asyncio.sleep(0)
+        assert started == ["a", "b"]
+
+        app = get_settings().app
+        monkeypatch.setattr(app, "admission", app.admission.model_copy(update={"max_in_flight": 3}))
+        assert admission.fill_free_slots() == 1
+        await asyncio.sleep(0)
+        assert started == ["a", "b", "c"] and admission.stats()["queued"] == 1
+
+        release.set()
+        await asyncio.gather(*tasks)
+        return admission
+
+    assert asyncio.run(scenario()).stats()["in_flight"] == 0
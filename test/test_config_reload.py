@@ -0,0 +1,102 @@
+# tests/test_config_reload.py
+import shutil
+
+import pytest
+
+import bot.core.config as config
+from bot.core.config_watcher import ConfigWatcher
+from bot.telegram.sender import OutboundSender
+
+
+@pytest.fixture()
+def config_files(tmp_path, monkeypatch):
+    """
+    Copies the real YAML configs to a temp dir and points the config module at them,
+    with a fresh settings object and no reload listeners.
+    """
+    app_path = tmp_path / "app_config.yml"
+    prompts_path = tmp_path / "prompts.yml"
+    shutil.copy(config.APP_CONFIG_PATH, app_path)
+    shutil.copy(config.PROMPTS_CONFIG_PATH, prompts_path)
+
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setattr(config, "APP_CONFIG_PATH", app_path)
+    monkeypatch.setattr(config, "PROMPTS_CONFIG_PATH", prompts_path)
+    monkeypatch.setattr(config, "_settings", None)
+    monkeypatch.setattr(config, "_reload_listeners", [])
+    return app_path, prompts_path
+
+
+def test_reload_swaps_settings_and_reports_changed_prompts(config_files):
+    """
+    Tests that a valid change is applied and listeners see exactly the modified prompts.
+    """
+    _, prompts_path = config_files
+    before = config.get_settings()
+    changes = []
+    config.add_reload_listener(lambda old, new: changes.append(config.changed_prompt_keys(old, new)))
+
+    text = prompts_path.read_text(encoding="utf-8")
+    prompts_path.write_text(text.replace("You are a helpful assistant.", "You are terse."), encoding="utf-8")
+
+    assert config.reload_settings() is True
+    after = config.get_settings()
+    assert after is not before
+    assert after.prompts["default"].prompt == "You are terse."
+    assert changes == [{"default"}]
+
+
+def test_invalid_config_keeps_current_settings(config_files):
+    """
+    Tests that a config failing validation is rejected and the old settings stay in place.
+    """
+    app_path, _ = config_files
+    before = config.get_settings()
+
+    text = app_path.read_text(encoding="utf-8")
+    app_path.write_text(text.replace("group_reply_probability: 0.2", "group_reply_probability: often"),
+                        encoding="utf-8")
+
+    assert config.reload_settings() is False
+    assert config.get_settings() is before
+
+
+def test_watcher_reloads_only_on_change(config_files):
+    """
+    Tests that the watcher's stat check triggers a reload only when a file changed.
+    """
+    app_path, _ = config_files
+    config.get_settings()
+    watcher = ConfigWatcher(paths=config_files, poll_interval=60)
+    assert watcher.check() is False
+
+    text = app_path.read_text(encoding="utf-8")
+    app_path.write_text(text.replace("group_reply_probability: 0.2", "group_reply_probability: 0.5"),
+                        encoding="utf-8")
+
+    assert watcher.check() is True
+    assert config.get_settings().app.telegram_bot.group_reply_probability == 0.5
+    assert watcher.check() is False
+
+
+def test_reload_reaches_built_services_and_flags_restart_only_changes(config_files):
+    """
+    Tests that a service built with a copy of its config can take the reloaded one, and that
+    changes which only apply after a restart are reported.
+    """
+    app_path, _ = config_files
+    old = config.get_settings()
+    sender = OutboundSender(bot=None, config=old.app.outbound)
+    sender._chat_bucket(-5)
+
+    text = app_path.read_text(encoding="utf-8")
+    text = text.replace("global_rate: 30", "global_rate: 10").replace("group_chat_rate: 0.33", "group_chat_rate: 0.1")
+    app_path.write_text(text.replace('url: "sqlite:///data/bot_database.db"', 'url: "sqlite:///data/other.db"'),
+                        encoding="utf-8")
+    assert config.reload_settings() is True
+    new = config.get_settings()
+
+    sender.reconfigure(new.app.outbound)
+    assert sender._global_bucket.rate == 10 and sender._chat_bucket(-5).rate == 0.1
+    assert config.restart_required_changes(old, new) == ["app.database"]
@@ -0,0 +1,122 @@
+# tests/test_context_loader.py
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import telegram
+
+from bot.database.models import Base, User
+from bot.database import crud
+from bot.services.chat_service import ChatService
+from bot.services.prompt_service import PromptService
+
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+ALICE = telegram.User(id=1, first_name="Alice", is_bot=False)
+
+
+class FakeGemini:
+    def __init__(self):
+        self.requests = []
+
+    async def generate_response_async(self, system_prompt, history, user_prompt, **kwargs):
+        self.requests.append((system_prompt, list(history), kwargs["prompt_key"]))
+        return f"reply {len(self.requests)}"
+
+
+@pytest.fixture()
+def chat_service(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield ChatService(db=db, gemini_service=FakeGemini(), prompt_service=PromptService(db=db))
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def test_context_is_loaded_once_and_saved_with_user(chat_service):
+    """
+    Tests that the first message creates the user and session in one save, and that the
+    next message reuses the cached context, including the saved history.
+    """
+    db = chat_service.db
+    asyncio.run(chat_service.handle_private_message(user_data=ALICE, text="hi"))
+    assert db.get(User, 1).first_name == "Alice"
+
+    cached = chat_service.context_loader.load(chat_id=1, user_data=ALICE)
+    assert [m["parts"] for m in cached.history] == ["hi", "reply 1"]
+
+    asyncio.run(chat_service.handle_private_message(user_data=ALICE, text="again"))
+    assert len(chat_service.gemini_service.requests[1][1]) == 2
+    assert [m["parts"] for m in crud.get_session(db=db, chat_id=1).history][-1] == "reply 2"
+
+
+def test_deleted_prompt_falls_back_to_default(chat_service):
+    """
+    Tests that a persona deleted after the context was cached is noticed, and that the
+    session is reset to the default persona with the same commit as the reply.
+    """
+    db = chat_service.db
+    prompt = chat_service.prompt_service.create_new_prompt(user_id=1, title="Pirate", text="Talk like a pirate.")
+    crud.get_or_create_session(db=db, chat_id=1)
+    crud.set_active_prompt_key_for_session(db=db, chat_id=1, prompt_key=f"db:{prompt.id}")
+
+    assert chat_service.context_loader.load(chat_id=1, user_data=ALICE).prompt_text() == "Talk like a pirate."
+    chat_service.prompt_service.delete_shared_prompt(user_id=1, prompt_id=prompt.id)
+
+    asyncio.run(chat_service.handle_private_message(user_data=ALICE, text="ahoy"))
+    assert chat_service.gemini_service.requests[0][2] == "yaml:default"
+    assert crud.get_session(db=db, chat_id=1).active_prompt_key == "yaml:default"
+
+
+def test_individual_session_uses_group_persona(chat_service):
+    """
+    Tests that a member's own session in an individual-mode group answers with the group's persona.
+    """
+    db = chat_service.db
+    chat_service.set_group_mode(-5, "individual")
+    crud.get_or_create_session(db=db, chat_id=-5)
+    crud.set_active_prompt_key_for_session(db=db, chat_id=-5, prompt_key="yaml:translator")
+
+    asyncio.run(chat_service.handle_group_message(chat_id=-5, user_data=ALICE, text="hello", is_mention=True))
+    assert chat_service.gemini_service.requests[0][2] == "yaml:translator"
+    assert crud.get_session(db=db, chat_id=-5, user_id=1).history[-1]["parts"] == "reply 1"
+    assert crud.get_session(db=db, chat_id=-5).history == []
+
+
+def test_preload_caches_recent_sessions_within_budget(chat_service, query_budget):
+    """
+    Tests that preloading caches the most recently active sessions until the history budget
+    is used up, and that messages to a preloaded session need no query to load it.
+    """
+    db = chat_service.db
+    history = [{"role": "user", "parts": "x" * 100}]
+    for chat_id in (1, 2, 3):
+        crud.get_or_create_session(db=db, chat_id=chat_id)
+        crud.update_session(db=db, chat_id=chat_id, new_history=history)
+
+    # Room for two histories: chats 3 and 2 were active last
+    assert chat_service.context_loader.preload(limit=10, max_bytes=300) == 2
+    with query_budget(queries=0, commits=0):
+        assert chat_service.context_loader.load(chat_id=3, user_data=ALICE).history == tuple(history)
+        chat_service.context_loader.load(chat_id=2, user_data=ALICE)
+    with query_budget(queries=1, commits=0) as stats:
+        chat_service.context_loader.load(chat_id=1, user_data=ALICE)
+    assert stats.queries == 1
+
+
+def test_known_users_are_bounded(chat_service, monkeypatch):
+    """
+    Tests that the users the loader remembers are capped like the contexts, dropping the
+    least recently seen first.
+    """
+    monkeypatch.setattr("bot.services.context_loader._CACHE_SIZE", 2)
+    for user_id in (1, 2, 3):
+        user = telegram.User(id=user_id, first_name=f"User {user_id}", is_bot=False)
+        asyncio.run(chat_service.handle_private_message(user_data=user, text="hi"))
+    assert list(chat_service.context_loader._users) == [2, 3]
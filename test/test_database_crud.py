@@ -4,8 +4,11 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 import telegram
 
+from sqlalchemy import inspect, text
+
 from bot.database.models import Base
 from bot.database import crud
+from bot.database.migrations import migrate_session_keys
 
 # Use an in-memory SQLite database for testing
 TEST_DATABASE_URL = "sqlite:///:memory:"
@@ -108,6 +111,7 @@ def test_session_management(db_session):
     assert session.chat_id == chat_id
     assert session.history == []
     assert session.messages_since_last_reply == 0
+    assert session.active_prompt_key == "yaml:default"
 
     # 2. Test session retrieval
     session_retrieved = crud.get_or_create_session(db=db_session, chat_id=chat_id)
@@ -119,4 +123,99 @@ def test_session_management(db_session):
 
     session_updated = crud.get_session(db=db_session, chat_id=chat_id)
     assert session_updated.history[0]["parts"] == "Hello"
-    assert session_updated.messages_since_last_reply == 1
\ No newline at end of file
+    assert session_updated.messages_since_last_reply == 1
+
+def test_append_to_session_histories(db_session):
+    """
+    Tests that buffered messages are appended to existing and new sessions in one batch.
+    """
+    crud.get_or_create_session(db=db_session, chat_id=1)
+    crud.update_session(db=db_session, chat_id=1, new_history=[{"role": "user", "parts": "A: hi"}],
+                        messages_since_reply=2)
+
+    crud.append_to_session_histories(db=db_session, pending={
+        1: [{"role": "user", "parts": "B: hello"}],
+        2: [{"role": "user", "parts": "C: hey"}, {"role": "user", "parts": "D: yo"}],
+    })
+
+    existing = crud.get_session(db=db_session, chat_id=1)
+    assert [m["parts"] for m in existing.history] == ["A: hi", "B: hello"]
+    assert existing.messages_since_last_reply == 3
+
+    created = crud.get_session(db=db_session, chat_id=2)
+    assert len(created.history) == 2
+    assert created.messages_since_last_reply == 2
+    assert created.active_prompt_key == "yaml:default"
+
+
+def test_search_prompts_follows_changes(db_session):
+    """
+    Tests that the full-text index ranks title matches first and tracks updates and deletes.
+    """
+    user = crud.get_or_create_user(db=db_session, user_data=telegram.User(id=777, first_name="Searcher", is_bot=False))
+    in_text = crud.create_user_prompt(db=db_session, user_id=user.id, title="Storyteller",
+                                      text="You narrate pirate adventures.")
+    in_title = crud.create_user_prompt(db=db_session, user_id=user.id, title="Pirate Captain",
+                                       text="You speak like an old sailor.")
+    crud.create_user_prompt(db=db_session, user_id=user.id, title="Chef", text="You cook.")
+
+    # Prefix matching, title matches ranked first
+    assert [p.id for p in crud.search_prompts(db=db_session, query="pira")] == [in_title.id, in_text.id]
+
+    in_title.title = "Navigator"
+    db_session.commit()
+    assert [p.id for p in crud.search_prompts(db=db_session, query="navig")] == [in_title.id]
+
+    crud.delete_prompt(db=db_session, user_id=user.id, prompt_id=in_text.id)
+    assert crud.search_prompts(db=db_session, query="pirate") == []
+    assert crud.search_prompts(db=db_session, query="!!!") == []
+
+
+def test_individual_sessions_are_keyed_by_user(db_session):
+    """
+    Tests that a group's shared session and its members' own sessions are independent.
+    """
+    group_id = -100
+    assert crud.get_group_mode(db=db_session, chat_id=group_id) == "shared"
+    crud.set_group_mode(db=db_session, chat_id=group_id, mode="individual")
+    assert crud.get_group_mode(db=db_session, chat_id=group_id) == "individual"
+
+    shared = crud.get_or_create_session(db=db_session, chat_id=group_id)
+    alice = crud.get_or_create_session(db=db_session, chat_id=group_id, user_id=1)
+    assert alice.id != shared.id
+    crud.update_session(db=db_session, chat_id=group_id, user_id=1, new_history=[{"role": "user", "parts": "hi"}])
+    crud.reset_session(db=db_session, chat_id=group_id)
+
+    assert crud.get_session(db=db_session, chat_id=group_id, user_id=1).history == [{"role": "user", "parts": "hi"}]
+    assert crud.get_session(db=db_session, chat_id=group_id, user_id=2) is None
+
+
+def test_migration_keeps_existing_sessions():
+    """
+    Tests that a database with the old unique chat_id key is upgraded in place,
+    with its sessions becoming shared sessions.
+    """
+    legacy = create_engine("sqlite:///:memory:")
+    with legacy.begin() as connection:
+        connection.execute(text(
+            "CREATE TABLE chat_session_states (id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, "
+            "history JSON NOT NULL, active_prompt_key VARCHAR NOT NULL, messages_since_last_reply INTEGER NOT NULL, "
+            "created_at DATETIME, last_interaction_at DATETIME)"
+        ))
+        connection.execute(text("CREATE UNIQUE INDEX ix_chat_session_states_chat_id ON chat_session_states (chat_id)"))
+        connection.execute(text(
+            "INSERT INTO chat_session_states (chat_id, history, active_prompt_key, messages_since_last_reply) "
+            "VALUES (-100, '[{\"role\": \"user\", \"parts\": \"old\"}]', 'yaml:default', 0)"
+        ))
+    Base.metadata.create_all(bind=legacy)  # Runs the migration after creating the missing tables
+    with legacy.begin() as connection:
+        migrate_session_keys(connection)  # A second run changes nothing
+        indexes = {index["name"] for index in inspect(connection).get_indexes("chat_session_states")}
+    assert indexes == {"ix_chat_session_states_chat_user"}
+
+    db = sessionmaker(bind=legacy)()
+    try:
+        assert crud.get_session(db=db, chat_id=-100).history[0]["parts"] == "old"
+        crud.get_or_create_session(db=db, chat_id=-100, user_id=5)
+    finally:
+        db.close()
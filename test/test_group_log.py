@@ -0,0 +1,94 @@
+# tests/test_group_log.py
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import telegram
+
+from bot.database import crud
+from bot.database.models import Base
+from bot.services.chat_service import ChatService
+from bot.services.prompt_service import PromptService
+
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+ALICE = telegram.User(id=1, first_name="Alice", is_bot=False)
+BOB = telegram.User(id=2, first_name="Bob", is_bot=False)
+
+
+class SlowGemini:
+    """Answers once `release` is set, or fails if `fail` is set."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.fail = False
+
+    async def generate_response_async(self, system_prompt, history, user_prompt, **kwargs):
+        self.started.set()
+        await self.release.wait()
+        return None if self.fail else "reply"
+
+
+@pytest.fixture()
+def chat_service(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield ChatService(db=db, gemini_service=SlowGemini(), prompt_service=PromptService(db=db))
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def history_texts(chat_service):
+    session = crud.get_session(db=chat_service.db, chat_id=-5)
+    return [turn.parts for turn in session.history]
+
+
+def test_flush_during_generation_keeps_every_message(chat_service):
+    """
+    Tests that messages buffered before and during a reply all end up in the history,
+    even when a flush runs while the reply is being generated.
+    """
+    gemini = chat_service.gemini_service
+
+    async def scenario():
+        chat_service.log_group_message(chat_id=-5, user_data=BOB, text="before")
+        reply = asyncio.create_task(chat_service.handle_group_message(
+            chat_id=-5, user_data=ALICE, text="question", is_mention=True))
+        await gemini.started.wait()
+        chat_service.log_group_message(chat_id=-5, user_data=BOB, text="during")
+        assert chat_service.flush_group_log() == 0  # The chat is held back while the reply runs
+        gemini.release.set()
+        assert await reply == "reply"
+        assert chat_service.flush_group_log() == 1
+
+    asyncio.run(scenario())
+    assert history_texts(chat_service) == ["Bob: before", "Alice: question", "reply", "Bob: during"]
+    session = crud.get_session(db=chat_service.db, chat_id=-5)
+    assert session.messages_since_last_reply == 1
+
+
+def test_failed_reply_puts_taken_messages_back(chat_service):
+    """
+    Tests that the messages a reply took are buffered again, in order, if it isn't saved.
+    """
+    gemini = chat_service.gemini_service
+    gemini.fail = True
+
+    async def scenario():
+        chat_service.log_group_message(chat_id=-5, user_data=BOB, text="first")
+        reply = asyncio.create_task(chat_service.handle_group_message(
+            chat_id=-5, user_data=ALICE, text="question", is_mention=True))
+        await gemini.started.wait()
+        chat_service.log_group_message(chat_id=-5, user_data=BOB, text="second")
+        gemini.release.set()
+        assert await reply is None
+
+    asyncio.run(scenario())
+    assert [turn.parts for turn in chat_service.group_log.take(-5)] == ["Bob: first", "Bob: second"]
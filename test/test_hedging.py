@@ -0,0 +1,130 @@
+# tests/test_hedging.py
+import asyncio
+import time
+from types import SimpleNamespace
+
+from bot.core.config import HedgingConfig, Settings, load_yaml_configs, use_settings
+from bot.services.gemini_service import GeminiService
+from bot.services.hedging import Hedger
+
+
+def _hedger(**config) -> Hedger:
+    hedger = Hedger(HedgingConfig(**{"enabled": True, "min_samples": 3, "min_delay_seconds": 0.01, **config}))
+    for latency in (0.01, 0.02, 0.03):
+        hedger.record_latency(latency)
+    return hedger
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    """
+    Tests that a slow primary triggers a hedge, the hedge's answer wins and the primary is cancelled.
+    """
+    hedger = _hedger(max_extra_fraction=1.0)
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return "primary"
+
+    async def fast():
+        return "hedge"
+
+    assert asyncio.run(hedger.run(slow, fast)) == "hedge"
+    assert cancelled == [True]
+    assert hedger.stats()["hedge_wins"] == 1
+    # The primary's time so far still counts towards the percentile
+    assert len(hedger._latencies) == 4 and max(hedger._latencies) >= 0.03
+
+
+def test_cancelled_caller_cancels_the_primary():
+    """
+    Tests that cancelling the caller while it waits to hedge cancels the request as well.
+    """
+    hedger = _hedger(max_extra_fraction=1.0, min_delay_seconds=5)
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def hedge():
+        return "hedge"
+
+    async def scenario():
+        caller = asyncio.ensure_future(hedger.run(slow, hedge))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+        # Checked before asyncio.run() cancels leftover tasks itself
+        assert cancelled == [True]
+
+    asyncio.run(scenario())
+
+
+def test_budget_limits_hedges():
+    """
+    Tests that no hedge is sent once the budget is used up, and that fast requests are never hedged.
+    """
+    hedger = _hedger(max_extra_fraction=0.0)
+    hedges = []
+
+    async def slow():
+        await asyncio.sleep(0.1)
+        return "primary"
+
+    async def hedge():
+        hedges.append(True)
+        return "hedge"
+
+    async def fast():
+        return "fast"
+
+    assert asyncio.run(hedger.run(slow, hedge)) == "primary"
+    assert asyncio.run(_hedger(max_extra_fraction=1.0).run(fast, hedge)) == "fast"
+    assert hedges == []
+    assert hedger.stats()["hedged"] == 0
+
+
+class FakeClient:
+    """A google-genai client stand-in that answers with its own key after `latency` seconds."""
+
+    def __init__(self, api_key: str, latency: float):
+        self.api_key = api_key
+        self.latency = latency
+        self.requests = 0
+        self.aio = SimpleNamespace(models=self)
+
+    async def generate_content(self, model, contents, config=None):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return self.api_key
+
+
+def test_hedge_avoids_the_primary_key():
+    """
+    Tests that the hedge goes out on another key, even when the primary's key is the least loaded.
+    """
+    clients = {"slow": FakeClient("slow", latency=5), "busy": FakeClient("busy", latency=0)}
+    settings = Settings(telegram_bot_token="1:x", gemini_api_key="slow", gemini_api_keys="busy", **load_yaml_configs())
+    previous = use_settings(settings)
+    try:
+        service = GeminiService(client_factory=clients.__getitem__)
+    finally:
+        use_settings(previous)
+    service.hedger = _hedger(max_extra_fraction=1.0)
+    # The other key served more requests in the last minute than the slow one will have
+    busy_key = service.key_pool.keys[1]
+    for _ in range(3):
+        busy_key.begin(time.monotonic())
+    busy_key.in_flight = 0
+
+    assert asyncio.run(service._generate(model="m", contents=[])) == "busy"
+    assert clients["slow"].requests == 1 and clients["busy"].requests == 1
@@ -0,0 +1,45 @@
+# tests/test_history.py
+import json
+import sys
+
+import pytest
+
+from bot.database.history import COMPRESS_MIN_BYTES, HistoryType, Turn, decode_history, encode_history
+
+
+def test_round_trip_keeps_roles_and_unicode_text():
+    turns = [
+        Turn("user", "Alice: hi 👋"),
+        Turn("assistant", "Привет! 你好"),
+        Turn("model", ""),
+        Turn("tool", "an unknown role is stored by name"),
+    ]
+    assert decode_history(encode_history(turns)) == turns
+
+
+def test_long_histories_are_compressed_short_ones_are_not():
+    short = [Turn("user", "hello")]
+    assert encode_history(short)[3] == 0
+
+    long = [Turn("user" if i % 2 else "assistant", f"message number {i} " * 4) for i in range(200)]
+    blob = encode_history(long)
+    assert blob[3] == 1
+    assert len(blob) < len(encode_history(long, compress=False)) >= COMPRESS_MIN_BYTES
+    assert decode_history(blob) == long
+
+
+def test_turns_still_behave_like_the_old_dicts():
+    turn = Turn.coerce({"role": "user", "parts": "hi"})
+    assert turn == {"role": "user", "parts": "hi"}
+    assert turn["parts"] == "hi" and turn.get("missing") is None
+    with pytest.raises(KeyError):
+        turn["missing"]
+    assert sys.getsizeof(turn) < sys.getsizeof(turn.to_dict())
+
+
+def test_column_reads_legacy_json_rows():
+    column = HistoryType()
+    legacy = json.dumps([{"role": "user", "parts": "old"}, {"role": "assistant", "parts": "row"}])
+    assert column.process_result_value(legacy, None) == [Turn("user", "old"), Turn("assistant", "row")]
+    blob = column.process_bind_param([{"role": "user", "parts": "new"}], None)
+    assert column.process_result_value(blob, None) == [Turn("user", "new")]
@@ -0,0 +1,67 @@
+# tests/test_http_transport.py
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from bot.core import config, http_transport
+from bot.core.http_transport import TransportStats, gemini_client_args, resolve_proxy
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def settings(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setenv("HTTPS_PROXY", "")
+    monkeypatch.setenv("HTTP_PROXY", "")
+    monkeypatch.setattr(config, "_settings", None)
+    yield config.get_settings()
+    monkeypatch.setattr(config, "_settings", None)
+
+
+def test_requests_reuse_the_pooled_connection(settings, monkeypatch):
+    """
+    Tests that sequential requests through the configured client share one kept-alive
+    connection, and that the stats count the requests and the single connection.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stats = TransportStats()
+    monkeypatch.setitem(http_transport.transport_stats, "gemini", stats)
+
+    async def scenario():
+        async with httpx.AsyncClient(**gemini_client_args(settings)) as client:
+            for _ in range(3):
+                assert (await client.get(f"http://127.0.0.1:{server.server_port}/")).text == "ok"
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        server.shutdown()
+    assert stats.stats() == {"requests": 3, "connections": 1, "reuse_rate": pytest.approx(2 / 3)}
+
+
+def test_proxy_falls_back_to_environment(settings, monkeypatch):
+    """
+    Tests that http.proxy takes precedence over HTTPS_PROXY, which is used when it isn't set.
+    """
+    assert resolve_proxy(settings) is None
+    monkeypatch.setattr(settings, "https_proxy", "http://env-proxy:3128")
+    assert resolve_proxy(settings) == "http://env-proxy:3128"
+    monkeypatch.setattr(settings.app.http, "proxy", "socks5://localhost:7890")
+    assert resolve_proxy(settings) == "socks5://localhost:7890"
@@ -0,0 +1,79 @@
+# tests/test_inflight.py
+import asyncio
+
+from bot.services.inflight import InFlightGenerations
+
+
+def test_newer_generation_supersedes_older():
+    """
+    Tests that a superseding generation cancels the running one, which then returns None
+    without running its code after the await.
+    """
+    async def scenario():
+        inflight = InFlightGenerations()
+        saved = []
+
+        async def generate(reply, delay):
+            await asyncio.sleep(delay)
+            saved.append(reply)
+            return reply
+
+        first = asyncio.ensure_future(inflight.run((1, 0), lambda: generate("old", 1), supersede=True))
+        await asyncio.sleep(0)
+        second = await inflight.run((1, 0), lambda: generate("new", 0), supersede=True)
+        return await first, second, saved, inflight
+
+    first, second, saved, inflight = asyncio.run(scenario())
+    assert (first, second) == (None, "new")
+    assert saved == ["new"]
+    assert inflight.cancelled == 1 and (1, 0) not in inflight
+
+
+def test_cancel_drops_running_and_waiting_generations():
+    """
+    Tests that generations of one chat run one at a time, that cancel() drops the running and
+    the waiting ones, and that other chats are unaffected.
+    """
+    async def scenario():
+        inflight = InFlightGenerations()
+
+        async def generate(reply):
+            await asyncio.sleep(0.05)
+            return reply
+
+        tasks = [
+            asyncio.ensure_future(inflight.run((1, 0), lambda: generate("a"))),
+            asyncio.ensure_future(inflight.run((1, 0), lambda: generate("b"))),
+            asyncio.ensure_future(inflight.run((2, 0), lambda: generate("c"))),
+        ]
+        await asyncio.sleep(0.01)
+        assert inflight.cancel(1, reason="clear")
+        results = await asyncio.gather(*tasks)
+        # The next generation after the cancel runs normally
+        results.append(await inflight.run((1, 0), lambda: generate("d")))
+        return results
+
+    assert asyncio.run(scenario()) == [None, None, "c", "d"]
+
+
+def test_draining_lets_short_generations_finish_and_cancels_the_rest():
+    """
+    Tests that on shutdown a generation finishing within the deadline still completes,
+    while a slower one is cancelled at the deadline and later ones don't start.
+    """
+    async def scenario():
+        inflight = InFlightGenerations()
+
+        async def generate(reply, delay):
+            await asyncio.sleep(delay)
+            return reply
+
+        fast = asyncio.ensure_future(inflight.run((1, 0), lambda: generate("fast", 0.01)))
+        slow = asyncio.ensure_future(inflight.run((2, 0), lambda: generate("slow", 5)))
+        await asyncio.sleep(0)
+        inflight.start_draining(timeout=0.05)
+        results = await asyncio.gather(fast, slow)
+        results.append(await inflight.run((3, 0), lambda: generate("late", 0)))
+        return results
+
+    assert asyncio.run(scenario()) == ["fast", None, None]
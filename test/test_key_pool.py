@@ -0,0 +1,51 @@
+# tests/test_key_pool.py
+from bot.core.config import KeyPoolConfig, Settings, load_yaml_configs
+from bot.services.key_pool import KeyPool
+
+
+def _pool(**config) -> KeyPool:
+    return KeyPool(keys=["key-aaaa", "key-bbbb", "key-cccc"], config=KeyPoolConfig(**config),
+                   client_factory=lambda api_key: api_key)
+
+
+def test_least_loaded_spreads_requests():
+    """
+    Tests that concurrent requests land on different keys and that the per-minute limit is respected.
+    """
+    pool = _pool(requests_per_minute=1)
+    leases = []
+    for _ in range(3):
+        leases.append(pool.lease(pool.acquire()))
+        leases[-1].__enter__()
+    assert [key["in_flight"] for key in pool.snapshot()] == [1, 1, 1]
+    for lease in leases:
+        lease.__exit__(None, None, None)
+    assert [key["last_minute"] for key in pool.snapshot()] == [1, 1, 1]
+    assert [key["in_flight"] for key in pool.snapshot()] == [0, 0, 0]
+
+
+def test_rate_limited_key_cools_down():
+    """
+    Tests that a 429 takes a key out of rotation, with a doubling cooldown, and that metrics hide the key.
+    """
+    pool = _pool(strategy="round_robin", cooldown_seconds=10, max_cooldown_seconds=15)
+    first = pool.acquire()
+    pool.report_error(first, rate_limited=True)
+    assert [pool.acquire().index for _ in range(4)] == [1, 2, 1, 2]
+
+    pool.report_error(first, rate_limited=True)
+    snapshot = pool.snapshot()[0]
+    assert snapshot["key"] == "key0(…aaaa)"
+    assert snapshot["rate_limited"] == 2 and snapshot["cooldown_seconds"] == 15
+
+    # With every key cooling down, the one that recovers first is still used
+    for key in pool.keys[1:]:
+        pool.report_error(key, rate_limited=True)
+    assert pool.acquire().index == 1
+    assert pool.acquire(exclude={0, 1, 2}) is None
+
+
+def test_api_keys_are_combined():
+    data = load_yaml_configs()
+    settings = Settings(telegram_bot_token="1:x", gemini_api_key="a", gemini_api_keys="b, a,c,", **data)
+    assert settings.all_gemini_api_keys() == ["a", "b", "c"]
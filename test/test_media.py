@@ -0,0 +1,117 @@
+# tests/test_media.py
+import asyncio
+import os
+
+import pytest
+
+import telegram
+
+from bot.services.chat_service import ChatService
+from bot.services.media import MediaCache, MediaTooLarge, UnsupportedMedia
+from bot.telegram.media import Attachment, download_attachment
+
+
+class FakeFile:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def download_as_bytearray(self):
+        return bytearray(self.data)
+
+
+class FakeBot:
+    """Serves one file for any file_id and counts the getFile calls."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.downloads = 0
+
+    async def get_file(self, file_id):
+        self.downloads += 1
+        return FakeFile(self.data)
+
+
+def test_cache_evicts_least_recently_used_and_survives_restart(tmp_path):
+    """
+    Tests that the cache stays under its size limit by evicting the least recently used
+    file, and that a new cache over the same directory keeps that order.
+    """
+    cache = MediaCache(directory=str(tmp_path), max_bytes=250)
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+    os.utime(tmp_path / "a", (1, 1))
+    os.utime(tmp_path / "b", (2, 2))
+    assert cache.get("a") == b"a" * 100  # "b" is now the least recently used
+    cache.put("c", b"c" * 100)
+
+    assert cache.get("b") is None
+    restarted = MediaCache(directory=str(tmp_path), max_bytes=150)
+    assert restarted.get("a") is None and restarted.get("c") == b"c" * 100
+
+
+def test_resent_media_is_downloaded_once(tmp_path):
+    """
+    Tests that a file sent again (another file_id, same file_unique_id) comes from the cache,
+    and that files over the limit are refused without downloading them.
+    """
+    bot = FakeBot(b"\xff\xd8jpeg")
+    cache = MediaCache(directory=str(tmp_path), max_bytes=1000)
+    first = Attachment("photo", "file-1", "unique", 6, "image/jpeg")
+    forwarded = Attachment("photo", "file-2", "unique", 6, "image/jpeg")
+
+    media = asyncio.run(download_attachment(bot, first, cache, max_bytes=100))
+    again = asyncio.run(download_attachment(bot, forwarded, cache, max_bytes=100))
+    assert media == again and media.data == b"\xff\xd8jpeg" and media.mime_type == "image/jpeg"
+    assert bot.downloads == 1
+
+    with pytest.raises(MediaTooLarge):
+        asyncio.run(download_attachment(bot, Attachment("video", "v", "big", 5000, "video/mp4"), cache, max_bytes=100))
+    assert bot.downloads == 1
+
+
+def test_unsupported_types_are_refused_without_downloading(tmp_path):
+    """
+    Tests that files Gemini can't read are refused before the download.
+    """
+    bot = FakeBot(b"PK\x03\x04")
+    archive = Attachment("document", "z", "zip", 4, "application/zip")
+    with pytest.raises(UnsupportedMedia):
+        asyncio.run(download_attachment(bot, archive, None, max_bytes=100, mime_types=["application/pdf"]))
+    assert bot.downloads == 0
+
+
+class RejectAll:
+    def check(self, chat_id, user_id):
+        return "Slow down"
+
+
+def test_rate_limited_messages_are_not_downloaded(monkeypatch):
+    """
+    Tests that the media of a rate-limited message is never downloaded and no "typing..."
+    is shown for it, while an admitted message gets both, the typing action first.
+    """
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    chat_service = ChatService(db=None, gemini_service=None, prompt_service=None, rate_limiter=RejectAll())
+    calls = []
+
+    async def load_media():
+        calls.append("download")
+        return []
+
+    async def show_typing():
+        calls.append("typing")
+
+    user = telegram.User(id=1, first_name="Alice", is_bot=False)
+    assert asyncio.run(chat_service.handle_private_message(
+        user, "look", load_media=load_media, on_admitted=show_typing)) == "Slow down"
+    assert calls == []
+
+    async def generate(**kwargs):
+        return "reply"
+
+    chat_service.rate_limiter = None
+    monkeypatch.setattr(chat_service, "_generate_private_reply", generate)
+    assert asyncio.run(chat_service.handle_private_message(
+        user, "look", load_media=load_media, on_admitted=show_typing)) == "reply"
+    assert calls == ["typing", "download"]
@@ -0,0 +1,49 @@
+# tests/test_model_router.py
+import pytest
+from pydantic import ValidationError
+
+from bot.core.config import GenerationConfig, ModelRoute, PromptConfig, Settings, load_yaml_configs
+from bot.services.model_router import RequestClass, choose_model
+
+
+def _settings(**gemini) -> Settings:
+    data = load_yaml_configs()
+    data["app"]["gemini"] = {
+        "model_name": "base",
+        "generation_config": {"temperature": 0.7, "max_output_tokens": 2048},
+        **gemini,
+    }
+    return Settings(telegram_bot_token="123:test", gemini_api_key="test", **data)
+
+
+def test_routes_are_applied_in_order():
+    """
+    Tests that the request class, the history size and the persona each override the previous choice.
+    """
+    settings = _settings(
+        routes={"group_interjection": {"model_name": "lite", "generation_config": {"max_output_tokens": 256}}},
+        long_context_messages=10,
+        long_context={"model_name": "long"},
+    )
+    settings.prompts["terse"] = PromptConfig(
+        prompt="Be terse.", model=ModelRoute(generation_config=GenerationConfig(temperature=0.1))
+    )
+
+    assert choose_model(RequestClass.PRIVATE, settings=settings) == ("base", {"temperature": 0.7, "max_output_tokens": 2048})
+    assert choose_model(RequestClass.GROUP_INTERJECTION, history_size=3, settings=settings) == (
+        "lite", {"temperature": 0.7, "max_output_tokens": 256}
+    )
+    assert choose_model(RequestClass.GROUP_INTERJECTION, history_size=10, settings=settings).model_name == "long"
+    assert choose_model(RequestClass.PRIVATE, prompt_key="yaml:terse", settings=settings) == (
+        "base", {"temperature": 0.1, "max_output_tokens": 2048}
+    )
+    # Shared (database) prompts have no overrides
+    assert choose_model(RequestClass.PRIVATE, prompt_key="db:1", settings=settings).model_name == "base"
+
+
+def test_unknown_route_is_rejected():
+    """
+    Tests that a misspelt request class in `routes` fails validation instead of being ignored.
+    """
+    with pytest.raises(ValidationError):
+        _settings(routes={"interjection": {"model_name": "lite"}})
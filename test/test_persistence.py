@@ -0,0 +1,65 @@
+# tests/test_persistence.py
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.database.models import Base
+from bot.telegram.persistence import SqlPersistence
+
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture()
+def make_persistence():
+    yield lambda: SqlPersistence(session_factory=TestingSessionLocal)
+    Base.metadata.drop_all(bind=engine)
+
+
+def test_state_survives_a_restart(make_persistence):
+    """
+    Tests that user data, chat data and conversation states written by one persistence
+    are loaded by the next one, and that ended conversations are removed.
+    """
+    async def first_run():
+        persistence = make_persistence()
+        await persistence.get_user_data()
+        await persistence.update_user_data(1, {"draft": "Title: Pirate"})
+        await persistence.update_chat_data(-5, {"muted": True})
+        await persistence.update_conversation("add_prompt", (1, 1), 1)
+        await persistence.update_conversation("add_prompt", (2, 2), 1)
+        await asyncio.sleep(0.01)
+        await persistence.update_conversation("add_prompt", (2, 2), None)
+        await persistence.flush()
+
+    async def second_run():
+        persistence = make_persistence()
+        return (await persistence.get_user_data(), await persistence.get_chat_data(),
+                await persistence.get_conversations("add_prompt"))
+
+    asyncio.run(first_run())
+    user_data, chat_data, conversations = asyncio.run(second_run())
+    assert user_data[1] == {"draft": "Title: Pirate"} and user_data[2] == {}
+    assert chat_data[-5] == {"muted": True}
+    assert conversations == {(1, 1): 1}
+
+
+def test_updates_are_batched_and_unchanged_data_is_skipped(make_persistence, query_budget):
+    """
+    Tests that the updates of one persistence run are written with a single commit, and
+    that handing over unchanged data writes nothing.
+    """
+    persistence = make_persistence()
+
+    async def run(users):
+        await asyncio.gather(*(persistence.update_user_data(user_id, data) for user_id, data in users.items()))
+        await asyncio.sleep(0.01)
+
+    asyncio.run(persistence.get_user_data())
+    with query_budget(queries=1, commits=1):
+        asyncio.run(run({user_id: {"n": user_id} for user_id in range(1, 51)}))
+    with query_budget(queries=0, commits=0):
+        asyncio.run(run({user_id: {"n": user_id} for user_id in range(1, 51)}))
+    assert persistence.writes == 1
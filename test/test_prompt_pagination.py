@@ -0,0 +1,169 @@
+# tests/test_prompt_pagination.py
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import telegram
+
+from bot.core.config import PromptConfig, get_settings, use_settings
+from bot.database.models import Base
+from bot.database import crud
+from bot.services.prompt_service import PromptService
+from bot.telegram import callback_data, keyboards
+
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+PAGE_SIZE = 4
+DB_PROMPTS = 11
+
+
+@pytest.fixture()
+def prompt_service(monkeypatch):
+    """
+    A PromptService over an in-memory database holding DB_PROMPTS shared prompts.
+    """
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    user = crud.get_or_create_user(db=db, user_data=telegram.User(id=1, first_name="Owner", is_bot=False))
+    for i in range(DB_PROMPTS):
+        crud.create_user_prompt(db=db, user_id=user.id, title=f"Prompt {i}", text=f"Text {i}")
+    try:
+        yield PromptService(db=db)
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def _expected_keys(service):
+    yaml_keys = [f"yaml:{name}" for name in get_settings().prompts]
+    db_keys = [f"db:{prompt.id}" for prompt in crud.get_all_db_prompts(db=service.db)]
+    return yaml_keys + db_keys
+
+
+def test_walk_forward_and_back(prompt_service):
+    """
+    Tests that following the next cursors visits every prompt once, in order,
+    and that the prev cursors lead back through the same pages.
+    """
+    pages = [prompt_service.get_prompt_page(page_size=PAGE_SIZE)]
+    while pages[-1].next_cursor:
+        pages.append(prompt_service.get_prompt_page(after=pages[-1].next_cursor, page_size=PAGE_SIZE))
+
+    seen = [prompt["key"] for page in pages for prompt in page.prompts]
+    assert seen == _expected_keys(prompt_service)
+    assert pages[0].prev_cursor is None
+    assert all(len(page.prompts) == PAGE_SIZE for page in pages[:-1])
+
+    back = [pages[-1]]
+    while back[-1].prev_cursor:
+        back.append(prompt_service.get_prompt_page(before=back[-1].prev_cursor, page_size=PAGE_SIZE))
+    assert [page.prompts for page in reversed(back)] == [page.prompts for page in pages]
+
+
+def test_pages_are_cached_until_catalogue_changes(prompt_service):
+    """
+    Tests that a page is served from cache and refreshed after a prompt is added.
+    """
+    first = prompt_service.get_prompt_page(page_size=PAGE_SIZE)
+    assert prompt_service.get_prompt_page(page_size=PAGE_SIZE) is first
+
+    prompt_service.create_new_prompt(user_id=1, title="New", text="New text")
+    assert prompt_service.get_prompt_page(page_size=PAGE_SIZE) is not first
+
+
+def test_bad_cursors_show_the_first_page(prompt_service):
+    """
+    Tests that malformed or unknown cursors from callback data lead to the first page.
+    """
+    first = prompt_service.get_prompt_page(page_size=PAGE_SIZE)
+    for cursor in ("dabc", "y5", "x", ""):
+        assert prompt_service.get_prompt_page(before=cursor, page_size=PAGE_SIZE).prompts == first.prompts
+        if cursor:
+            assert prompt_service.get_prompt_page(after=cursor, page_size=PAGE_SIZE).prompts == first.prompts
+
+
+def test_yaml_cursors_survive_a_reload(prompt_service):
+    """
+    Tests that a YAML cursor still points at the same prompt after prompts.yml gains an entry before it.
+    """
+    settings = get_settings()
+    cursor = prompt_service.get_prompt_page(page_size=1).next_cursor
+    following = prompt_service.get_prompt_page(after=cursor, page_size=1).prompts
+
+    prompts = {"added": PromptConfig(title="Added", prompt="New"), **settings.prompts}
+    previous = use_settings(settings.model_copy(update={"prompts": prompts}))
+    try:
+        prompt_service.invalidate_catalogue()
+        assert prompt_service.get_prompt_page(after=cursor, page_size=1).prompts == following
+    finally:
+        use_settings(previous)
+
+
+def test_callback_data_is_compact(prompt_service):
+    """
+    Tests that every button of every page stays within Telegram's 64-byte limit
+    and that prompt tokens round-trip, including long YAML names.
+    """
+    page = prompt_service.get_prompt_page(page_size=PAGE_SIZE)
+    while True:
+        markup = keyboards.create_prompt_list_keyboard(page=page, active_key="yaml:default")
+        for row in markup.inline_keyboard:
+            for button in row:
+                assert len(button.callback_data.encode("utf-8")) <= callback_data.MAX_CALLBACK_BYTES
+        if not page.next_cursor:
+            break
+        page = prompt_service.get_prompt_page(after=page.next_cursor, page_size=PAGE_SIZE)
+
+    long_name = "a_very_long_persona_name_that_would_not_fit_into_callback_data"
+    for key in ("db:123456789", "yaml:default", f"yaml:{long_name}"):
+        token = callback_data.encode_prompt_key(key)
+        callback_data.encode(callback_data.SELECT_PROMPT, token)
+        assert callback_data.decode_prompt_key(token, ["default", long_name]) == key
+
+
+def test_mark_active_prompt_moves_checkmark(prompt_service):
+    """
+    Tests that re-marking a rendered page moves the ✅ without changing anything else.
+    """
+    page = prompt_service.get_prompt_page(page_size=PAGE_SIZE)
+    markup = keyboards.create_prompt_list_keyboard(page=page, active_key="yaml:default")
+    new_key = page.prompts[1]["key"]
+
+    updated = keyboards.mark_active_prompt(markup, new_key)
+    expected = keyboards.create_prompt_list_keyboard(page=page, active_key=new_key)
+    assert updated.to_dict() == expected.to_dict()
+
+
+def test_search_results_are_cached_until_catalogue_changes(prompt_service):
+    """
+    Tests that search covers YAML and shared prompts and is cached per query.
+    """
+    results = prompt_service.search_prompts("prompt 1")
+    assert {r.prompt["key"] for r in results} >= {"db:2"}  # "Prompt 1" is the second row
+    assert prompt_service.search_prompts("Prompt  1") is results
+
+    translator = prompt_service.search_prompts("translat")
+    assert translator[0].prompt["key"] == "yaml:translator"
+
+    prompt_service.create_new_prompt(user_id=1, title="Prompt 100", text="Another")
+    assert prompt_service.search_prompts("prompt 1") is not results
+
+
+def test_longer_queries_are_filtered_from_a_cached_prefix(prompt_service, query_budget):
+    """
+    Tests that typing on from a query whose results weren't cut off needs no new search,
+    and finds the same prompts a fresh search would.
+    """
+    assert len(prompt_service.search_prompts("pro")) < 20
+    with query_budget(queries=0, commits=0):
+        typed = prompt_service.search_prompts("prompt 1")
+    fresh = PromptService(db=prompt_service.db).search_prompts("prompt 1")
+    assert typed and {r.prompt["key"] for r in typed} == {r.prompt["key"] for r in fresh}
+
+    # A prefix whose results filled the limit may be missing matches, so it isn't used
+    prompt_service.search_prompts("p", limit=3)
+    with query_budget(queries=1, commits=0) as stats:
+        prompt_service.search_prompts("pr", limit=3)
+    assert stats.queries == 1
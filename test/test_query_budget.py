@@ -0,0 +1,88 @@
+# tests/test_query_budget.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import telegram
+
+from bot.database.models import Base
+from bot.services.chat_service import ChatService
+from bot.services.prompt_service import PromptService
+from bot.telegram.handlers import callbacks
+
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+ALICE = telegram.User(id=1, first_name="Alice", is_bot=False)
+BOB = telegram.User(id=2, first_name="Bob", is_bot=False)
+
+
+class FakeGemini:
+    async def generate_response_async(self, system_prompt, history, user_prompt, **kwargs):
+        return "reply"
+
+
+@pytest.fixture()
+def chat_service(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield ChatService(db=db, gemini_service=FakeGemini(), prompt_service=PromptService(db=db))
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def test_private_message_query_budget(chat_service, query_budget):
+    """
+    Tests that a private message loads its context with one query and saves it with one commit,
+    and that the next message in the conversation only writes.
+    """
+    with query_budget(queries=3, commits=1):
+        asyncio.run(chat_service.handle_private_message(user_data=ALICE, text="hi"))
+    with query_budget(queries=1, commits=1):
+        asyncio.run(chat_service.handle_private_message(user_data=ALICE, text="again"))
+
+
+def test_group_message_query_budget(chat_service, query_budget):
+    """
+    Tests the same for a group mention; the first one also looks up the group's mode.
+    """
+    with query_budget(queries=4, commits=1):
+        asyncio.run(chat_service.handle_group_message(chat_id=-5, user_data=ALICE, text="hi", is_mention=True))
+    with query_budget(queries=1, commits=1):
+        asyncio.run(chat_service.handle_group_message(chat_id=-5, user_data=ALICE, text="again", is_mention=True))
+    # A new member only adds their user row
+    with query_budget(queries=2, commits=1):
+        asyncio.run(chat_service.handle_group_message(chat_id=-5, user_data=BOB, text="hello", is_mention=True))
+
+
+def test_prompt_menu_query_budget(chat_service, query_budget):
+    """
+    Tests that a page of the prompt menu costs the same no matter how many prompts exist,
+    and that reopening a page reads it from the cached catalogue.
+    """
+    for i in range(30):
+        chat_service.prompt_service.create_new_prompt(user_id=1, title=f"Prompt {i}", text="text")
+
+    async def edit_text(chat_id, message_id, text, reply_markup=None):
+        pass
+
+    update = SimpleNamespace(
+        callback_query=SimpleNamespace(message=SimpleNamespace(chat=SimpleNamespace(id=1), message_id=7)),
+        effective_chat=SimpleNamespace(id=1),
+    )
+    context = SimpleNamespace(bot_data={"prompt_service": chat_service.prompt_service, "db_session": chat_service.db,
+                                        "sender": SimpleNamespace(edit_text=edit_text)})
+
+    # One query for the page, one for the chat's persona; showing a menu writes nothing
+    with query_budget(queries=2, commits=0):
+        asyncio.run(callbacks.show_prompt_management_menu(update, context))
+    with query_budget(queries=2, commits=0):
+        asyncio.run(callbacks.show_prompt_management_menu(update, context, after="d5"))
+    with query_budget(queries=1, commits=0):
+        asyncio.run(callbacks.show_prompt_management_menu(update, context))
@@ -0,0 +1,78 @@
+# tests/test_replay.py
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+import telegram
+
+from bot.telegram.recording import UpdateRecorder, UpdateScrubber, read_recording
+from bot.telegram.replay import FakeGeminiClient, replay
+
+BOT = telegram.User(id=99, first_name="Bot", is_bot=True, username="test_bot")
+ALICE = telegram.User(id=1, first_name="Alice", is_bot=False, username="alice")
+PRIVATE = telegram.Chat(id=1, type="private", first_name="Alice")
+GROUP = telegram.Chat(id=-5, type="supergroup", title="Secret club")
+
+
+def make_update(update_id: int, chat: telegram.Chat, text: str, entities=()) -> telegram.Update:
+    message = telegram.Message(
+        message_id=update_id, date=datetime.now(timezone.utc), chat=chat, from_user=ALICE,
+        text=text, entities=list(entities),
+    )
+    return telegram.Update(update_id=update_id, message=message)
+
+
+@pytest.fixture()
+def env(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+
+
+def test_scrubber_keeps_shape_but_not_content():
+    """
+    Tests that texts keep their UTF-16 length, whitespace, commands and bot mentions,
+    and that ids are pseudonymised consistently.
+    """
+    text = "/start hi @test_bot 😀 @alice"
+    entities = [
+        telegram.MessageEntity(type="bot_command", offset=0, length=6),
+        telegram.MessageEntity(type="mention", offset=10, length=9),
+        telegram.MessageEntity(type="mention", offset=23, length=6),
+    ]
+    scrubber = UpdateScrubber(bot_id=BOT.id, bot_username=BOT.username)
+    first = scrubber.scrub(make_update(1, GROUP, text, entities).to_dict())
+    second = scrubber.scrub(make_update(2, PRIVATE, "hello").to_dict())
+
+    message = first["message"]
+    assert message["text"] == "/start xx @test_bot 😀 xxxxxx"
+    assert message["entities"] == [entity.to_dict() for entity in entities]
+    assert message["from"]["first_name"] == "xxxxx" and message["from"]["username"] == "xxxxx"
+    assert message["chat"]["title"] == "xxxxxx xxxx" and message["chat"]["id"] < 0
+    assert message["from"]["id"] not in (ALICE.id, BOT.id)
+    assert second["message"]["from"]["id"] == message["from"]["id"]
+    # The bot itself is public
+    assert scrubber.scrub(BOT.to_dict()) == BOT.to_dict()
+
+
+def test_recorded_updates_replay_through_the_application(env, tmp_path):
+    """
+    Tests that a recording replays through the full Application: both messages that ask
+    for a reply get one from the fake backend, sent through the fake Bot API.
+    """
+    recorder = UpdateRecorder(directory=str(tmp_path), bot_id=BOT.id, bot_username=BOT.username)
+    recorder.record(make_update(1, PRIVATE, "hello there"))
+    recorder.record(make_update(2, GROUP, "@test_bot what's up?",
+                                [telegram.MessageEntity(type="mention", offset=0, length=9)]))
+    recorder.close()
+
+    header, records = read_recording(str(recorder.path))
+    assert header["bot"] == {"id": BOT.id, "username": BOT.username}
+    assert [at >= 0 for at, _ in records] == [True, True]
+
+    llm = FakeGeminiClient(latency=0.01)
+    report = asyncio.run(replay(str(recorder.path), speed=0, bot_latency=0, llm=llm))
+
+    assert report["updates"] == 2
+    assert report["replies"] == 2
+    assert llm.requests == 2
+    assert report["bot_api_calls"]["sendMessage"] == 2
@@ -0,0 +1,55 @@
+# tests/test_response_cache.py
+import time
+
+from bot.services.response_cache import ResponseCache
+
+
+def test_key_depends_on_every_input():
+    """
+    Tests that changing any part of the request produces a different cache key.
+    """
+    base = ResponseCache.make_key("model-a", "system", {"temperature": 0.7}, "hello")
+    assert base == ResponseCache.make_key("model-a", "system", {"temperature": 0.7}, "hello")
+    assert base != ResponseCache.make_key("model-b", "system", {"temperature": 0.7}, "hello")
+    assert base != ResponseCache.make_key("model-a", "other", {"temperature": 0.7}, "hello")
+    assert base != ResponseCache.make_key("model-a", "system", {"temperature": 0.1}, "hello")
+    assert base != ResponseCache.make_key("model-a", "system", {"temperature": 0.7}, "hello!")
+
+
+def test_lru_eviction():
+    """
+    Tests that the least recently used entry is evicted once the cache is full.
+    """
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # 'a' is now the most recently used
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_ttl_expiry():
+    """
+    Tests that expired entries are not served.
+    """
+    cache = ResponseCache(max_entries=10, ttl_seconds=0)
+    cache.set("a", "1")
+    time.sleep(0.01)
+    assert cache.get("a") is None
+
+
+def test_disk_backing_survives_restart(tmp_path):
+    """
+    Tests that a new cache instance pointed at the same file serves previous entries.
+    """
+    disk_path = tmp_path / "cache.db"
+    cache = ResponseCache(max_entries=10, ttl_seconds=60, disk_path=str(disk_path))
+    cache.set("a", "translated")
+    cache.close()
+
+    reopened = ResponseCache(max_entries=10, ttl_seconds=60, disk_path=str(disk_path))
+    assert reopened.get("a") == "translated"
+    reopened.close()
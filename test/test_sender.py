@@ -0,0 +1,151 @@
+# tests/test_sender.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from pydantic import ValidationError
+
+from telegram.error import RetryAfter
+
+from bot.core.config import OutboundConfig
+from bot.telegram import callback_data
+from bot.telegram.handlers import callbacks
+from bot.telegram.sender import OutboundSender, split_text
+
+# Generous rates so the tests don't wait on the token buckets
+FAST_CONFIG = OutboundConfig(global_rate=1000, private_chat_rate=1000, group_chat_rate=1000, burst=100)
+
+
+class FakeBot:
+    """Records calls instead of talking to the Bot API; can raise RetryAfter a few times."""
+
+    def __init__(self, flood_errors: int = 0):
+        self.calls = []
+        self.flood_errors = flood_errors
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.flood_errors:
+            self.flood_errors -= 1
+            raise RetryAfter(0)
+        self.calls.append(("send", chat_id, text))
+        return text
+
+    async def edit_message_text(self, text, chat_id, message_id, **kwargs):
+        await asyncio.sleep(0)
+        self.calls.append(("edit", chat_id, message_id, text))
+        return text
+
+    async def edit_message_reply_markup(self, chat_id, message_id, reply_markup):
+        self.calls.append(("markup", chat_id, message_id, reply_markup))
+        return reply_markup
+
+
+def test_split_text_prefers_paragraph_boundaries():
+    """
+    Tests that long texts are split on paragraph breaks and every chunk fits the limit.
+    """
+    paragraph = "word " * 150  # ~750 characters
+    text = "\n\n".join([paragraph.strip()] * 10)
+
+    chunks = split_text(text, limit=1000)
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert all(chunk == paragraph.strip() for chunk in chunks)
+
+
+def test_split_text_hard_cuts_overlong_words():
+    """
+    Tests that a text without any separator is still split.
+    """
+    chunks = split_text("x" * 2500, limit=1000)
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+
+
+def test_split_text_counts_utf16_units():
+    """
+    Tests that characters outside the BMP count twice towards the limit.
+    """
+    chunks = split_text("😀" * 600, limit=1000)
+    assert [len(chunk) for chunk in chunks] == [500, 100]
+
+
+def test_long_reply_is_sent_in_order():
+    """
+    Tests that a long text is delivered as several messages, in order.
+    """
+    async def scenario():
+        bot = FakeBot()
+        sender = OutboundSender(bot, FAST_CONFIG)
+        text = "\n".join(f"line {i} " + "x" * 90 for i in range(100))
+        await sender.send_text(1, text)
+        return bot, text
+
+    bot, text = asyncio.run(scenario())
+    assert len(bot.calls) > 1
+    assert "\n".join(call[2] for call in bot.calls) == text
+
+
+def test_queued_edits_are_merged():
+    """
+    Tests that edits of the same message waiting in the queue collapse into the latest one.
+    """
+    async def scenario():
+        bot = FakeBot()
+        sender = OutboundSender(bot, FAST_CONFIG)
+        results = await asyncio.gather(
+            sender.edit_text(1, 42, "first"),
+            sender.edit_text(1, 42, "second"),
+            sender.edit_text(1, 42, "third"),
+        )
+        return bot, results
+
+    bot, results = asyncio.run(scenario())
+    # All three were queued before the worker ran, so only the latest text is sent
+    assert bot.calls == [("edit", 1, 42, "third")]
+    assert results == ["third", "third", "third"]
+
+
+def test_callback_edits_go_through_the_queue():
+    """
+    Tests that a button press edits its menu through the sender, where it supersedes a keyboard
+    update of the same message that is still waiting.
+    """
+    async def scenario():
+        bot = FakeBot()
+        sender = OutboundSender(bot, FAST_CONFIG)
+        message = SimpleNamespace(chat=SimpleNamespace(id=1), message_id=42)
+        update = SimpleNamespace(callback_query=SimpleNamespace(from_user=SimpleNamespace(id=1), message=message))
+        context = SimpleNamespace(bot_data={"sender": sender, "prompt_service": None})
+        await asyncio.gather(
+            sender.edit_reply_markup(1, 42, "old keyboard"),
+            callbacks.handle_compact_callback(update, context, callback_data.DELETE_PROMPT, ["5"]),
+        )
+        return bot, sender
+
+    bot, sender = asyncio.run(scenario())
+    assert bot.calls == [("edit", 1, 42, "Are you sure you want to delete this shared prompt?")]
+    assert sender.merged_edits == 1
+
+
+def test_retry_after_is_obeyed():
+    """
+    Tests that flood-control errors are retried instead of surfacing to the caller.
+    """
+    async def scenario():
+        bot = FakeBot(flood_errors=2)
+        sender = OutboundSender(bot, FAST_CONFIG)
+        await sender.send_text(1, "hello")
+        return bot, sender
+
+    bot, sender = asyncio.run(scenario())
+    assert bot.calls == [("send", 1, "hello")]
+    assert sender.retry_after_count == 2
+
+
+def test_rates_must_be_positive():
+    """
+    Tests that a zero rate is rejected when the config is loaded, not when a message is sent.
+    """
+    with pytest.raises(ValidationError):
+        OutboundConfig(group_chat_rate=0)
+    with pytest.raises(ValidationError):
+        OutboundConfig(burst=0)
@@ -0,0 +1,65 @@
+# tests/test_startup.py
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Import-to-ready budget in seconds; override on slow CI machines
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "3.0"))
+
+# Runs in a fresh interpreter so nothing is already imported or cached
+STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+from bot.telegram.app import build_application
+imported = time.perf_counter()
+build_application()
+ready = time.perf_counter()
+import bot.core.config as config
+print(json.dumps({
+    "import_seconds": imported - start,
+    "ready_seconds": ready - start,
+    "genai_loaded": "google.genai" in sys.modules,
+    "settings_loaded": config._settings is not None,
+}))
+"""
+
+
+def _measure_startup() -> dict:
+    env = dict(os.environ, TELEGRAM_BOT_TOKEN="123:startup-test", GEMINI_API_KEY="startup-test")
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_does_not_load_config_or_sdk():
+    """
+    Tests that importing the bot is side-effect free: the configuration is only loaded by
+    build_application(), and google-genai is only imported once Gemini is actually used.
+    """
+    script = (
+        "import sys, bot.telegram.app, bot.core.config as c;"
+        "print(c._settings is None, 'google.genai' in sys.modules)"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["True", "False"]
+
+
+def test_startup_time_budget():
+    """
+    Benchmarks import-to-ready time (imports plus building the Application) in a fresh process.
+    """
+    timings = _measure_startup()
+
+    assert timings["settings_loaded"]
+    assert not timings["genai_loaded"]
+    assert timings["ready_seconds"] < STARTUP_BUDGET_SECONDS, (
+        f"startup took {timings['ready_seconds']:.3f}s (imports {timings['import_seconds']:.3f}s), "
+        f"over the {STARTUP_BUDGET_SECONDS}s budget"
+    )
@@ -0,0 +1,68 @@
+# tests/test_update_dedup.py
+import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.database.models import Base, BotState
+from bot.services.update_dedup import HIGH_WATER_MARK_KEY, UpdateDeduplicator
+
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture()
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def test_redelivered_updates_are_skipped_across_restarts(db_session):
+    """
+    Tests in-process duplicates, out-of-order updates and the persisted high-water mark.
+    """
+    dedup = UpdateDeduplicator(db=db_session, capacity=2)
+    assert [dedup.is_duplicate(update_id) for update_id in (10, 12, 10, 11)] == [False, False, True, False]
+    for update_id in (10, 11, 12):
+        dedup.finish(update_id)
+    assert dedup.flush() is True
+    assert dedup.flush() is False  # Unchanged mark isn't written again
+
+    restarted = UpdateDeduplicator(db=db_session)
+    assert restarted.high_water_mark == 12
+    assert [restarted.is_duplicate(update_id) for update_id in (11, 12, 13)] == [True, True, False]
+    assert restarted.duplicates == 2
+
+
+def test_mark_never_passes_an_unfinished_update(db_session):
+    """
+    Tests that an update still being handled (e.g. when the process dies mid-generation)
+    stays above the saved mark, so its redelivery is handled again after a restart.
+    """
+    dedup = UpdateDeduplicator(db=db_session)
+    for update_id in (20, 21, 22):
+        dedup.is_duplicate(update_id)
+    dedup.finish(20)
+    dedup.finish(22)
+    assert dedup.high_water_mark == 20
+    dedup.flush()
+
+    restarted = UpdateDeduplicator(db=db_session)
+    assert restarted.is_duplicate(21) is False
+    assert restarted.is_duplicate(22) is False  # Redelivered along with 21; handled twice rather than lost
+
+
+def test_stale_mark_is_ignored(db_session):
+    """
+    Tests that a mark older than a week is ignored, as Telegram may then restart update_ids.
+    """
+    db_session.add(BotState(key=HIGH_WATER_MARK_KEY, value=500,
+                            updated_at=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=8)))
+    db_session.commit()
+    assert UpdateDeduplicator(db=db_session).is_duplicate(7) is False
@@ -0,0 +1,90 @@
+# tests/test_usage.py
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from bot.core.config import get_settings
+from bot.database.models import Base
+from bot.database import crud
+from bot.services.rate_limiter import RateLimiter
+from bot.services.usage_service import UsageTracker
+
+engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture()
+def db_session():
+    Base.metadata.create_all(bind=engine)
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+def test_usage_is_aggregated_per_chat_and_user(db_session):
+    """
+    Tests that recorded responses are summed per chat and per user,
+    and that repeated flushes add to the existing rows.
+    """
+    tracker = UsageTracker(db=db_session)
+    usage = SimpleNamespace(prompt_token_count=100, candidates_token_count=20, cached_content_token_count=None)
+
+    tracker.record_response(chat_id=-5, user_id=1, usage_metadata=usage)
+    tracker.record_response(chat_id=-5, user_id=2, usage_metadata=usage)
+    assert tracker.flush() == 3  # one chat row and two user rows
+    tracker.record_response(chat_id=7, user_id=1, usage_metadata=usage)
+    tracker.flush()
+    assert tracker.flush() == 0
+
+    day = tracker.today()
+    assert crud.get_usage_totals(db=db_session, day=day) == {
+        "requests": 3, "input_tokens": 300, "output_tokens": 60, "cached_tokens": 0,
+    }
+    top_chats = crud.get_top_usage(db=db_session, day=day, scope="chat")
+    assert [(row.subject_id, row.requests) for row in top_chats] == [(-5, 2), (7, 1)]
+    top_users = crud.get_top_usage(db=db_session, day=day, scope="user")
+    assert [(row.subject_id, row.input_tokens) for row in top_users] == [(1, 200), (2, 100)]
+
+
+@pytest.fixture()
+def limits(monkeypatch):
+    monkeypatch.setenv("TELEGRAM_BOT_TOKEN", "123:test")
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    settings = get_settings()
+    limits = settings.app.rate_limits.model_copy(update={
+        "enabled": True,
+        "user_messages_per_minute": 2,
+        "chat_messages_per_minute": 0,
+        "user_tokens_per_day": 150,
+        "chat_tokens_per_day": 0,
+    })
+    monkeypatch.setattr(settings.app, "rate_limits", limits)
+    monkeypatch.setattr(settings, "admin_user_ids", [99])
+    return limits
+
+
+def test_rate_limits_reject_without_side_effects(db_session, limits):
+    """
+    Tests the per-minute and per-day limits, and that admins are exempt.
+    """
+    tracker = UsageTracker(db=db_session)
+    limiter = RateLimiter(usage_tracker=tracker)
+
+    assert limiter.check(chat_id=1, user_id=1) is None
+    assert limiter.check(chat_id=1, user_id=1) is None
+    assert limiter.check(chat_id=1, user_id=1) is not None
+    assert all(limiter.check(chat_id=99, user_id=99) is None for _ in range(5))
+
+    # Tokens already saved today count towards the daily limit
+    tracker.record(chat_id=2, user_id=2, input_tokens=100, output_tokens=20)
+    tracker.flush()
+    assert limiter.check(chat_id=2, user_id=2) is None
+    tracker.record(chat_id=2, user_id=2, input_tokens=30)
+    assert "daily" in limiter.check(chat_id=2, user_id=2)
+    assert UsageTracker(db=db_session).tokens_today("user", 2) == 120
+    assert limiter.rejected == 2